@@ -3,8 +3,11 @@ Alert Tracker
 Tracks alert states and prevents duplicate notifications
 """
 
+import json
+import secrets
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional, Tuple
 from enum import Enum
 
 
@@ -19,10 +22,23 @@ class AlertState(Enum):
 class AlertTracker:
     """Tracks alert states and history to prevent spam"""
     
-    def __init__(self, cooldown_minutes: int = 15):
+    def __init__(self, cooldown_minutes: int = 15,
+                 clock: Callable[[], datetime] = datetime.now):
         self.cooldown_minutes = cooldown_minutes
+        self.clock = clock  # replaced by a simulated clock when backtesting
         self.alerts = {}  # {rule_name: alert_info}
         
+        # Every change of what get_all_alerts() reports bumps the version;
+        # `changed` keeps each alert's last change, oldest first, for deltas
+        self.version = 0
+        self.changed: Dict[str, int] = {}
+        self.reset_version = 0
+        self.epoch = secrets.token_hex(4)  # tells versions of different runs apart
+        # Guards `alerts` and the version state against reset() and readers
+        # on other threads (re-entrant: updates call _touch under it)
+        self.lock = threading.RLock()
+        self._snapshot: Optional[Tuple[int, str]] = None
+    
     def update_alert_state(self, rule_name: str, condition_met: bool, 
                           duration_seconds: int, current_value: float) -> tuple:
         """
@@ -37,10 +53,16 @@ class AlertTracker:
         Returns:
             Tuple of (should_fire: bool, should_resolve: bool, state: AlertState)
         """
-        now = datetime.now()
+        with self.lock:
+            return self._update_alert_state(rule_name, condition_met, duration_seconds, current_value)
+    
+    def _update_alert_state(self, rule_name: str, condition_met: bool,
+                            duration_seconds: int, current_value: float) -> tuple:
+        now = self.clock()
         
         # Initialize alert if not tracked
-        if rule_name not in self.alerts:
+        new = rule_name not in self.alerts
+        if new:
             self.alerts[rule_name] = {
                 'state': AlertState.NORMAL,
                 'first_triggered': None,
@@ -51,6 +73,8 @@ class AlertTracker:
             }
         
         alert = self.alerts[rule_name]
+        before = (alert['state'], alert['fire_count'], alert['last_fired'],
+                  alert['last_resolved'], alert['current_value'])
         should_fire = False
         should_resolve = False
         
@@ -106,25 +130,109 @@ class AlertTracker:
                     if time_since_resolved > timedelta(minutes=5):
                         alert['state'] = AlertState.NORMAL
         
+        if new or before != (alert['state'], alert['fire_count'], alert['last_fired'],
+                             alert['last_resolved'], alert['current_value']):
+            self._touch(rule_name)
+        
         return should_fire, should_resolve, alert['state']
     
     def get_alert_info(self, rule_name: str) -> Optional[Dict]:
         """Get current alert information"""
         return self.alerts.get(rule_name)
     
+    def export_alert(self, rule_name: str) -> Optional[Dict]:
+        """Get an alert's state as JSON-serializable data (for replication)"""
+        info = self.alerts.get(rule_name)
+        if info is None:
+            return None
+        return {
+            'state': info['state'].value,
+            'first_triggered': info['first_triggered'].isoformat() if info['first_triggered'] else None,
+            'last_fired': info['last_fired'].isoformat() if info['last_fired'] else None,
+            'last_resolved': info['last_resolved'].isoformat() if info['last_resolved'] else None,
+            'fire_count': info['fire_count'],
+            'current_value': info['current_value']
+        }
+    
+    def apply_alert(self, rule_name: str, data: Dict):
+        """Replace an alert's state with data from export_alert()"""
+        def parse(value: Optional[str]) -> Optional[datetime]:
+            return datetime.fromisoformat(value) if value else None
+        
+        with self.lock:
+            self.alerts[rule_name] = {
+                'state': AlertState(data['state']),
+                'first_triggered': parse(data['first_triggered']),
+                'last_fired': parse(data['last_fired']),
+                'last_resolved': parse(data['last_resolved']),
+                'fire_count': data['fire_count'],
+                'current_value': data['current_value']
+            }
+            self._touch(rule_name)
+    
+    def _touch(self, rule_name: str):
+        """Record a change of an alert's reported state"""
+        with self.lock:
+            self.version += 1
+            self.changed.pop(rule_name, None)
+            self.changed[rule_name] = self.version
+    
+    @staticmethod
+    def _report(info: Dict) -> Dict:
+        return {
+            'state': info['state'].value,
+            'fire_count': info['fire_count'],
+            'last_fired': info['last_fired'].isoformat() if info['last_fired'] else None,
+            'last_resolved': info['last_resolved'].isoformat() if info['last_resolved'] else None,
+            'current_value': info['current_value']
+        }
+    
     def get_all_alerts(self) -> Dict:
         """Get all tracked alerts"""
-        result = {}
-        for name, info in self.alerts.items():
-            result[name] = {
-                'state': info['state'].value,
-                'fire_count': info['fire_count'],
-                'last_fired': info['last_fired'].isoformat() if info['last_fired'] else None,
-                'last_resolved': info['last_resolved'].isoformat() if info['last_resolved'] else None,
-                'current_value': info['current_value']
-            }
-        return result
+        # Copy first: the evaluation thread may add alerts meanwhile
+        return {name: self._report(info) for name, info in list(self.alerts.items())}
+    
+    def get_changes(self, since: int, epoch: str) -> Tuple[int, Optional[Dict]]:
+        """
+        Get alerts whose reported state changed after version `since`
+        
+        Args:
+            since: Version of an earlier response
+            epoch: Epoch that version belongs to (versions restart with every run)
+        
+        Returns:
+            Tuple of (current version, changed alerts in get_all_alerts()
+            format), with None in place of the changes if `since` isn't a
+            version of this run since the last reset (send everything)
+        """
+        with self.lock:
+            if epoch != self.epoch or since < self.reset_version or since > self.version:
+                return self.version, None
+            names = []
+            for name in reversed(self.changed):
+                if self.changed[name] <= since:
+                    break
+                names.append(name)
+            return self.version, {name: self._report(self.alerts[name]) for name in reversed(names)}
+    
+    def snapshot_json(self) -> Tuple[int, str]:
+        """
+        Get all alerts serialized as JSON, at most once per version
+        
+        Returns:
+            Tuple of (version, JSON object of get_all_alerts())
+        """
+        snapshot = self._snapshot
+        version = self.version
+        if snapshot is None or snapshot[0] != version:
+            # Changes made while serializing show up as a later version
+            snapshot = self._snapshot = (version, json.dumps(self.get_all_alerts()))
+        return snapshot
     
     def reset(self):
         """Reset all alert states"""
-        self.alerts.clear()
+        with self.lock:
+            self.alerts.clear()
+            self.changed.clear()
+            self.version += 1
+            self.reset_version = self.version
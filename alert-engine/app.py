@@ -4,43 +4,56 @@ Monitors IoT metrics and sends email alerts
 """
 
 from flask import Flask, Response, jsonify, request
-from prometheus_client import Gauge, Counter, generate_latest, REGISTRY
+from prometheus_client import generate_latest, REGISTRY
+import json
+import os
 import time
 import threading
+import zlib
 from datetime import datetime
+from typing import Dict, Any
 
 from config_loader import ConfigLoader
 from prometheus_query import PrometheusQuery
 from alert_tracker import AlertTracker
 from email_notifier import EmailNotifier
+from rate_limiter import RateLimitedNotifier
+from scheduler import AdaptiveScheduler
 from rule_engine import RuleEngine
+from recording_rules import RecordingRules
+from silences import SilenceManager
+from routing import AlertDispatcher
+from metrics import rules_evaluated_total, last_evaluation_time, active_silences, observe_cycle
+from profiler import StackSampler, MemoryTracker
 
 app = Flask(__name__)
 
-# Prometheus metrics for the alert engine itself
-alerts_fired_total = Counter('alert_engine_alerts_fired_total', 
-                             'Total number of alerts fired',
-                             ['rule_name', 'severity'])
-emails_sent_total = Counter('alert_engine_emails_sent_total',
-                           'Total number of emails sent',
-                           ['status'])
-rules_evaluated_total = Counter('alert_engine_rules_evaluated_total',
-                               'Total number of rule evaluations')
-last_evaluation_time = Gauge('alert_engine_last_evaluation_timestamp',
-                            'Timestamp of last rule evaluation')
-
 # Global components
 config_loader = None
 prometheus_query = None
 alert_tracker = None
 email_notifier = None
+webhook_notifier = None
+notifiers = {}
+ha_coordinator = None
+scheduler = None
+tenant_pool = None
 rule_engine = None
+recording_rules = None
+direct_scraper = None
+silence_manager = None
 is_running = False
 
+# Debug endpoints (opt-in via `debug.profiling_enabled`)
+stack_sampler = StackSampler()
+memory_tracker = MemoryTracker()
+
 
 def initialize_components():
     """Initialize all alert engine components"""
     global config_loader, prometheus_query, alert_tracker, email_notifier, rule_engine
+    global recording_rules, direct_scraper, silence_manager, webhook_notifier, notifiers
+    global ha_coordinator, scheduler, tenant_pool
     
     print("\n" + "="*60)
     print("🚀 Alert Engine Starting...")
@@ -57,6 +70,23 @@ def initialize_components():
     prom_config = config_loader.get_prometheus_config()
     prometheus_query = PrometheusQuery(prom_config['url'])
     
+    # Optional direct-scrape fallback for Prometheus outages
+    fallback_config = config_loader.get_fallback_config()
+    if fallback_config.get('enabled', False):
+        from sample_buffer import SampleBuffer
+        from direct_scraper import DirectScraper
+        
+        scrape_interval = fallback_config.get('scrape_interval', 5)
+        sample_buffer = SampleBuffer(
+            retention_seconds=fallback_config.get('retention_minutes', 60) * 60,
+            scrape_interval=scrape_interval
+        )
+        direct_scraper = DirectScraper(fallback_config['targets'], sample_buffer, scrape_interval)
+        direct_scraper.start()
+        prometheus_query.fallback = sample_buffer
+        prometheus_query.probe_interval = fallback_config.get('probe_interval', 30)
+        print(f"✓ Direct-scrape fallback enabled ({len(fallback_config['targets'])} targets)")
+    
     # Check Prometheus connectivity
     if prometheus_query.health_check():
         print("✓ Connected to Prometheus")
@@ -78,17 +108,127 @@ def initialize_components():
             from_email=email_config['from_email'],
             username=email_config['username'],
             password=email_config['password'],
-            to_emails=email_config.get('to_emails', [])
+            to_emails=email_config.get('to_emails', []),
+            starttls=email_config.get('smtp_starttls', True)
         )
         print(f"✓ Email notifier configured: {email_config['from_email']}")
     else:
         print("⚠ Email notifications disabled")
     
+    # Initialize webhook notifier (only needed when a receiver has webhooks;
+    # tenants share this one)
+    receivers = config.get('receivers', [])
+    webhook_count = sum(len(r.get('webhooks', [])) for r in receivers)
+    tenants_config = config_loader.get_tenants()
+    if webhook_count or tenants_config:
+        from webhook_notifier import WebhookNotifier
+        
+        webhook_config = config_loader.get_webhook_config()
+        webhook_notifier = WebhookNotifier(
+            flush_interval=webhook_config.get('flush_interval', 2),
+            max_batch=webhook_config.get('max_batch', 50),
+            max_queue=webhook_config.get('max_queue', 1000),
+            timeout=webhook_config.get('timeout', 5),
+            max_retries=webhook_config.get('max_retries', 3),
+            failure_threshold=webhook_config.get('failure_threshold', 5),
+            reset_timeout=webhook_config.get('reset_timeout', 60)
+        ).start()
+        print(f"✓ Webhook notifier started ({webhook_count} endpoints)")
+    
+    # Initialize recording rules (cached and exposed on /metrics)
+    record_rules = config_loader.get_recording_rules()
+    if record_rules:
+        recording_rules = RecordingRules(record_rules)
+        REGISTRY.register(recording_rules)
+        print(f"✓ Loaded {len(record_rules)} recording rules")
+    
+    # Initialize silences (persisted across restarts)
+    silences_config = config_loader.get_silences_config()
+    silence_manager = SilenceManager(silences_config.get('storage_path', 'silences.json'))
+    loaded = silence_manager.load()
+    active_silences.set_function(silence_manager.active_count)
+    print(f"✓ Silences loaded ({loaded} pending or active)")
+    
+    # Rate-limit outbound notifications (email by default: Gmail rejects bursts)
+    rate_limit_config = config_loader.get_rate_limit_config()
+    for notifier in (email_notifier, webhook_notifier):
+        if notifier is None:
+            continue
+        limits = rate_limit_config.get(notifier.channel, {})
+        if not limits.get('enabled', notifier.channel == 'email'):
+            notifiers[notifier.channel] = notifier
+            continue
+        notifiers[notifier.channel] = RateLimitedNotifier(
+            notifier,
+            per_minute=limits.get('per_minute', 30),
+            burst=limits.get('burst', 10),
+            receiver_per_minute=limits.get('receiver_per_minute'),
+            receiver_burst=limits.get('receiver_burst'),
+            max_queue=limits.get('max_queue', 1000),
+            max_digest=limits.get('max_digest', 100),
+            max_attempts=limits.get('max_attempts', 5),
+            retry_delay=limits.get('retry_delay', 30)
+        ).start()
+        print(f"✓ {notifier.channel.capitalize()} rate limit: "
+              f"{limits.get('per_minute', 30)}/min (burst {limits.get('burst', 10)})")
+    
+    # Initialize notification routing
+    dispatcher = AlertDispatcher.from_config(config, notifiers, silence_manager)
+    if receivers:
+        print(f"✓ Routing to {len(receivers)} receivers "
+              f"({len(config.get('inhibit_rules', []))} inhibit rules)")
+    
     # Initialize rule engine
-    rule_engine = RuleEngine(prometheus_query, alert_tracker, email_notifier)
+    rule_engine = RuleEngine(prometheus_query, alert_tracker, email_notifier,
+                             recording_rules, dispatcher=dispatcher)
     
-    alert_rules = config_loader.get_alert_rules()
-    print(f"✓ Loaded {len(alert_rules)} alert rules")
+    # Active/standby HA: only the lease holder evaluates and notifies
+    ha_config = config_loader.get_ha_config()
+    if ha_config.get('enabled', False):
+        from ha import LeaseStore, HACoordinator
+        
+        ha_coordinator = HACoordinator(
+            LeaseStore(ha_config.get('store_path', 'alert-engine-ha.db')),
+            rule_engine,
+            node_id=ha_config.get('node_id'),
+            lease_seconds=ha_config.get('lease_seconds', 15)
+        ).start()
+        print(f"✓ HA enabled: {ha_coordinator.node_id} starts as {ha_coordinator.role}")
+    
+    # Evaluation cycles run on the scrape grid; under overload low-severity rules wait
+    scheduler_config = config_loader.get_scheduler_config()
+    scheduler = AdaptiveScheduler(
+        prom_config.get('scrape_interval', 30),
+        align_seconds=scheduler_config.get('align_seconds', 5),
+        budget_ratio=scheduler_config.get('budget_ratio', 0.8),
+        max_defer_cycles=scheduler_config.get('max_defer_cycles', 4)
+    )
+    
+    # Tenants: more rule sets sharing this process's pools and evaluation tick
+    if tenants_config:
+        from tenants import TenantPool
+        
+        pool_config = config_loader.get_tenant_pool_config()
+        tenant_pool = TenantPool(
+            scheduler,
+            workers=pool_config.get('workers', 4),
+            pool_size=pool_config.get('query_pool_size', 20),
+            silences=silence_manager,
+            webhook_notifier=webhook_notifier,
+            # A main config without rules leaves the whole budget to the tenants
+            main_weight=pool_config.get('main_weight', 1) if config_loader.get_alert_rules() else 0
+        )
+        base_dir = os.path.dirname(os.path.abspath(config_loader.config_path))
+        for tenant_config in tenants_config:
+            tenant_pool.load(tenant_config, base_dir)
+        print(f"✓ Hosting {len(tenant_pool.tenants)} tenants "
+              f"({tenant_pool.workers} evaluation workers)")
+        if ha_coordinator:
+            print("⚠ HA replicates the main rule set only; tenants start cold after a failover")
+    
+    rule_table = config_loader.get_rule_table()
+    print(f"✓ Loaded {len(rule_table)} alert rules "
+          f"({', '.join(f'{len(r)} {s}' for s, r in rule_table.by_severity.items())})")
     
     print("="*60)
     print("✅ Alert Engine Ready")
@@ -102,41 +242,40 @@ def evaluation_loop():
     if not config_loader:
         return
     
-    prom_config = config_loader.get_prometheus_config()
-    interval = prom_config.get('scrape_interval', 30)
-    alert_rules = config_loader.get_alert_rules()
+    alert_rules = config_loader.get_rule_table().rules
     
-    print(f"🔄 Evaluation loop started (interval: {interval}s)")
+    print(f"🔄 Evaluation loop started (interval: {scheduler.interval}s, "
+          f"aligned to {scheduler.align_seconds}s scrapes)")
     
     while is_running:
+        # Standbys follow the leader's state until they take over
+        if ha_coordinator and not ha_coordinator.is_leader:
+            scheduler.reset()
+            time.sleep(1)
+            continue
+        
+        # Start on the scrape grid; overruns skip ticks instead of drifting
+        scheduler.wait()
+        started = time.perf_counter()
+        rules = scheduler.plan(alert_rules)
         try:
-            # Evaluate all rules
-            rule_engine.evaluate_all_rules(alert_rules)
+            # Evaluate all rules (fired alerts and sent emails are counted
+            # where they happen)
+            rule_engine.evaluate_all_rules(rules)
+            rules_evaluated_total.inc(len(rules))
+            
+            # Then the tenants, side by side on the pool's workers
+            if tenant_pool:
+                tenant_pool.evaluate()
             
             # Update metrics
-            rules_evaluated_total.inc(len(alert_rules))
             last_evaluation_time.set(time.time())
             
-            # Update alert metrics
-            for rule_name, alert_info in alert_tracker.get_all_alerts().items():
-                if alert_info['fire_count'] > 0:
-                    # Find severity from rules
-                    severity = next((r['severity'] for r in alert_rules 
-                                   if r['name'] == rule_name), 'unknown')
-                    alerts_fired_total.labels(rule_name=rule_name, 
-                                            severity=severity).inc(0)
-            
-            # Update email metrics
-            if email_notifier:
-                stats = email_notifier.get_stats()
-                emails_sent_total.labels(status='success').inc(0)
-                emails_sent_total.labels(status='failed').inc(0)
-            
         except Exception as e:
             print(f"✗ Error in evaluation loop: {e}")
         
-        # Sleep until next evaluation
-        time.sleep(interval)
+        elapsed = observe_cycle(started, scheduler.interval)
+        scheduler.record(rules, rule_engine.rule_durations, elapsed)
 
 
 @app.route('/')
@@ -161,8 +300,22 @@ def health():
         },
         'timestamp': datetime.now().isoformat()
     }
+    if ha_coordinator:
+        health_status['role'] = ha_coordinator.role
+    # Per-tenant Prometheus reachability (informational, doesn't change the status)
+    if tenant_pool:
+        health_status['tenants'] = {name: not tenant.prometheus_query.is_down
+                                    for name, tenant in tenant_pool.tenants.items()}
     
-    status_code = 200 if all(health_status['components'].values()) else 503
+    # Rules keep evaluating against the sample buffer while Prometheus is down
+    components = dict(health_status['components'])
+    if direct_scraper is not None:
+        health_status['components']['fallback'] = direct_scraper.is_running
+        if not components['prometheus'] and direct_scraper.is_running:
+            health_status['status'] = 'degraded'
+            components['prometheus'] = True
+    
+    status_code = 200 if all(components.values()) else 503
     return jsonify(health_status), status_code
 
 
@@ -172,32 +325,132 @@ def metrics():
     return Response(generate_latest(REGISTRY), mimetype='text/plain')
 
 
+class UnknownTenant(Exception):
+    """Raised for a `tenant` query parameter naming no hosted tenant"""
+
+
+@app.errorhandler(UnknownTenant)
+def unknown_tenant(e):
+    return jsonify({'error': f'Unknown tenant: {e}'}), 404
+
+
+def requested_tenant():
+    """Tenant named by the `tenant` query parameter (None: the main rule set)"""
+    name = request.args.get('tenant')
+    if name is None:
+        return None
+    tenant = tenant_pool.get(name) if tenant_pool else None
+    if tenant is None:
+        raise UnknownTenant(name)
+    return tenant
+
+
+def tracker_response(tracker: AlertTracker, key: str, extra: Dict[str, Any]) -> Response:
+    """
+    Respond with a tracker's alerts under `key`, plus the `extra` fields
+    
+    The alerts are serialized once per tracker version and responses carry
+    a weak ETag, so polling clients get a 304 while nothing changed. With
+    `?since=<cursor>` (the `cursor` of an earlier response,
+    `<epoch>-<version>`) only alerts changed after it are sent; `full` is
+    true when everything had to be, e.g. because the cursor is from an
+    earlier run or from before a reset.
+    """
+    since = request.args.get('since')
+    extra_json = json.dumps(extra)
+    
+    def etag(version: int) -> str:
+        tag = f"{tracker.epoch}-{version}"
+        if since is not None:
+            tag += f"-since-{zlib.crc32(since.encode()):08x}"  # client input: keep it out of the header
+        return f"{tag}-{zlib.crc32(extra_json.encode()):08x}" if extra else tag
+    
+    if request.if_none_match.contains_weak(etag(tracker.version)):
+        response = Response(status=304)
+        response.set_etag(etag(tracker.version), weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    
+    changes = None
+    if since is not None:
+        epoch, _, since_version = since.rpartition('-')
+        if since_version.isdigit():
+            version, changes = tracker.get_changes(int(since_version), epoch)
+    if changes is None:
+        version, alerts_json = tracker.snapshot_json()
+    else:
+        alerts_json = json.dumps(changes)
+    fields = json.dumps({'version': version, 'epoch': tracker.epoch,
+                         'cursor': f"{tracker.epoch}-{version}", 'full': changes is None,
+                         'timestamp': datetime.now().isoformat()})
+    body = f'{{"{key}": {alerts_json}, {extra_json[1:-1]}{", " if extra else ""}{fields[1:]}'
+    
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag(version), weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 @app.route('/alerts')
 def alerts():
-    """Get current alert status"""
-    if not alert_tracker:
+    """
+    Get current alert status
+    
+    Query parameters:
+        since: Only alerts changed after this cursor (see tracker_response)
+        tenant: Alerts of a hosted tenant instead of the main rule set
+    """
+    tenant = requested_tenant()
+    tracker = tenant.alert_tracker if tenant else alert_tracker
+    if not tracker:
         return jsonify({'error': 'Alert tracker not initialized'}), 500
     
-    return jsonify({
-        'alerts': alert_tracker.get_all_alerts(),
-        'timestamp': datetime.now().isoformat()
-    })
+    return tracker_response(tracker, 'alerts', {})
 
 
 @app.route('/history')
 def history():
-    """Get alert history"""
+    """
+    Get alert history and engine stats
+    
+    Query parameters:
+        since: Only alerts changed after this cursor (see tracker_response)
+        tenant: History of a hosted tenant instead of the main rule set
+    """
+    tenant = requested_tenant()
+    if tenant:
+        return tracker_response(tenant.alert_tracker, 'history', {
+            'tenant': tenant.name,
+            'stats': tenant.get_stats(),
+            'email_stats': tenant.email_notifier.get_stats() if tenant.email_notifier else {},
+            'rate_limit_stats': {channel: notifier.get_stats()
+                                 for channel, notifier in tenant.notifiers.items()}
+        })
     if not alert_tracker:
         return jsonify({'error': 'Alert tracker not initialized'}), 500
     
-    return jsonify({
-        'history': alert_tracker.get_all_alerts(),
+    return tracker_response(alert_tracker, 'history', {
         'stats': rule_engine.get_stats() if rule_engine else {},
         'email_stats': email_notifier.get_stats() if email_notifier else {},
-        'timestamp': datetime.now().isoformat()
+        'webhook_stats': webhook_notifier.get_stats() if webhook_notifier else {},
+        'rate_limit_stats': {channel: notifier.get_stats() for channel, notifier in notifiers.items()
+                             if isinstance(notifier, RateLimitedNotifier)},
+        'ha_stats': ha_coordinator.get_stats() if ha_coordinator else {},
+        'scheduler_stats': scheduler.get_stats() if scheduler else {}
     })
 
 
+@app.route('/tenants')
+def tenants():
+    """List hosted tenants with their evaluation and alert stats"""
+    if not tenant_pool:
+        return jsonify({'tenants': {}, 'count': 0})
+    
+    stats = tenant_pool.get_stats()
+    stats['count'] = len(stats['tenants'])
+    return jsonify(stats)
+
+
 @app.route('/test-email', methods=['POST'])
 def test_email():
     """Send test email"""
@@ -220,16 +473,165 @@ def test_email():
 
 @app.route('/rules')
 def rules():
-    """Get configured alert rules"""
-    if not config_loader:
+    """
+    Get configured alert rules
+    
+    Query parameters:
+        name, severity, metric: Only return matching rules (metric also
+                                matches metrics used inside an expr)
+        tenant: Rules of a hosted tenant instead of the main rule set
+    """
+    tenant = requested_tenant()
+    loader = tenant.config_loader if tenant else config_loader
+    if not loader:
         return jsonify({'error': 'Configuration not loaded'}), 500
     
+    rule_table = loader.get_rule_table()
+    matching = rule_table.filter(name=request.args.get('name'),
+                                 severity=request.args.get('severity'),
+                                 metric=request.args.get('metric'))
     return jsonify({
-        'rules': config_loader.get_alert_rules(),
-        'count': len(config_loader.get_alert_rules())
+        'rules': matching,
+        'count': len(matching),
+        'total': len(rule_table),
+        'recording_rules': loader.get_recording_rules()
     })
 
 
+@app.route('/rules/<name>')
+def get_rule(name):
+    """Get one alert rule by name (of a tenant with ?tenant=)"""
+    tenant = requested_tenant()
+    loader = tenant.config_loader if tenant else config_loader
+    if not loader:
+        return jsonify({'error': 'Configuration not loaded'}), 500
+    
+    rule = loader.get_rule_table().get(name)
+    if rule is None:
+        return jsonify({'error': f'Rule not found: {name}'}), 404
+    return jsonify(rule)
+
+
+@app.route('/silences', methods=['GET'])
+def list_silences():
+    """
+    List silences
+    
+    Query parameters:
+        active: Only return silences in effect now when set to 1
+    """
+    if not silence_manager:
+        return jsonify({'error': 'Silences not initialized'}), 500
+    
+    silences = silence_manager.list(active_only=request.args.get('active') == '1')
+    return jsonify({'silences': silences, 'count': len(silences)})
+
+
+@app.route('/silences', methods=['POST'])
+def create_silence():
+    """
+    Create a silence or recurring maintenance window
+    
+    JSON body:
+        matchers: [{"name": "site", "value": "plant-1", "op": "="}, ...]
+                  (op is one of =, !=, =~, !~; labels include alertname
+                  and severity)
+        starts_at: ISO time or unix seconds (default: now)
+        ends_at / duration_minutes: End of the (first) window
+        repeat: 'daily' or 'weekly' for maintenance windows
+        comment, created_by: Free text
+    """
+    if not silence_manager:
+        return jsonify({'error': 'Silences not initialized'}), 500
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    
+    try:
+        silence = silence_manager.create(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    print(f"🔕 Silence {silence['id']} created by {silence['created_by'] or 'unknown'}")
+    return jsonify(silence), 201
+
+
+@app.route('/silences/<silence_id>', methods=['DELETE'])
+def delete_silence(silence_id):
+    """Expire a silence immediately"""
+    if not silence_manager:
+        return jsonify({'error': 'Silences not initialized'}), 500
+    
+    if not silence_manager.delete(silence_id):
+        return jsonify({'error': f'Silence not found: {silence_id}'}), 404
+    return jsonify({'status': 'deleted', 'id': silence_id})
+
+
+def debug_enabled() -> bool:
+    """Check whether the debug endpoints are switched on"""
+    return bool(config_loader and config_loader.get_debug_config().get('profiling_enabled', False))
+
+
+@app.route('/debug/profile')
+def debug_profile():
+    """
+    Sample thread stacks for a while and return them
+    
+    Query parameters:
+        seconds: Sampling duration (default 10, max 60)
+        hz: Samples per second (default 100, max 1000)
+        thread: Only sample threads whose name contains this text
+                (e.g. 'evaluation-loop')
+        format: 'collapsed' (flamegraph.pl input, default) or 'json'
+    """
+    if not debug_enabled():
+        return jsonify({'error': 'Debug endpoints disabled'}), 404
+    
+    seconds = min(request.args.get('seconds', 10, type=float), 60)
+    hz = min(request.args.get('hz', 100, type=float), 1000)
+    thread = request.args.get('thread')
+    # Written as 'not > 0' so NaN is refused too
+    if not seconds > 0 or not hz > 0:
+        return jsonify({'error': 'seconds and hz must be positive'}), 400
+    
+    stacks = stack_sampler.profile(seconds, hz, thread)
+    if stacks is None:
+        return jsonify({'error': 'A profile is already running'}), 409
+    
+    if request.args.get('format') == 'json':
+        return jsonify(StackSampler.to_tree(stacks))
+    return Response(StackSampler.to_collapsed(stacks), mimetype='text/plain')
+
+
+@app.route('/debug/tracemalloc')
+def debug_tracemalloc():
+    """
+    Diff memory allocations since the previous call
+    
+    The first call starts tracemalloc and records a baseline.
+    
+    Query parameters:
+        limit: Number of entries to return (default 25, min 1)
+        key_type: 'lineno', 'filename' or 'traceback' (default 'lineno')
+        stop: Stop tracing when set to 1
+    """
+    if not debug_enabled():
+        return jsonify({'error': 'Debug endpoints disabled'}), 404
+    
+    if request.args.get('stop') == '1':
+        return jsonify(memory_tracker.stop())
+    
+    key_type = request.args.get('key_type', 'lineno')
+    if key_type not in ('lineno', 'filename', 'traceback'):
+        return jsonify({'error': f'Invalid key_type: {key_type}'}), 400
+    
+    limit = max(request.args.get('limit', 25, type=int), 1)
+    result = memory_tracker.snapshot_diff(limit, key_type)
+    result['tracked_alerts'] = len(alert_tracker.alerts) if alert_tracker else 0
+    return jsonify(result)
+
+
 if __name__ == '__main__':
     # Initialize components
     try:
@@ -240,9 +642,22 @@ if __name__ == '__main__':
     
     # Start evaluation loop in background thread
     is_running = True
-    eval_thread = threading.Thread(target=evaluation_loop, daemon=True)
+    eval_thread = threading.Thread(target=evaluation_loop, name='evaluation-loop',
+                                   daemon=True)
     eval_thread.start()
     
     # Start Flask app
     print("🌐 Starting Flask server on port 8087...")
     app.run(host='0.0.0.0', port=8087, debug=False)
+
+    # Deliver notifications still queued for a flush or rate limit tokens
+    # (tenants first: they share the webhook notifier)
+    is_running = False
+    if tenant_pool:
+        tenant_pool.stop()
+    for notifier in notifiers.values():
+        notifier.stop()
+    if ha_coordinator:
+        ha_coordinator.stop()
+    if direct_scraper is not None:
+        direct_scraper.stop()
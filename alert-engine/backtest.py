@@ -0,0 +1,285 @@
+"""
+Backtester
+Replays historical metric data through the rule engine to count alerts
+
+Usage:
+    python backtest.py --start 2026-09-01 --end 2026-10-01
+    python backtest.py --config alert_rules.new.yaml --start 2026-09-01 --end 2026-10-01 --export history.json
+    python backtest.py --config alert_rules.new.yaml --input history.json
+
+History is fetched with chunked query_range requests (one step per
+evaluation interval) or read from a previously exported file, then replayed
+through AlertTracker with a simulated clock. Conditions are evaluated for a
+whole series at once with numpy; the tracker only sees samples where the
+condition holds plus the sample right after, because long stretches of
+"condition not met" cannot change fire or resolve counts. As in the live
+engine, an `expr` series missing from an evaluation counts as "condition not
+met", so a series that disappears resolves its alert.
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from config_loader import ConfigLoader
+from prometheus_query import PrometheusQuery
+from alert_tracker import AlertTracker
+from rule_engine import RuleEngine
+from rule_table import CONDITIONS
+
+# Series history: (labels, timestamps, values)
+History = List[Tuple[Dict[str, str], np.ndarray, np.ndarray]]
+
+# Prometheus refuses range queries with more than 11,000 points per series
+MAX_POINTS_PER_QUERY = 10000
+
+
+class SimulatedClock:
+    """Clock that only moves when the replay sets it"""
+    
+    def __init__(self, timestamp: float = 0.0):
+        self.timestamp = timestamp
+    
+    def set(self, timestamp: float):
+        self.timestamp = timestamp
+    
+    def __call__(self) -> datetime:
+        return datetime.fromtimestamp(self.timestamp)
+
+
+class Backtester:
+    """Replays history through RuleEngine semantics and an AlertTracker"""
+    
+    def __init__(self, alert_rules: List[Dict[str, Any]], cooldown_minutes: int = 15,
+                 recording_rules: Optional[List[Dict[str, Any]]] = None):
+        self.alert_rules = alert_rules
+        self.clock = SimulatedClock()
+        self.alert_tracker = AlertTracker(cooldown_minutes=cooldown_minutes, clock=self.clock)
+        # Recording rule names are replaced by their expressions
+        self.records = {r['record']: r['expr'] for r in recording_rules or []}
+    
+    def rule_query(self, rule: Dict[str, Any]) -> str:
+        """PromQL expression to fetch for a rule"""
+        query = RuleEngine.rule_query(rule)
+        return self.records.get(query, query)
+    
+    def queries(self) -> List[str]:
+        """Distinct queries needed by the rule set"""
+        return sorted({self.rule_query(rule) for rule in self.alert_rules})
+    
+    def fetch(self, prometheus_query: PrometheusQuery, start: float, end: float,
+              step: float) -> Dict[str, History]:
+        """
+        Fetch history for every query in large chunks
+        
+        Returns:
+            {query: [(labels, timestamps, values)]}
+        """
+        chunk = step * MAX_POINTS_PER_QUERY
+        history = {}
+        
+        for query in self.queries():
+            parts: Dict[Tuple, Tuple[Dict[str, str], List[np.ndarray]]] = {}
+            chunk_start = start
+            while chunk_start <= end:
+                chunk_end = min(chunk_start + chunk - step, end)
+                result = prometheus_query.query_range(query, chunk_start, chunk_end, step)
+                if result is None:
+                    raise RuntimeError(f"Range query failed: {query}")
+                for labels, values in result:
+                    key = tuple(sorted(labels.items()))
+                    parts.setdefault(key, (labels, []))[1].append(
+                        np.asarray(values, dtype=np.float64).reshape(-1, 2))
+                chunk_start = chunk_end + step
+            
+            history[query] = []
+            for labels, arrays in parts.values():
+                samples = np.concatenate(arrays)
+                history[query].append((labels, samples[:, 0], samples[:, 1]))
+            print(f"✓ Fetched {len(history[query])} series for {query}")
+        
+        return history
+    
+    def replay(self, history: Dict[str, History]) -> Dict[str, Dict[str, Any]]:
+        """
+        Replay history through the alert tracker
+        
+        Returns:
+            {rule_name: {'series', 'samples', 'fires', 'resolves', 'emails'}}
+        """
+        report = {}
+        grid = self.evaluation_times(history)
+        for rule in self.alert_rules:
+            series = history.get(self.rule_query(rule), [])
+            if 'expr' not in rule:
+                # Bare metric rules only ever look at the first series
+                series = series[:1]
+            
+            counts = {'series': len(series), 'samples': 0, 'fires': 0, 'resolves': 0}
+            for labels, timestamps, values in series:
+                key = RuleEngine.alert_key(rule['name'], labels) if 'expr' in rule else rule['name']
+                self._replay_series(rule, key, timestamps, values, counts,
+                                    grid if 'expr' in rule else None)
+            
+            resolution = rule.get('resolution_notification', True)
+            counts['emails'] = counts['fires'] + (counts['resolves'] if resolution else 0)
+            report[rule['name']] = counts
+        return report
+    
+    @staticmethod
+    def evaluation_times(history: Dict[str, History]) -> np.ndarray:
+        """Every timestamp any query returned data for (the replayed cycles)"""
+        stamps = [ts for series in history.values() for _, ts, _ in series if ts.size]
+        if not stamps:
+            return np.empty(0)
+        return np.unique(np.concatenate(stamps))
+    
+    def _replay_series(self, rule: Dict[str, Any], key: str, timestamps: np.ndarray,
+                       values: np.ndarray, counts: Dict[str, int],
+                       grid: Optional[np.ndarray] = None):
+        """
+        Replay one series of one rule
+        
+        With a `grid` of evaluation times the series is evaluated at each of
+        them, and times it has no sample for count as "condition not met"
+        (expr rules). Without one, only its own samples are evaluated (bare
+        metric rules skip cycles without data).
+        """
+        compare = CONDITIONS.get(rule['condition'])
+        if compare is None:
+            print(f"✗ Unknown condition: {rule['condition']}")
+            return
+        
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, values = timestamps[order], values[order]
+        # Chunk boundaries may repeat a timestamp
+        keep = np.ones(timestamps.size, dtype=bool)
+        keep[1:] = timestamps[1:] != timestamps[:-1]
+        timestamps, values = timestamps[keep], values[keep]
+        counts['samples'] += int(timestamps.size)
+        
+        condition = np.asarray(compare(values, rule['threshold']), dtype=bool)
+        if condition.shape != values.shape:
+            return
+        
+        if grid is not None and grid.size:
+            # Spread the series over every evaluation; gaps never meet the condition
+            positions = np.searchsorted(grid, timestamps)
+            full_values = np.full(grid.size, np.nan)
+            full_values[positions] = values
+            full_condition = np.zeros(grid.size, dtype=bool)
+            full_condition[positions] = condition
+            timestamps, values, condition = grid, full_values, full_condition
+        
+        # Only samples where the condition holds, or the first one after,
+        # can change the outcome
+        relevant = condition.copy()
+        relevant[1:] |= condition[:-1]
+        
+        update = self.alert_tracker.update_alert_state
+        duration = rule['duration']
+        for i in np.flatnonzero(relevant):
+            self.clock.set(timestamps[i])
+            value = None if np.isnan(values[i]) else float(values[i])
+            should_fire, should_resolve, _ = update(key, bool(condition[i]), duration, value)
+            counts['fires'] += should_fire
+            counts['resolves'] += should_resolve
+
+
+def export_history(history: Dict[str, History], path: str):
+    """Write history in Prometheus range-query (matrix) form, keyed by query"""
+    data = {
+        query: [{'metric': labels, 'values': np.column_stack([ts, vs]).tolist()}
+                for labels, ts, vs in series]
+        for query, series in history.items()
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    print(f"✓ History exported to {path}")
+
+
+def load_history(path: str) -> Dict[str, History]:
+    """Read history written by export_history"""
+    with open(path) as f:
+        data = json.load(f)
+    history = {}
+    for query, series in data.items():
+        history[query] = []
+        for item in series:
+            samples = np.asarray(item['values'], dtype=np.float64).reshape(-1, 2)
+            history[query].append((item['metric'], samples[:, 0], samples[:, 1]))
+    return history
+
+
+def parse_time(value: str) -> float:
+    """Parse an ISO date/time or unix timestamp"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay history through alert rules')
+    parser.add_argument('--config', default='alert_rules.yaml', help='Rules file to test')
+    parser.add_argument('--start', help='Range start (ISO time or unix seconds)')
+    parser.add_argument('--end', help='Range end (default: now)')
+    parser.add_argument('--step', type=float,
+                        help='Evaluation step in seconds (default: prometheus.scrape_interval)')
+    parser.add_argument('--input', help='Replay a previously exported history file')
+    parser.add_argument('--export', help='Save fetched history for later replays')
+    parser.add_argument('--output', help='Write the report as JSON')
+    args = parser.parse_args()
+    
+    config_loader = ConfigLoader(args.config)
+    config_loader.load()
+    if not config_loader.validate():
+        print(f"✗ {args.config} is not a valid configuration")
+        return 1
+    prom_config = config_loader.get_prometheus_config()
+    cooldown = config_loader.get_alert_settings().get('cooldown_minutes', 15)
+    
+    backtester = Backtester(config_loader.get_alert_rules(), cooldown,
+                            config_loader.get_recording_rules())
+    
+    started = time.perf_counter()
+    if args.input:
+        history = load_history(args.input)
+    else:
+        if not args.start:
+            parser.error('--start is required unless --input is given')
+        start = parse_time(args.start)
+        end = parse_time(args.end) if args.end else time.time()
+        step = args.step or prom_config.get('scrape_interval', 30)
+        history = backtester.fetch(PrometheusQuery(prom_config['url']), start, end, step)
+        if args.export:
+            export_history(history, args.export)
+    fetched = time.perf_counter()
+    
+    report = backtester.replay(history)
+    replayed = time.perf_counter()
+    
+    samples = sum(r['samples'] for r in report.values())
+    all_ts = [ts for series in history.values() for _, ts, _ in series if ts.size]
+    span = (max(t.max() for t in all_ts) - min(t.min() for t in all_ts)) if all_ts else 0.0
+    
+    print(f"\n{'rule':<40} {'series':>7} {'samples':>10} {'fires':>7} {'resolves':>9} {'emails':>7}")
+    for name, counts in report.items():
+        print(f"{name:<40} {counts['series']:>7} {counts['samples']:>10} "
+              f"{counts['fires']:>7} {counts['resolves']:>9} {counts['emails']:>7}")
+    print(f"\n✓ Replayed {samples} samples covering {span / 3600:.1f}h "
+          f"in {replayed - fetched:.2f}s (fetch/load {fetched - started:.2f}s)")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'rules': report, 'samples': samples, 'span_seconds': span}, f, indent=2)
+        print(f"✓ Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
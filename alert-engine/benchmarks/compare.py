@@ -0,0 +1,68 @@
+"""
+Benchmark Comparison
+Compares two run_benchmark.py result files and flags regressions
+
+Usage:
+    python benchmarks/compare.py results/base.json results/new.json --threshold 10
+
+Exits with status 1 if any p50/p99 latency grows, or throughput drops, by
+more than the threshold percentage.
+"""
+
+import argparse
+import json
+import sys
+
+
+def change(old: float, new: float) -> float:
+    """Relative change in percent"""
+    return (new - old) / old * 100 if old else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Regression threshold in percent (default: 10)')
+    args = parser.parse_args()
+    
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    
+    base_by_size = {r['rules']: r for r in baseline['results']}
+    regressions = 0
+    
+    print(f"{baseline['commit']} -> {candidate['commit']}")
+    print(f"{'rules':>8} {'p50 ms':>20} {'p99 ms':>20} {'rules/s':>22} {'peak RSS MB':>20}")
+    
+    for result in candidate['results']:
+        base = base_by_size.get(result['rules'])
+        if base is None:
+            continue
+        
+        p50 = change(base['latency_ms']['p50'], result['latency_ms']['p50'])
+        p99 = change(base['latency_ms']['p99'], result['latency_ms']['p99'])
+        throughput = change(base['throughput_rules_per_s'], result['throughput_rules_per_s'])
+        rss = change(base['peak_rss_mb'], result['peak_rss_mb'])
+        
+        regressed = p50 > args.threshold or p99 > args.threshold or -throughput > args.threshold
+        regressions += regressed
+        
+        print(f"{result['rules']:>8} "
+              f"{result['latency_ms']['p50']:11.2f} ({p50:+6.1f}%) "
+              f"{result['latency_ms']['p99']:11.2f} ({p99:+6.1f}%) "
+              f"{result['throughput_rules_per_s']:13.0f} ({throughput:+6.1f}%) "
+              f"{result['peak_rss_mb']:11.1f} ({rss:+6.1f}%)"
+              f"{'  ✗ REGRESSION' if regressed else ''}")
+    
+    if regressions:
+        print(f"✗ {regressions} size(s) regressed by more than {args.threshold}%")
+        sys.exit(1)
+    print("✓ No regressions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Device Fleet
+Simulated IoT exporters serving many devices each, driven by a scenario
+"""
+
+import multiprocessing
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+# (metric, help, normal range) as served by iot-sim/iot_sim.py
+METRICS = [
+    ('iot_temperature_celsius', 'Temperature in Celsius', (20.0, 35.0)),
+    ('iot_humidity_percent', 'Humidity in percent', (40.0, 70.0)),
+    ('iot_battery_percent', 'Battery level in percent', (50.0, 100.0)),
+]
+HOT_TEMPERATURE = (42.0, 48.0)
+
+
+def device_site(device: int, devices_per_site: int) -> str:
+    return f"site-{device // devices_per_site:04d}"
+
+
+class Scenario:
+    """
+    When each site runs hot, as a pure function of time
+    
+    After `warmup` seconds every device reads normal values; then every
+    `wave_every` seconds the next `wave_sites` sites (in a shuffled but
+    seeded order) overheat for `hot_for` seconds. Exporter processes and
+    the load generator evaluate the same schedule, so nothing has to be
+    shared between them.
+    """
+    
+    def __init__(self, start: float, sites: int, warmup: float = 10, wave_every: float = 10,
+                 wave_sites: int = 2, hot_for: float = 30, seed: int = 0):
+        self.start = start
+        self.sites = sites
+        self.warmup = warmup
+        self.wave_every = wave_every
+        self.wave_sites = wave_sites
+        self.hot_for = hot_for
+        order = list(range(sites))
+        random.Random(seed).shuffle(order)
+        # Wave of each site (sites left over when the run ends never overheat)
+        self.wave = {f"site-{site:04d}": i // wave_sites for i, site in enumerate(order)}
+    
+    def hot_since(self, site: str) -> float:
+        """Time the site starts overheating"""
+        return self.start + self.warmup + self.wave[site] * self.wave_every
+    
+    def is_hot(self, site: str, now: float) -> bool:
+        since = self.hot_since(site)
+        return since <= now < since + self.hot_for
+    
+    def hot_sites(self, until: float) -> List[str]:
+        """Sites that started overheating before `until`"""
+        return [site for site in self.wave if self.hot_since(site) < until]
+
+
+def render_metrics(devices: List[int], devices_per_site: int, scenario: Scenario,
+                   now: Optional[float] = None) -> bytes:
+    """Text exposition of every metric of the given devices"""
+    now = now or time.time()
+    sites = {device: device_site(device, devices_per_site) for device in devices}
+    lines = []
+    for name, help_text, (low, high) in METRICS:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for device in devices:
+            site = sites[device]
+            if name == 'iot_temperature_celsius' and scenario.is_hot(site, now):
+                value = random.uniform(*HOT_TEMPERATURE)
+            else:
+                value = random.uniform(low, high)
+            lines.append(f'{name}{{device_id="device-{device:06d}",site="{site}"}} {value:.2f}')
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def serve_exporter(devices: List[int], devices_per_site: int, scenario: Scenario,
+                   ports: 'multiprocessing.Queue'):
+    """Exporter process: serve /metrics for `devices` until terminated"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True  # as in fake_prometheus.py
+        
+        def do_GET(self):
+            if self.path == '/metrics':
+                body = render_metrics(devices, devices_per_site, scenario)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            else:
+                body = b'IoT Simulator Running\n'
+                self.send_response(200 if self.path == '/' else 404)
+                self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+class DeviceFleet:
+    """
+    `exporters` processes serving `devices` simulated devices between them
+    
+    Each exporter plays a gateway for a share of the fleet (round robin)
+    and serves the iot-sim metrics labelled by device_id and site. Sites
+    group `devices_per_site` consecutive devices.
+    """
+    
+    def __init__(self, devices: int, exporters: int, devices_per_site: int, scenario: Scenario):
+        self.devices = devices
+        self.exporters = min(exporters, devices)
+        self.devices_per_site = devices_per_site
+        self.scenario = scenario
+        self.processes: List[multiprocessing.Process] = []
+        self.urls: List[str] = []
+    
+    def start(self) -> 'DeviceFleet':
+        """Start the exporter processes and wait for their ports"""
+        ports = multiprocessing.Queue()
+        for i in range(self.exporters):
+            devices = list(range(i, self.devices, self.exporters))
+            process = multiprocessing.Process(
+                target=serve_exporter, name=f"exporter-{i}", daemon=True,
+                args=(devices, self.devices_per_site, self.scenario, ports))
+            process.start()
+            self.processes.append(process)
+        self.urls = sorted(f"http://127.0.0.1:{ports.get(timeout=30)}/metrics"
+                           for _ in self.processes)
+        return self
+    
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes = []
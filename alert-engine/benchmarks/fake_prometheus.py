@@ -0,0 +1,137 @@
+"""
+Fake Prometheus
+In-process stand-in for the Prometheus HTTP API used by benchmarks
+"""
+
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+from urllib.parse import urlparse, parse_qs
+
+
+def sine_wave(period: float = 300.0) -> Callable[[int, float], float]:
+    """Values between 0 and 1 following a sine wave, phase-shifted per series"""
+    def value(index: int, timestamp: float) -> float:
+        return 0.5 + 0.5 * math.sin(2 * math.pi * (timestamp / period + index * 0.618))
+    return value
+
+
+class FakePrometheus:
+    """
+    Serves /api/v1/query, /api/v1/query_range and /-/healthy from a
+    background thread
+    
+    Series are synthetic:
+      - 'bench_metric_<i>' returns one sample without extra labels
+      - 'bench_vector_<i>' returns `vector_size` samples labelled by device_id
+    Any other query returns an empty vector. Each request sleeps for
+    `latency` plus up to `jitter` seconds before answering.
+    """
+    
+    def __init__(self, series: int = 1000, vector_size: int = 10,
+                 latency: float = 0.0, jitter: float = 0.0,
+                 value_fn: Optional[Callable[[int, float], float]] = None,
+                 clock: Callable[[], float] = time.time):
+        self.series = series
+        self.vector_size = vector_size
+        self.latency = latency
+        self.jitter = jitter
+        self.value_fn = value_fn or sine_wave()
+        self.clock = clock
+        self.requests_served = 0
+        self.server = None
+        self.thread = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self) -> 'FakePrometheus':
+        """Start serving on a free local port"""
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are separate writes; with Nagle on, the body of
+            # every response on a kept-alive connection waits ~40ms for the
+            # client's delayed ACK
+            disable_nagle_algorithm = True
+            
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path == '/-/healthy':
+                    self._reply(200, b'Prometheus is Healthy.\n', 'text/plain')
+                elif parsed.path == '/api/v1/query':
+                    query = parse_qs(parsed.query).get('query', [''])[0]
+                    body = json.dumps(fake.query(query)).encode()
+                    self._reply(200, body, 'application/json')
+                elif parsed.path == '/api/v1/query_range':
+                    params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                    body = json.dumps(fake.query_range(
+                        params.get('query', ''), float(params['start']),
+                        float(params['end']), float(params['step']))).encode()
+                    self._reply(200, body, 'application/json')
+                else:
+                    self._reply(404, b'not found\n', 'text/plain')
+            
+            def _reply(self, status, body, content_type):
+                delay = fake.latency + random.uniform(0, fake.jitter)
+                if delay > 0:
+                    time.sleep(delay)
+                fake.requests_served += 1
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       name='fake-prometheus', daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        """Stop serving"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+    
+    def _series_for(self, query: str) -> list:
+        """Get (labels, value index) of every series a query selects"""
+        name, _, index = query.rpartition('_')
+        if not index.isdigit() or int(index) >= self.series:
+            return []
+        
+        i = int(index)
+        if name == 'bench_metric':
+            return [({'__name__': query}, i)]
+        if name == 'bench_vector':
+            return [({'device_id': f"device-{device}"}, i * self.vector_size + device)
+                    for device in range(self.vector_size)]
+        return []
+    
+    def query(self, query: str) -> dict:
+        """Build an instant query response"""
+        now = self.clock()
+        result = [{'metric': labels, 'value': [now, str(self.value_fn(i, now))]}
+                  for labels, i in self._series_for(query)]
+        return {'status': 'success', 'data': {'resultType': 'vector', 'result': result}}
+
+    def query_range(self, query: str, start: float, end: float, step: float) -> dict:
+        """Build a range query response"""
+        points = int((end - start) // step) + 1
+        result = [{'metric': labels,
+                   'values': [[start + n * step, str(self.value_fn(i, start + n * step))]
+                              for n in range(points)]}
+                  for labels, i in self._series_for(query)]
+        return {'status': 'success', 'data': {'resultType': 'matrix', 'result': result}}
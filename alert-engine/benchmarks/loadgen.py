@@ -0,0 +1,339 @@
+"""
+Load Generator
+Ramps a simulated device fleet against the real alert engine to find its saturation point
+
+Usage (from alert-engine/):
+    python benchmarks/loadgen.py --devices 1000,5000,10000,20000 --duration 60
+    python benchmarks/loadgen.py --devices 2000,4000,8000 --interval 15 --exporters 8
+
+Every step starts a fleet of exporter processes (device_fleet.py), a
+stand-in Prometheus scraping them (scraping_prometheus.py) and an SMTP
+sink, writes an alert_rules.yaml with per-site rules for that fleet and
+runs the unmodified engine (app.initialize_components + evaluation_loop)
+in its own process for `--duration` seconds. After a warmup, waves of
+sites overheat on a fixed schedule; the time from a site overheating to
+its alert email reaching the sink is the notification lag.
+
+A step is saturated when cycles no longer fit the scheduler budget
+(interval x budget ratio), ticks are skipped, rules are deferred, or
+alerts arrive late or not at all. The ramp stops at the first saturated
+step unless --keep-going is set.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from email.header import decode_header, make_header
+from typing import Dict, List, Any
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ENGINE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ENGINE_DIR)
+
+from device_fleet import DeviceFleet, Scenario  # noqa: E402
+from scraping_prometheus import ScrapingPrometheus  # noqa: E402
+from smtp_sink import SMTPSink  # noqa: E402
+
+# (rule name, metric, condition, threshold, severity, title); one rule of each per site
+RULE_TEMPLATES = [
+    ('high_temperature', 'iot_temperature_celsius', '>', 40, 'critical', 'Temperature high'),
+    ('high_humidity', 'iot_humidity_percent', '>', 85, 'warning', 'Humidity high'),
+    ('low_battery', 'iot_battery_percent', '<', 15, 'info', 'Battery low'),
+]
+BUDGET_RATIO = 0.8
+SITE_RE = re.compile(r'site-\d{4}')
+
+ENGINE_RUNNER = """
+import json, os, resource, sys, threading, time
+sys.path.insert(0, {engine_dir!r})
+os.chdir({workdir!r})
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+with open(os.devnull, 'w') as devnull:
+    stdout, sys.stdout = sys.stdout, devnull
+    import app
+    baseline = rss_bytes()
+    started = time.time()
+    app.initialize_components()
+    ready = time.time()
+    
+    cycles = []
+    record = app.scheduler.record
+    def timed_record(rules, durations, elapsed):
+        cycles.append({{'at': time.time(), 'seconds': elapsed, 'rules': len(rules)}})
+        record(rules, durations, elapsed)
+    app.scheduler.record = timed_record
+    
+    app.is_running = True
+    thread = threading.Thread(target=app.evaluation_loop, daemon=True)
+    thread.start()
+    time.sleep(max(0.0, {until!r} - time.time()))
+    app.is_running = False
+    thread.join(timeout=app.scheduler.interval + 60)
+    rss = rss_bytes()
+    for notifier in app.notifiers.values():
+        notifier.stop()
+    sys.stdout = stdout
+
+print(json.dumps({{
+    'startup_seconds': ready - started,
+    'ready_at': ready,
+    'cycles': cycles,
+    'skipped_ticks': app.scheduler.skipped_ticks,
+    'rules_deferred': app.scheduler.rules_deferred,
+    'tracked_alerts': len(app.alert_tracker.alerts),
+    'emails_sent': app.email_notifier.emails_sent_success,
+    'emails_failed': app.email_notifier.emails_failed,
+    'baseline_rss_bytes': baseline,
+    'rss_bytes': rss
+}}))
+"""
+
+
+def make_rules(sites: int) -> List[Dict[str, Any]]:
+    """One rule per site and template, selecting that site's devices"""
+    rules = []
+    for site in range(sites):
+        site_name = f"site-{site:04d}"
+        for name, metric, condition, threshold, severity, title in RULE_TEMPLATES:
+            rules.append({
+                'name': f"{name}_{site_name.replace('-', '_')}",
+                'expr': f'{metric}{{site="{site_name}"}}',
+                'condition': condition,
+                'threshold': threshold,
+                'duration': 0,
+                'severity': severity,
+                'description': f"{title} at {site_name}",
+                'email_subject': f"{title} at {site_name}",
+                'email_body': f"{metric} {condition} {threshold} on a device at {site_name}."
+            })
+    return rules
+
+
+def write_config(path: str, sites: int, prometheus_url: str, sink: SMTPSink,
+                 args: argparse.Namespace):
+    """Write the engine config for one step: generated rules, local stand-ins, site grouping"""
+    import yaml
+    config = {
+        'prometheus': {'url': prometheus_url, 'scrape_interval': args.interval},
+        'email': {
+            'smtp_server': sink.host, 'smtp_port': sink.port, 'smtp_starttls': False,
+            'from_email': 'loadgen@localhost', 'to_emails': ['oncall@localhost'],
+            'username': 'loadgen', 'password': 'loadgen'
+        },
+        'alert_settings': {'cooldown_minutes': 15},
+        # Measure the engine, not Gmail's sending limits
+        'rate_limits': {'email': {'enabled': False}},
+        'receivers': [{'name': 'oncall'}],
+        'routing': {'receiver': 'oncall', 'group_by': ['site'],
+                    'group_wait': args.group_wait, 'group_interval': 300},
+        'alert_rules': make_rules(sites)
+    }
+    with open(path, 'w') as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(q * len(ordered))) - 1)]
+
+
+def notification_lags(sink: SMTPSink, scenario: Scenario) -> Dict[str, float]:
+    """Seconds from each site overheating to its first firing email"""
+    lags = {}
+    with sink.lock:
+        messages = list(sink.messages)
+    for message in messages:
+        subject = str(make_header(decode_header(message['subject'])))
+        match = SITE_RE.search(subject)
+        if subject.startswith('✅') or match is None or match.group() in lags:
+            continue
+        site = match.group()
+        if site in scenario.wave:
+            lags[site] = message['received_at'] - scenario.hot_since(site)
+    return lags
+
+
+def run_step(devices: int, args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    """Run the engine against one fleet size"""
+    sites = math.ceil(devices / args.devices_per_site)
+    scenario = Scenario(time.time(), sites, warmup=args.warmup, wave_every=args.wave_every,
+                        wave_sites=args.wave_sites, hot_for=args.hot_for, seed=args.seed)
+    until = scenario.start + args.warmup + args.duration
+    
+    fleet = DeviceFleet(devices, args.exporters, args.devices_per_site, scenario).start()
+    prometheus = ScrapingPrometheus(fleet.urls, args.scrape_interval).start()
+    sink = SMTPSink(latency=args.smtp_latency_ms / 1000).start()
+    try:
+        config = os.path.join(workdir, 'alert_rules.yaml')
+        write_config(config, sites, prometheus.url, sink, args)
+        script = ENGINE_RUNNER.format(engine_dir=ENGINE_DIR, workdir=workdir, until=until)
+        engine = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                timeout=until - time.time() + 300)
+        if engine.returncode != 0:
+            raise RuntimeError(f"engine failed at {devices} devices:\n{engine.stderr[-2000:]}")
+        report = json.loads(engine.stdout.strip().splitlines()[-1])
+        # Let the last group emails land
+        time.sleep(1)
+        lags = notification_lags(sink, scenario)
+    finally:
+        sink.stop()
+        prometheus.stop()
+        fleet.stop()
+    
+    # Sites that should have been notified by the end of the step
+    due = [site for site in scenario.hot_sites(until - args.max_lag)
+           if scenario.hot_since(site) >= report['ready_at']]
+    missed = [site for site in due if site not in lags]
+    cycle_seconds = [c['seconds'] for c in report['cycles']]
+    lag_values = list(lags.values())
+    engine_bytes = report['rss_bytes'] - report['baseline_rss_bytes']
+    budget = args.interval * BUDGET_RATIO
+    
+    result = {
+        'devices': devices,
+        'sites': sites,
+        'rules': sites * len(RULE_TEMPLATES),
+        'series': devices * 3,
+        'startup_seconds': report['startup_seconds'],
+        'cycles': len(cycle_seconds),
+        'cycle_p50_seconds': percentile(cycle_seconds, 0.5),
+        'cycle_p95_seconds': percentile(cycle_seconds, 0.95),
+        'cycle_max_seconds': max(cycle_seconds, default=0.0),
+        'budget_seconds': budget,
+        'skipped_ticks': report['skipped_ticks'],
+        'rules_deferred': report['rules_deferred'],
+        'tracked_alerts': report['tracked_alerts'],
+        'emails_sent': report['emails_sent'],
+        'emails_failed': report['emails_failed'],
+        'hot_sites': len(due),
+        'notified_sites': len(due) - len(missed),
+        'missed_sites': len(missed),
+        'lag_p50_seconds': percentile(lag_values, 0.5),
+        'lag_p95_seconds': percentile(lag_values, 0.95),
+        'lag_max_seconds': max(lag_values, default=0.0),
+        'rss_mb': report['rss_bytes'] / 2**20,
+        'engine_mb': engine_bytes / 2**20,
+        'mb_per_1k_devices': engine_bytes / 2**20 / devices * 1000,
+        'scrape_p95_seconds': percentile(prometheus.scrape_seconds, 0.95),
+        'scrape_failures': prometheus.scrape_failures
+    }
+    
+    reasons = []
+    if not cycle_seconds:
+        reasons.append('no evaluation cycle finished')
+    if result['cycle_p95_seconds'] > budget:
+        reasons.append(f"cycle p95 {result['cycle_p95_seconds']:.2f}s over the {budget:.2f}s budget")
+    if result['skipped_ticks']:
+        reasons.append(f"{result['skipped_ticks']} ticks skipped")
+    if result['rules_deferred']:
+        reasons.append(f"{result['rules_deferred']} rule evaluations deferred")
+    if result['lag_p95_seconds'] > args.max_lag:
+        reasons.append(f"lag p95 {result['lag_p95_seconds']:.1f}s over {args.max_lag:.0f}s")
+    if missed:
+        reasons.append(f"{len(missed)} of {len(due)} hot sites never notified")
+    if result['scrape_p95_seconds'] > args.scrape_interval:
+        # The stand-in, not the engine, is the bottleneck: the numbers are suspect
+        print(f"⚠ Stand-in Prometheus scrapes take {result['scrape_p95_seconds']:.2f}s "
+              f"(interval {args.scrape_interval}s); add --exporters or lower the step")
+    result['saturated'] = reasons
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ramp a simulated device fleet to find where the alert engine saturates')
+    parser.add_argument('--devices', default='1000,5000,10000,20000',
+                        help='Comma-separated fleet sizes, one step each (default: 1000,5000,10000,20000)')
+    parser.add_argument('--exporters', type=int, default=4, help='Exporter processes serving the fleet')
+    parser.add_argument('--devices-per-site', type=int, default=50,
+                        help=f"Devices per site; every site gets {len(RULE_TEMPLATES)} rules")
+    parser.add_argument('--interval', type=float, default=5, help='Engine evaluation interval (prometheus.scrape_interval)')
+    parser.add_argument('--scrape-interval', type=float, default=5, help='Stand-in Prometheus scrape interval')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds of load per step after the warmup')
+    parser.add_argument('--warmup', type=float, default=20, help='Seconds before the first wave (covers engine startup)')
+    parser.add_argument('--wave-every', type=float, default=10, help='Seconds between overheating waves')
+    parser.add_argument('--wave-sites', type=int, default=2, help='Sites overheating per wave')
+    parser.add_argument('--hot-for', type=float, default=30, help='Seconds a site stays hot')
+    parser.add_argument('--group-wait', type=float, default=0, help='group_wait of the site grouping route')
+    parser.add_argument('--max-lag', type=float, default=30, help='Notification lag (p95) that counts as saturated')
+    parser.add_argument('--smtp-latency-ms', type=float, default=0.0, help='SMTP sink latency')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the wave order')
+    parser.add_argument('--keep-going', action='store_true', help='Run every step even after saturation')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    args = parser.parse_args()
+    
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': vars(args),
+        'results': [],
+        'saturation': None
+    }
+    
+    healthy = None
+    previous = None
+    for devices in [int(n) for n in args.devices.split(',')]:
+        print(f"🔄 {devices} devices ({math.ceil(devices / args.devices_per_site) * len(RULE_TEMPLATES)} rules), "
+              f"{args.warmup + args.duration:.0f}s...")
+        with tempfile.TemporaryDirectory() as workdir:
+            result = run_step(devices, args, workdir)
+        # Memory one more device costs, without the engine's fixed overhead
+        if previous is not None and devices > previous['devices']:
+            result['marginal_mb_per_1k_devices'] = ((result['rss_mb'] - previous['rss_mb'])
+                                                    / (devices - previous['devices']) * 1000)
+        previous = result
+        report['results'].append(result)
+        print(f"devices={devices:>7} rules={result['rules']:>6} cycles={result['cycles']:>3} "
+              f"cycle p50/p95={result['cycle_p50_seconds']:6.2f}/{result['cycle_p95_seconds']:6.2f}s "
+              f"lag p50/p95={result['lag_p50_seconds']:5.1f}/{result['lag_p95_seconds']:5.1f}s "
+              f"({result['notified_sites']}/{result['hot_sites']} sites) "
+              f"rss={result['rss_mb']:7.1f}MiB "
+              f"({result.get('marginal_mb_per_1k_devices', result['mb_per_1k_devices']):.1f} MiB/1k devices) "
+              f"{'✗ ' + '; '.join(result['saturated']) if result['saturated'] else '✓'}")
+        
+        if result['saturated'] and report['saturation'] is None:
+            report['saturation'] = {'devices': devices, 'last_healthy_devices': healthy,
+                                    'reasons': result['saturated']}
+            if not args.keep_going:
+                break
+        elif not result['saturated'] and report['saturation'] is None:
+            healthy = devices
+    
+    saturation = report['saturation']
+    if saturation:
+        print(f"⚠ Saturated at {saturation['devices']} devices ({'; '.join(saturation['reasons'])}); "
+              f"last healthy step: {saturation['last_healthy_devices'] or 'none'}")
+    else:
+        print(f"✓ No saturation up to {healthy} devices")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
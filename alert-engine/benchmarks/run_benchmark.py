@@ -0,0 +1,200 @@
+"""
+Alert Engine Benchmark
+Drives the real RuleEngine against a fake Prometheus and a local SMTP sink
+
+Usage (from alert-engine/):
+    python benchmarks/run_benchmark.py --rules 10,100,1000,10000 --cycles 20
+    python benchmarks/run_benchmark.py --rules 100000 --series 5000 --latency-ms 2
+
+Results are written as JSON to benchmarks/results/ (or --output) and can be
+compared across commits with benchmarks/compare.py.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Any
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from prometheus_query import PrometheusQuery  # noqa: E402
+from alert_tracker import AlertTracker  # noqa: E402
+from email_notifier import EmailNotifier  # noqa: E402
+from rule_engine import RuleEngine  # noqa: E402
+from fake_prometheus import FakePrometheus  # noqa: E402
+from smtp_sink import SMTPSink  # noqa: E402
+
+
+def make_rules(count: int, series: int, fire_ratio: float,
+               vector_ratio: float) -> List[Dict[str, Any]]:
+    """
+    Build a synthetic rule set
+    
+    Rules cycle through the fake series so several rules share a query; a
+    `vector_ratio` share of them use an `expr` returning one series per
+    device. Thresholds are set so roughly `fire_ratio` of the values exceed
+    them at any time.
+    """
+    threshold = 1.0 - fire_ratio
+    vector_every = int(1 / vector_ratio) if vector_ratio > 0 else 0
+    rules = []
+    for i in range(count):
+        rule = {
+            'name': f"bench_rule_{i}",
+            'condition': '>',
+            'threshold': threshold,
+            'duration': 0,
+            'severity': 'critical' if i % 10 == 0 else 'warning',
+            'email_subject': f"Benchmark alert {i}",
+            'email_body': 'Synthetic benchmark alert'
+        }
+        if vector_every and i % vector_every == 0:
+            rule['expr'] = f"bench_vector_{i % series}"
+        else:
+            rule['metric'] = f"bench_metric_{i % series}"
+        rules.append(rule)
+    return rules
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_step(rule_count: int, args, prometheus: FakePrometheus, sink: SMTPSink) -> Dict[str, Any]:
+    """Benchmark one rule set size"""
+    rules = make_rules(rule_count, args.series, args.fire_ratio, args.vector_ratio)
+    tracker = AlertTracker(cooldown_minutes=args.cooldown_minutes)
+    notifier = EmailNotifier(
+        smtp_server=sink.host, smtp_port=sink.port,
+        from_email='bench@localhost', username='bench', password='bench',
+        to_emails=['oncall@localhost'], starttls=False
+    )
+    engine = RuleEngine(PrometheusQuery(prometheus.url), tracker, notifier)
+    
+    emails_before = sink.count()
+    requests_before = prometheus.requests_served
+    
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # Two warmup cycles take rules from NORMAL through PENDING
+        for _ in range(args.warmup):
+            engine.evaluate_all_rules(rules)
+        
+        latencies = []
+        started_all = time.perf_counter()
+        for _ in range(args.cycles):
+            started = time.perf_counter()
+            engine.evaluate_all_rules(rules)
+            latencies.append(time.perf_counter() - started)
+        total = time.perf_counter() - started_all
+        
+        # Allocation profile of one extra cycle (tracing slows it down, so
+        # it is kept out of the latency numbers)
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        engine.evaluate_all_rules(rules)
+        alloc_current, alloc_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    
+    cycles_run = args.warmup + args.cycles + 1
+    return {
+        'rules': rule_count,
+        'series': args.series,
+        'cycles': args.cycles,
+        'latency_ms': {
+            'p50': percentile(latencies, 50) * 1000,
+            'p90': percentile(latencies, 90) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'max': max(latencies) * 1000,
+            'mean': statistics.mean(latencies) * 1000
+        },
+        'throughput_rules_per_s': rule_count * args.cycles / total if total else 0.0,
+        'queries_per_cycle': (prometheus.requests_served - requests_before) / cycles_run,
+        'emails_sent': sink.count() - emails_before,
+        'tracked_alerts': len(tracker.alerts),
+        'alloc_peak_bytes': alloc_peak,
+        'alloc_retained_bytes': alloc_current,
+        # ru_maxrss is in KiB on Linux and bytes on macOS; process-wide peak
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                       / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    }
+
+
+def git_commit() -> str:
+    """Current commit hash, or 'unknown' outside a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the alert engine rule evaluation cycle')
+    parser.add_argument('--rules', default='10,100,1000,10000',
+                        help='Comma-separated rule set sizes (default: 10,100,1000,10000)')
+    parser.add_argument('--series', type=int, default=1000, help='Distinct fake series')
+    parser.add_argument('--vector-size', type=int, default=10, help='Series per expr rule')
+    parser.add_argument('--vector-ratio', type=float, default=0.1, help='Share of expr rules')
+    parser.add_argument('--fire-ratio', type=float, default=0.01, help='Approximate share of firing rules')
+    parser.add_argument('--cooldown-minutes', type=float, default=15)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Fake Prometheus latency')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Fake Prometheus jitter')
+    parser.add_argument('--smtp-latency-ms', type=float, default=0.0, help='SMTP sink latency')
+    parser.add_argument('--cycles', type=int, default=10, help='Measured cycles per size')
+    parser.add_argument('--warmup', type=int, default=2, help='Unmeasured cycles per size')
+    parser.add_argument('--output', help='Result file (default: benchmarks/results/<time>-<commit>.json)')
+    args = parser.parse_args()
+    
+    prometheus = FakePrometheus(series=args.series, vector_size=args.vector_size,
+                                latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000).start()
+    sink = SMTPSink(latency=args.smtp_latency_ms / 1000).start()
+    
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': vars(args),
+        'results': []
+    }
+    
+    try:
+        for size in [int(n) for n in args.rules.split(',')]:
+            result = run_step(size, args, prometheus, sink)
+            report['results'].append(result)
+            latency = result['latency_ms']
+            print(f"rules={size:>7} p50={latency['p50']:9.2f}ms p99={latency['p99']:9.2f}ms "
+                  f"throughput={result['throughput_rules_per_s']:10.0f} rules/s "
+                  f"queries/cycle={result['queries_per_cycle']:7.0f} "
+                  f"alloc_peak={result['alloc_peak_bytes'] / 1e6:7.1f}MB "
+                  f"rss={result['peak_rss_mb']:6.1f}MB")
+    finally:
+        prometheus.stop()
+        sink.stop()
+    
+    output = args.output
+    if not output:
+        results_dir = os.path.join(BENCH_DIR, 'results')
+        os.makedirs(results_dir, exist_ok=True)
+        output = os.path.join(results_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✓ Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Scraping Prometheus
+Stand-in Prometheus that scrapes real exporters and answers selector queries
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sample_buffer import SELECTOR_RE, MATCHER_RE  # noqa: E402
+
+# One exposition line: name, optional {labels}, value (timestamps are ignored)
+LINE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)')
+LABEL_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+Series = Tuple[Dict[str, str], float]
+
+
+class ScrapingPrometheus:
+    """
+    Scrapes `targets` every `scrape_interval` seconds and serves
+    /api/v1/query and /-/healthy
+    
+    Only the latest sample of each series is kept, and only selector
+    queries (`name{label="value",...}`, any matcher operator) are
+    answered; anything else gets a bad_data error like an unsupported
+    expression would. Every scrape round builds a fresh index by metric
+    and by label value, so `name{site="x"}` costs the size of the site,
+    not of the fleet.
+    """
+    
+    def __init__(self, targets: List[str], scrape_interval: float = 5, timeout: float = 10):
+        self.targets = targets
+        self.scrape_interval = scrape_interval
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.executor = ThreadPoolExecutor(max_workers=min(16, max(1, len(targets))),
+                                           thread_name_prefix='scrape')
+        self.by_metric: Dict[str, List[Series]] = {}
+        self.by_label: Dict[Tuple[str, str, str], List[Series]] = {}
+        self.scrape_seconds: List[float] = []
+        self.scrape_failures = 0
+        self.queries_served = 0
+        self.running = False
+        self.server = None
+        self.threads: List[threading.Thread] = []
+    
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self) -> 'ScrapingPrometheus':
+        """Scrape once, then keep scraping and serve on a free local port"""
+        standin = self
+        self.scrape_once()
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True  # as in fake_prometheus.py
+            
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path == '/-/healthy':
+                    self._reply(200, b'Prometheus is Healthy.\n', 'text/plain')
+                elif parsed.path == '/api/v1/query':
+                    query = parse_qs(parsed.query).get('query', [''])[0]
+                    result = standin.query(query)
+                    status = 200 if result['status'] == 'success' else 400
+                    self._reply(status, json.dumps(result).encode(), 'application/json')
+                else:
+                    self._reply(404, b'not found\n', 'text/plain')
+            
+            def _reply(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self.server.serve_forever, name='standin-prometheus', daemon=True),
+            threading.Thread(target=self._scrape_loop, name='standin-scraper', daemon=True)
+        ]
+        for thread in self.threads:
+            thread.start()
+        return self
+    
+    def stop(self):
+        self.running = False
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        self.executor.shutdown(wait=True)
+        self.session.close()
+    
+    def _scrape_loop(self):
+        next_scrape = time.time() + self.scrape_interval
+        while self.running:
+            time.sleep(max(0.0, next_scrape - time.time()))
+            next_scrape += self.scrape_interval
+            if self.running:
+                self.scrape_once()
+    
+    def scrape_once(self) -> int:
+        """
+        Scrape every target and swap in the new index
+        
+        Returns:
+            Number of series stored
+        """
+        started = time.perf_counter()
+        by_metric: Dict[str, List[Series]] = {}
+        by_label: Dict[Tuple[str, str, str], List[Series]] = {}
+        count = 0
+        for target, text in zip(self.targets, self.executor.map(self._fetch, self.targets)):
+            if text is None:
+                continue
+            instance = urlparse(target).netloc
+            for line in text.splitlines():
+                match = LINE_RE.match(line)
+                if match is None:
+                    continue
+                name, body, value = match.groups()
+                labels = dict(LABEL_RE.findall(body or ''))
+                labels['instance'] = instance
+                series = ({'__name__': name, **labels}, float(value))
+                by_metric.setdefault(name, []).append(series)
+                for label, label_value in labels.items():
+                    by_label.setdefault((name, label, label_value), []).append(series)
+                count += 1
+        self.by_metric, self.by_label = by_metric, by_label
+        self.scrape_seconds.append(time.perf_counter() - started)
+        return count
+    
+    def _fetch(self, target: str) -> Optional[str]:
+        try:
+            response = self.session.get(target, timeout=self.timeout)
+            response.raise_for_status()
+            return response.text
+        except requests.exceptions.RequestException as e:
+            self.scrape_failures += 1
+            print(f"⚠ Scrape of {target} failed: {e}")
+            return None
+    
+    def select(self, query: str) -> Optional[List[Series]]:
+        """Series a selector picks, or None if the query is not a selector"""
+        match = SELECTOR_RE.match(query)
+        if match is None:
+            return None
+        name, body = match.groups()
+        matchers = []
+        pos = 0
+        while body and pos < len(body):
+            m = MATCHER_RE.match(body, pos)
+            if m is None:
+                return None
+            matchers.append(m.groups())
+            pos = m.end()
+        
+        # Start from the smallest equality index, then filter by the rest
+        by_metric, by_label = self.by_metric, self.by_label
+        candidates = by_metric.get(name, [])
+        for label, op, value in matchers:
+            if op == '=' and value:
+                indexed = by_label.get((name, label, value), [])
+                if len(indexed) < len(candidates):
+                    candidates = indexed
+        
+        checks = []
+        for label, op, value in matchers:
+            if op in ('=~', '!~'):
+                pattern = re.compile(f"^(?:{value})$")
+                checks.append(lambda v, p=pattern, neg=(op == '!~'): bool(p.match(v)) != neg)
+            else:
+                checks.append(lambda v, want=value, neg=(op == '!='): (v == want) != neg)
+        return [series for series in candidates
+                if all(check(series[0].get(label, '')) for (label, _, _), check in zip(matchers, checks))]
+    
+    def query(self, query: str) -> dict:
+        """Build an instant query response"""
+        self.queries_served += 1
+        series = self.select(query)
+        if series is None:
+            return {'status': 'error', 'errorType': 'bad_data',
+                    'error': f"stand-in only evaluates selectors: {query}"}
+        now = time.time()
+        return {'status': 'success', 'data': {'resultType': 'vector', 'result': [
+            {'metric': labels, 'value': [now, str(value)]} for labels, value in series]}}
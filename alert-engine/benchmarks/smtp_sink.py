@@ -0,0 +1,114 @@
+"""
+SMTP Sink
+Minimal local SMTP server that accepts and records every message
+"""
+
+import socketserver
+import threading
+import time
+from email import message_from_bytes
+from typing import List, Dict, Any
+
+
+class SMTPSink:
+    """
+    Accepts mail on a free local port without TLS
+    
+    Supports the commands smtplib uses (EHLO/HELO, AUTH, MAIL, RCPT, DATA,
+    RSET, NOOP, QUIT). Point EmailNotifier at it with starttls=False.
+    Received messages are kept with their arrival time.
+    """
+    
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.messages: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+    
+    @property
+    def host(self) -> str:
+        return self.server.server_address[0]
+    
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+    
+    def start(self) -> 'SMTPSink':
+        """Start serving on a free local port"""
+        sink = self
+        
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line: str):
+                self.wfile.write(f"{line}\r\n".encode())
+            
+            def handle(self):
+                self.reply('220 smtp-sink ESMTP')
+                recipients = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode(errors='replace').strip()
+                    verb = command.split(' ', 1)[0].upper()
+                    
+                    if verb == 'EHLO':
+                        self.reply('250-smtp-sink')
+                        self.reply('250 AUTH PLAIN LOGIN')
+                    elif verb == 'HELO':
+                        self.reply('250 smtp-sink')
+                    elif verb == 'AUTH':
+                        self.reply('235 Authentication successful')
+                    elif verb == 'MAIL':
+                        recipients = []
+                        self.reply('250 OK')
+                    elif verb == 'RCPT':
+                        recipients.append(command.split(':', 1)[-1].strip(' <>'))
+                        self.reply('250 OK')
+                    elif verb == 'DATA':
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                        data = []
+                        for data_line in self.rfile:
+                            if data_line in (b'.\r\n', b'.\n'):
+                                break
+                            data.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                        if sink.latency:
+                            time.sleep(sink.latency)
+                        sink._record(b''.join(data), recipients)
+                        self.reply('250 OK')
+                    elif verb in ('RSET', 'NOOP'):
+                        self.reply('250 OK')
+                    elif verb == 'QUIT':
+                        self.reply('221 Bye')
+                        return
+                    else:
+                        self.reply('502 Command not implemented')
+        
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       name='smtp-sink', daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        """Stop serving"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+    
+    def _record(self, data: bytes, recipients: List[str]):
+        """Store a received message"""
+        message = message_from_bytes(data)
+        with self.lock:
+            self.messages.append({
+                'received_at': time.time(),
+                'subject': message.get('Subject', ''),
+                'to': recipients,
+                'size': len(data)
+            })
+    
+    def count(self) -> int:
+        """Number of messages received"""
+        with self.lock:
+            return len(self.messages)
@@ -0,0 +1,167 @@
+"""
+Startup Benchmark
+Times each alert engine startup phase in fresh interpreters
+
+Usage (from alert-engine/):
+    python benchmarks/startup_benchmark.py --rules 100,1000,10000 --runs 5
+
+Each phase runs in its own subprocess so nothing is already imported or
+cached: importing app (and which heavy modules that pulls in), parsing the
+rule file with the pure-Python and libyaml loaders, and ConfigLoader
+load + validate without and with the compiled config cache.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Any
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ENGINE_DIR = os.path.dirname(BENCH_DIR)
+
+# Modules that should only load when the feature using them is enabled
+HEAVY_MODULES = ['yaml', 'requests', 'smtplib', 'email.mime.multipart', 'sqlite3',
+                 'numpy', 'webhook_notifier', 'ha', 'direct_scraper', 'sample_buffer']
+
+PHASES = {
+    'import_app': """
+import app
+""",
+    'yaml_pure': """
+import yaml
+with open(CONFIG, 'rb') as f:
+    source = f.read()
+started = time.perf_counter()
+yaml.load(source, Loader=yaml.SafeLoader)
+""",
+    'yaml_libyaml': """
+import yaml
+with open(CONFIG, 'rb') as f:
+    source = f.read()
+started = time.perf_counter()
+yaml.load(source, Loader=yaml.CSafeLoader)
+""",
+    'config_cold': """
+from config_loader import ConfigLoader
+started = time.perf_counter()
+loader = ConfigLoader(CONFIG, cache_path='')
+loader.load()
+assert loader.validate()
+""",
+    'config_warm': """
+from config_loader import ConfigLoader
+started = time.perf_counter()
+loader = ConfigLoader(CONFIG, cache_path=CACHE)
+loader.load()
+assert loader.validate()
+""",
+}
+
+RUNNER = """
+import contextlib, io, json, sys, time
+sys.path.insert(0, {engine_dir!r})
+CONFIG, CACHE = {config!r}, {cache!r}
+started = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+{body}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'modules': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def write_config(path: str, rule_count: int):
+    """Write a valid config with `rule_count` alert rules"""
+    import yaml
+    config = {
+        'prometheus': {'url': 'http://localhost:9090', 'scrape_interval': 30},
+        'email': {
+            'smtp_server': 'localhost', 'smtp_port': 25, 'from_email': 'bench@localhost',
+            'to_emails': ['oncall@localhost'], 'username': 'bench', 'password': 'bench'
+        },
+        'alert_rules': [{
+            'name': f"bench_rule_{i}",
+            'metric': f"bench_metric_{i % 1000}",
+            'condition': '>',
+            'threshold': 90,
+            'duration': 60,
+            'severity': ('critical', 'warning', 'info')[i % 3],
+            'description': f"Benchmark rule {i}",
+            'email_subject': f"Benchmark rule {i} fired",
+            'email_body': 'Value exceeded 90.'
+        } for i in range(rule_count)]
+    }
+    with open(path, 'w') as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+
+
+def run_phase(phase: str, config: str, cache: str) -> Dict[str, Any]:
+    """Run one phase in a fresh interpreter"""
+    body = '\n'.join('    ' + line for line in PHASES[phase].strip().splitlines())
+    script = RUNNER.format(engine_dir=ENGINE_DIR, config=config, cache=cache,
+                           body=body, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-c', script], cwd=ENGINE_DIR,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_step(rule_count: int, runs: int, workdir: str) -> Dict[str, Any]:
+    """Benchmark every phase for one rule set size"""
+    config = os.path.join(workdir, f"rules-{rule_count}.yaml")
+    cache = f"{config}.cache"
+    write_config(config, rule_count)
+    # Compile the cache once so config_warm measures a hit
+    run_phase('config_warm', config, cache)
+    
+    result: Dict[str, Any] = {'rules': rule_count, 'config_bytes': os.path.getsize(config)}
+    for phase in PHASES:
+        samples: List[float] = []
+        for _ in range(runs):
+            sample = run_phase(phase, config, cache)
+            samples.append(sample['seconds'])
+        result[phase] = {
+            'median_ms': statistics.median(samples) * 1000,
+            'min_ms': min(samples) * 1000,
+            'modules': sample['modules']
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark alert engine startup phases')
+    parser.add_argument('--rules', default='100,1000,10000',
+                        help='Comma-separated rule set sizes (default: 100,1000,10000)')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per phase')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    args = parser.parse_args()
+    
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': vars(args),
+        'results': []
+    }
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in [int(n) for n in args.rules.split(',')]:
+            result = run_step(size, args.runs, workdir)
+            report['results'].append(result)
+            print(f"rules={size:>7} " + ' '.join(
+                f"{phase}={result[phase]['median_ms']:8.1f}ms" for phase in PHASES))
+    
+    print(f"modules loaded by 'import app': {', '.join(report['results'][-1]['import_app']['modules'])}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Webhook Sink
+Minimal local HTTP server that accepts and records webhook POSTs
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any
+
+
+class WebhookSink:
+    """
+    Accepts JSON POSTs on a free local port
+    
+    Every request is answered with `status` (set it to 500 or 503 to test
+    retries and circuit breaking) after `latency` seconds. Received payloads
+    are kept with their arrival time and path, and `connections` counts the
+    TCP connections opened, which shows whether keep-alive is reused.
+    """
+    
+    def __init__(self, status: int = 200, latency: float = 0.0):
+        self.status = status
+        self.latency = latency
+        self.requests: List[Dict[str, Any]] = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self) -> 'WebhookSink':
+        """Start serving on a free local port"""
+        sink = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True  # as in fake_prometheus.py
+            
+            def setup(self):
+                super().setup()
+                with sink.lock:
+                    sink.connections += 1
+            
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if sink.latency:
+                    time.sleep(sink.latency)
+                status = sink.status
+                if status < 300:
+                    sink._record(self.path, body)
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       name='webhook-sink', daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        """Stop serving"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+    
+    def _record(self, path: str, body: bytes):
+        """Store an accepted payload"""
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        with self.lock:
+            self.requests.append({
+                'received_at': time.time(),
+                'path': path,
+                'payload': payload
+            })
+    
+    def count(self) -> int:
+        """Number of accepted requests"""
+        with self.lock:
+            return len(self.requests)
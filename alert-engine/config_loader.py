@@ -3,31 +3,134 @@ Configuration Loader
 Loads alert rules and email settings from YAML file
 """
 
-import yaml
+import hashlib
+import importlib.util
+import marshal
 import os
-from typing import Dict, List, Any
+import tempfile
+from typing import Dict, List, Any, Optional
+
+from recording_rules import RecordingRules
+from routing import AlertDispatcher
+from rule_table import RuleTable
+
+# Modules whose checks decide what validate() accepts. Their code is part
+# of the cache key, so changing any of them revalidates cached configs.
+VALIDATOR_MODULES = ('config_loader', 'rule_table', 'rule_engine', 'recording_rules',
+                     'routing', 'silences', 'webhook_notifier', 'tenants')
+
+# Directory for compiled config caches (default: the system temp directory,
+# since the config itself is often on a read-only mount)
+CACHE_DIR_ENV = 'ALERT_CONFIG_CACHE_DIR'
+
+_validator_digest: Optional[str] = None
+
+
+def validator_digest() -> Optional[str]:
+    """
+    sha256 over the files VALIDATOR_MODULES are loaded from
+    
+    Uses each module's import loader, so it works whether the modules ship
+    as source, as .pyc only or inside a zipapp. The files are read, not
+    imported.
+    
+    Returns:
+        Hex digest, or None if a module's file can't be read (no caching)
+    """
+    global _validator_digest
+    if _validator_digest is None:
+        digest = hashlib.sha256()
+        for name in VALIDATOR_MODULES:
+            spec = importlib.util.find_spec(name)
+            if spec is None or not spec.has_location or not hasattr(spec.loader, 'get_data'):
+                print(f"⚠ Config cache disabled: cannot locate module {name}")
+                return None
+            try:
+                digest.update(spec.loader.get_data(spec.origin))
+            except OSError as e:
+                print(f"⚠ Config cache disabled: cannot read module {name}: {e}")
+                return None
+        _validator_digest = digest.hexdigest()
+    return _validator_digest
+
+
+def default_cache_path(config_path: str) -> str:
+    """Cache file of a config in $ALERT_CONFIG_CACHE_DIR (or the temp directory)"""
+    directory = os.environ.get(CACHE_DIR_ENV) or tempfile.gettempdir()
+    # Tenants' configs often share a file name, so add a hash of the full path
+    path_hash = hashlib.sha256(os.path.abspath(config_path).encode()).hexdigest()[:12]
+    return os.path.join(directory, f"{os.path.basename(config_path)}.{path_hash}.cache")
 
 
 class ConfigLoader:
     """Loads and validates configuration from alert_rules.yaml"""
     
-    def __init__(self, config_path: str = "alert_rules.yaml"):
+    def __init__(self, config_path: str = "alert_rules.yaml", cache_path: Optional[str] = None):
         self.config_path = config_path
+        # Validated config keyed by the sha256 of the file and of the
+        # validating code (empty string disables it)
+        self.cache_path = default_cache_path(config_path) if cache_path is None else cache_path
         self.config = None
+        self.digest = None
+        self.validated = False
+        self.rule_table: Optional[RuleTable] = None
         
     def load(self) -> Dict[str, Any]:
-        """Load configuration from YAML file"""
+        """Load configuration from the compiled cache, or else the YAML file"""
         try:
-            with open(self.config_path, 'r') as f:
-                self.config = yaml.safe_load(f)
-            print(f"✓ Configuration loaded from {self.config_path}")
-            return self.config
+            with open(self.config_path, 'rb') as f:
+                source = f.read()
         except FileNotFoundError:
             print(f"✗ Configuration file not found: {self.config_path}")
             raise
+        
+        validators = validator_digest()
+        self.digest = hashlib.sha256(source + validators.encode()).hexdigest() if validators else None
+        self.rule_table = None
+        self.config = self._read_cache()
+        if self.config is not None:
+            self.validated = True
+            print(f"✓ Configuration loaded from {self.config_path} (compiled cache)")
+            return self.config
+        
+        # Only a cache miss needs the YAML parser; prefer the libyaml C loader
+        import yaml
+        try:
+            self.config = yaml.load(source, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
         except yaml.YAMLError as e:
             print(f"✗ Error parsing YAML configuration: {e}")
             raise
+        self.validated = False
+        print(f"✓ Configuration loaded from {self.config_path}")
+        return self.config
+    
+    def _read_cache(self) -> Optional[Dict[str, Any]]:
+        """Get the cached config if it was compiled from the same file and validators"""
+        if not self.cache_path or not self.digest or not os.path.exists(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path, 'rb') as f:
+                digest, config = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if digest != self.digest:
+            return None
+        return config
+    
+    def _write_cache(self):
+        """Store the validated config for the next start (best effort)"""
+        if not self.cache_path or not self.digest:
+            return
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                marshal.dump((self.digest, self.config), f)
+            os.replace(tmp_path, self.cache_path)
+        except ValueError:
+            # Values marshal can't store (e.g. YAML timestamps): parse every time
+            os.remove(tmp_path)
+        except OSError as e:
+            print(f"⚠ Could not write config cache: {e}")
     
     def get_prometheus_config(self) -> Dict[str, Any]:
         """Get Prometheus configuration"""
@@ -41,17 +144,70 @@ class ConfigLoader:
         """Get general alert settings"""
         return self.config.get('alert_settings', {})
     
+    def get_debug_config(self) -> Dict[str, Any]:
+        """Get debug endpoint settings"""
+        return self.config.get('debug', {})
+    
+    def get_silences_config(self) -> Dict[str, Any]:
+        """Get silence storage settings"""
+        return self.config.get('silences', {})
+    
+    def get_fallback_config(self) -> Dict[str, Any]:
+        """Get direct-scrape fallback settings"""
+        return self.config.get('fallback', {})
+    
+    def get_webhook_config(self) -> Dict[str, Any]:
+        """Get webhook delivery settings"""
+        return self.config.get('webhook', {})
+    
+    def get_rate_limit_config(self) -> Dict[str, Any]:
+        """Get outbound notification rate limits (per channel)"""
+        return self.config.get('rate_limits', {})
+    
+    def get_ha_config(self) -> Dict[str, Any]:
+        """Get active/standby settings"""
+        return self.config.get('ha', {})
+    
+    def get_scheduler_config(self) -> Dict[str, Any]:
+        """Get evaluation scheduling settings"""
+        return self.config.get('scheduler', {})
+    
+    def get_tenants(self) -> List[Dict[str, Any]]:
+        """Get the tenants hosted next to the main rule set"""
+        return self.config.get('tenants', [])
+    
+    def get_tenant_pool_config(self) -> Dict[str, Any]:
+        """Get settings of the resources tenants share"""
+        return self.config.get('tenant_pool', {})
+    
     def get_alert_rules(self) -> List[Dict[str, Any]]:
         """Get list of alert rules"""
         return self.config.get('alert_rules', [])
     
+    def get_rule_table(self) -> RuleTable:
+        """Get the validated alert rules, indexed by name, metric and severity"""
+        if self.rule_table is None:
+            self.rule_table = RuleTable(self.get_alert_rules())
+        return self.rule_table
+    
+    def get_recording_rules(self) -> List[Dict[str, Any]]:
+        """Get list of recording rules"""
+        return self.config.get('recording_rules', [])
+    
     def validate(self) -> bool:
         """Validate configuration has required fields"""
         if not self.config:
             return False
         
-        # Check required sections
-        required_sections = ['prometheus', 'email', 'alert_rules']
+        # The compiled cache only ever holds configs that passed validation
+        if self.validated:
+            print(f"✓ Configuration validated successfully ({len(self.get_alert_rules())} rules, cached)")
+            return True
+        
+        # Check required sections (a main config hosting tenants may have no rules)
+        required_sections = ['prometheus', 'email']
+        if 'tenants' not in self.config:
+            required_sections.append('alert_rules')
         for section in required_sections:
             if section not in self.config:
                 print(f"✗ Missing required section: {section}")
@@ -67,9 +223,42 @@ class ConfigLoader:
         
         # Check alert rules
         alert_rules = self.get_alert_rules()
-        if not alert_rules:
+        if not alert_rules and 'tenants' not in self.config:
             print("✗ No alert rules defined")
             return False
         
+        if not RuleTable.validate(alert_rules):
+            return False
+        
+        # Check recording rules
+        if not RecordingRules.validate(self.get_recording_rules()):
+            return False
+        
+        # Check routing tree, receivers and inhibit rules
+        if not AlertDispatcher.validate(self.config):
+            return False
+        
+        # Check tenants (their own rule files are validated when loaded)
+        if 'tenants' in self.config:
+            from tenants import TenantPool
+            if not TenantPool.validate(self.get_tenants(), self.get_tenant_pool_config()):
+                return False
+        
+        # Check direct-scrape fallback
+        fallback_config = self.get_fallback_config()
+        if fallback_config.get('enabled', False) and not fallback_config.get('targets'):
+            print("✗ Fallback is enabled but no scrape targets are configured")
+            return False
+        
         print(f"✓ Configuration validated successfully ({len(alert_rules)} rules)")
+        self.validated = True
+        self._write_cache()
         return True
+
+
+if __name__ == '__main__':
+    # Precompile the config cache, exiting non-zero if the config is invalid
+    loader = ConfigLoader()
+    loader.load()
+    if not loader.validate():
+        raise SystemExit(1)
@@ -0,0 +1,97 @@
+"""
+Direct Scraper
+Scrapes target /metrics endpoints into the local sample buffer
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Union
+from urllib.parse import urlparse
+
+import requests
+from prometheus_client.parser import text_string_to_metric_families
+
+from sample_buffer import SampleBuffer
+from metrics import fallback_scrapes_total, fallback_series, fallback_buffer_bytes
+
+
+class DirectScraper:
+    """
+    Scrapes the same exporters Prometheus does, on a background thread
+    
+    Targets are URLs or {'url': ..., 'labels': {...}} dicts. Every sample
+    gets an 'instance' label (host:port of the target) plus the target's
+    extra labels, so selectors written for Prometheus keep matching.
+    """
+    
+    def __init__(self, targets: List[Union[str, Dict[str, Any]]], buffer: SampleBuffer,
+                 interval: float = 5, workers: int = 8):
+        self.targets = [t if isinstance(t, dict) else {'url': t} for t in targets]
+        self.buffer = buffer
+        self.interval = interval
+        self.timeout = max(1.0, interval * 0.8)
+        self.session = requests.Session()
+        self.executor = ThreadPoolExecutor(max_workers=min(workers, max(1, len(self.targets))),
+                                           thread_name_prefix='direct-scrape')
+        self.thread = None
+        self.is_running = False
+    
+    def start(self):
+        """Start scraping in the background"""
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, name='direct-scraper', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """Stop scraping"""
+        self.is_running = False
+    
+    def _run(self):
+        last_cleanup = time.time()
+        while self.is_running:
+            started = time.time()
+            self.scrape_once()
+            
+            # Stale series and the size gauges don't need updating every scrape
+            if started - last_cleanup >= 60:
+                self.buffer.drop_stale(started)
+                fallback_buffer_bytes.set(self.buffer.memory_bytes())
+                last_cleanup = started
+            fallback_series.set(self.buffer.series_count())
+            
+            time.sleep(max(0.0, self.interval - (time.time() - started)))
+    
+    def scrape_once(self) -> int:
+        """
+        Scrape every target once
+        
+        Returns:
+            Number of samples stored
+        """
+        return sum(self.executor.map(self._scrape_target, self.targets))
+    
+    def _scrape_target(self, target: Dict[str, Any]) -> int:
+        """Scrape one target into the buffer"""
+        url = target['url']
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            families = list(text_string_to_metric_families(response.text))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            fallback_scrapes_total.labels(status='failed').inc()
+            print(f"⚠ Direct scrape of {url} failed: {e}")
+            return 0
+        
+        now = time.time()
+        extra = {'instance': urlparse(url).netloc, **target.get('labels', {})}
+        stored = 0
+        for family in families:
+            for sample in family.samples:
+                timestamp = sample.timestamp or now
+                self.buffer.append(sample.name, {**sample.labels, **extra},
+                                   float(timestamp), sample.value)
+                stored += 1
+        
+        fallback_scrapes_total.labels(status='success').inc()
+        return stored
@@ -2,21 +2,28 @@
 Email Notifier - Sends alert emails via Gmail SMTP
 """
 
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 from datetime import datetime
 import logging
+import time
+
+from notifier import Notifier
+from metrics import emails_sent_total, cycle_stages
+
+if TYPE_CHECKING:
+    from email.mime.multipart import MIMEMultipart
 
 logger = logging.getLogger(__name__)
 
 
-class EmailNotifier:
+class EmailNotifier(Notifier):
     """Handles sending email notifications via Gmail SMTP"""
     
+    channel = 'email'
+    
     def __init__(self, smtp_server: str, smtp_port: int, from_email: str,
-                 username: str, password: str, to_emails: List[str], enabled: bool = True):
+                 username: str, password: str, to_emails: List[str], enabled: bool = True,
+                 starttls: bool = True):
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
         self.from_email = from_email
@@ -24,52 +31,207 @@ class EmailNotifier:
         self.password = password
         self.to_emails = to_emails
         self.enabled = enabled
+        self.starttls = starttls
         self.emails_sent_success = 0
         self.emails_failed = 0
+    
+    def send(self, alerts: List[Dict[str, Any]], group_labels: Dict[str, str],
+             receiver: Dict[str, Any]) -> bool:
+        """Email a receiver (its `email_to`, or the default recipients)"""
+        to_emails = receiver.get('email_to') or None
+        if len(alerts) > 1:
+            return self.send_group_email(group_labels, alerts, to_emails)
+        
+        alert = alerts[0]
+        rule = alert['rule']
+        query = rule.get('expr') or rule['metric']
+        if alert['status'] == 'firing':
+            return self.send_alert_email(
+                rule_name=alert['key'],
+                subject=rule['email_subject'],
+                body=rule['email_body'],
+                metric_name=query,
+                current_value=alert['value'],
+                threshold=rule['threshold'],
+                condition=rule['condition'],
+                severity=rule['severity'],
+                to_emails=to_emails
+            )
+        return self.send_resolution_email(
+            rule_name=alert['key'],
+            subject=rule['email_subject'],
+            metric_name=query,
+            current_value=alert['value'],
+            to_emails=to_emails
+        )
         
     def send_alert_email(self, rule_name: str, subject: str, body: str,
                         metric_name: str, current_value: float, 
-                        threshold: float, condition: str, severity: str) -> bool:
+                        threshold: float, condition: str, severity: str,
+                        to_emails: Optional[List[str]] = None) -> bool:
         """Send alert notification email"""
+        to_emails = to_emails or self.to_emails
         if not self.enabled:
             logger.info(f"📧 [MOCK MODE] Would send alert email:")
             logger.info(f"   Alert: {rule_name} ({severity})")
             logger.info(f"   Metric: {metric_name} = {current_value} (threshold: {condition} {threshold})")
-            logger.info(f"   To: {', '.join(self.to_emails)}")
+            logger.info(f"   To: {', '.join(to_emails)}")
             logger.info(f"   Subject: {subject}")
-            self.emails_sent_success += 1
+            self._record_result(True)
             return True
         
         try:
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.from_email
-            msg['To'] = ', '.join(self.to_emails)
-            msg['Subject'] = subject
+            started = time.perf_counter()
+            msg = self._new_message(to_emails, subject)
             
             html_body, plain_body = self._format_alert_email(
                 rule_name, severity, metric_name, 
                 current_value, threshold, condition, body
             )
             
-            # Attach plain text version first (fallback)
-            msg.attach(MIMEText(plain_body, 'plain'))
-            # Attach HTML version (preferred)
-            msg.attach(MIMEText(html_body, 'html'))
+            # Plain text version first (fallback), then HTML (preferred)
+            self._attach_bodies(msg, plain_body, html_body)
+            cycle_stages.add('render', time.perf_counter() - started)
             
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.username, self.password)
-                server.send_message(msg)
+            self._deliver(msg)
             
-            self.emails_sent_success += 1
+            self._record_result(True)
             logger.info(f"✅ Alert email sent successfully")
             return True
-            
+        
         except Exception as e:
-            self.emails_failed += 1
+            self._record_result(False)
             logger.error(f"✗ Failed to send email: {e}")
             return False
     
+    def send_resolution_email(self, rule_name: str, subject: str,
+                              metric_name: str, current_value: float,
+                              to_emails: Optional[List[str]] = None) -> bool:
+        """Send "all clear" notification email"""
+        resolved_subject = f"✅ RESOLVED: {subject}"
+        to_emails = to_emails or self.to_emails
+        
+        if not self.enabled:
+            logger.info(f"📧 [MOCK MODE] Would send resolution email:")
+            logger.info(f"   Alert: {rule_name}")
+            logger.info(f"   Metric: {metric_name} = {current_value}")
+            logger.info(f"   To: {', '.join(to_emails)}")
+            logger.info(f"   Subject: {resolved_subject}")
+            self._record_result(True)
+            return True
+        
+        try:
+            started = time.perf_counter()
+            msg = self._new_message(to_emails, resolved_subject)
+            
+            html_body, plain_body = self._format_resolution_email(
+                rule_name, metric_name, current_value
+            )
+            
+            self._attach_bodies(msg, plain_body, html_body)
+            cycle_stages.add('render', time.perf_counter() - started)
+            
+            self._deliver(msg)
+            
+            self._record_result(True)
+            logger.info(f"✅ Resolution email sent successfully")
+            return True
+        
+        except Exception as e:
+            self._record_result(False)
+            logger.error(f"✗ Failed to send resolution email: {e}")
+            return False
+    
+    def send_group_email(self, group_labels: Dict[str, str], alerts: List[Dict[str, Any]],
+                         to_emails: Optional[List[str]] = None) -> bool:
+        """
+        Send one email summarizing a group of alerts
+        
+        Args:
+            group_labels: Labels shared by the group (its `group_by` values)
+            alerts: Alert dicts with 'key', 'rule', 'value' and 'status'
+            to_emails: Recipients (default: the configured to_emails)
+        """
+        to_emails = to_emails or self.to_emails
+        firing = [a for a in alerts if a['status'] == 'firing']
+        resolved = [a for a in alerts if a['status'] != 'firing']
+        severity = 'critical' if any(a['rule'].get('severity') == 'critical' for a in firing) \
+            else 'warning' if firing else 'resolved'
+        group_name = ', '.join(f"{k}={v}" for k, v in group_labels.items()) or 'all alerts'
+        subject = (f"{'🚨' if firing else '✅'} [{len(firing)} FIRING, {len(resolved)} RESOLVED] "
+                   f"{group_name}")
+        
+        if not self.enabled:
+            logger.info(f"📧 [MOCK MODE] Would send group email:")
+            logger.info(f"   Group: {group_name} ({severity})")
+            for alert in alerts:
+                logger.info(f"   {alert['status'].upper()}: {alert['key']} = {alert['value']}")
+            logger.info(f"   To: {', '.join(to_emails)}")
+            logger.info(f"   Subject: {subject}")
+            self._record_result(True)
+            return True
+        
+        try:
+            started = time.perf_counter()
+            msg = self._new_message(to_emails, subject)
+            
+            html_body, plain_body = self._format_group_email(group_name, severity, firing, resolved)
+            
+            self._attach_bodies(msg, plain_body, html_body)
+            cycle_stages.add('render', time.perf_counter() - started)
+            
+            self._deliver(msg)
+            
+            self._record_result(True)
+            logger.info(f"✅ Group email sent successfully ({len(alerts)} alerts)")
+            return True
+        
+        except Exception as e:
+            self._record_result(False)
+            logger.error(f"✗ Failed to send group email: {e}")
+            return False
+    
+    def _new_message(self, to_emails: List[str], subject: str) -> 'MIMEMultipart':
+        """Start a multipart/alternative message (email modules load on first use)"""
+        from email.mime.multipart import MIMEMultipart
+        
+        msg = MIMEMultipart('alternative')
+        msg['From'] = self.from_email
+        msg['To'] = ', '.join(to_emails)
+        msg['Subject'] = subject
+        return msg
+    
+    @staticmethod
+    def _attach_bodies(msg: 'MIMEMultipart', plain_body: str, html_body: str):
+        """Attach the plain text (fallback) and HTML (preferred) versions"""
+        from email.mime.text import MIMEText
+        
+        msg.attach(MIMEText(plain_body, 'plain'))
+        msg.attach(MIMEText(html_body, 'html'))
+    
+    def _deliver(self, msg: 'MIMEMultipart'):
+        """Send a message through the SMTP server"""
+        import smtplib
+        
+        started = time.perf_counter()
+        try:
+            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
+                if self.starttls:
+                    server.starttls()
+                server.login(self.username, self.password)
+                server.send_message(msg)
+        finally:
+            cycle_stages.add('smtp_send', time.perf_counter() - started)
+            
+    def _record_result(self, success: bool):
+        """Count a sent or failed notification email"""
+        if success:
+            self.emails_sent_success += 1
+            emails_sent_total.labels(status='success').inc()
+        else:
+            self.emails_failed += 1
+            emails_sent_total.labels(status='failed').inc()
+    
     def send_test_email(self) -> bool:
         """Send a test email to verify configuration"""
         if not self.enabled:
@@ -77,10 +239,7 @@ class EmailNotifier:
             return True
             
         try:
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.from_email
-            msg['To'] = ', '.join(self.to_emails)
-            msg['Subject'] = "🧪 Test Email - Symphony IoT Alert Engine"
+            msg = self._new_message(self.to_emails, "🧪 Test Email - Symphony IoT Alert Engine")
             
             # Plain text version
             plain_text = "This is a test email from Symphony IoT Alert Engine.\n\nIf you received this, your email configuration is working correctly!"
@@ -129,13 +288,9 @@ class EmailNotifier:
 </html>
 """
             
-            msg.attach(MIMEText(plain_text, 'plain'))
-            msg.attach(MIMEText(html_text, 'html'))
+            self._attach_bodies(msg, plain_text, html_text)
             
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.username, self.password)
-                server.send_message(msg)
+            self._deliver(msg)
             
             logger.info("✅ Test email sent successfully")
             return True
@@ -377,6 +532,132 @@ Note: This alert will not repeat for 15 minutes to prevent spam.
 Powered by Symphony IoT Alert Engine
 Orchestrated monitoring for intelligent IoT systems
 {'='*60}
+"""
+        
+        return html, plain_text
+    
+    def _format_resolution_email(self, rule_name: str, metric_name: str,
+                                 current_value: float) -> tuple:
+        """Format resolution email with HTML template and plain text fallback"""
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')
+        
+        html = f"""<!DOCTYPE html>
+<html>
+<head><meta charset="UTF-8"></head>
+<body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; background-color: #f3f4f6;">
+    <table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f3f4f6; padding: 20px;">
+        <tr>
+            <td align="center">
+                <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 12px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);">
+                    <tr>
+                        <td style="background: linear-gradient(135deg, #10B981 0%, #059669 100%); padding: 40px; text-align: center; border-radius: 12px 12px 0 0;">
+                            <h1 style="margin: 0; color: #ffffff; font-size: 32px;">✅</h1>
+                            <h2 style="margin: 10px 0 0 0; color: #ffffff; font-size: 24px; font-weight: 600;">Alert Resolved</h2>
+                        </td>
+                    </tr>
+                    <tr>
+                        <td style="padding: 40px; text-align: center;">
+                            <p style="margin: 0 0 10px 0; color: #111827; font-size: 20px; font-weight: 700;">{rule_name.replace('_', ' ').title()}</p>
+                            <p style="margin: 0 0 20px 0; color: #6b7280; font-size: 14px; font-family: 'Courier New', Monaco, monospace;">{metric_name} = {current_value}</p>
+                            <p style="margin: 0; color: #6b7280; font-size: 13px;">🕐 {timestamp}</p>
+                        </td>
+                    </tr>
+                    <tr>
+                        <td style="background-color: #1f2937; padding: 25px; text-align: center; border-radius: 0 0 12px 12px;">
+                            <p style="margin: 0; color: #9ca3af; font-size: 12px;">
+                                Powered by <strong style="color: #ffffff;">Symphony IoT Alert Engine</strong>
+                            </p>
+                        </td>
+                    </tr>
+                </table>
+            </td>
+        </tr>
+    </table>
+</body>
+</html>"""
+        
+        plain_text = f"""
+{'='*60}
+✅ ALERT RESOLVED
+{'='*60}
+
+Alert Name:     {rule_name}
+Metric:         {metric_name}
+Current Value:  {current_value}
+Timestamp:      {timestamp}
+
+The alert condition is no longer met.
+
+{'='*60}
+Powered by Symphony IoT Alert Engine
+{'='*60}
+"""
+        
+        return html, plain_text
+    
+    def _format_group_email(self, group_name: str, severity: str,
+                            firing: List[Dict[str, Any]], resolved: List[Dict[str, Any]]) -> tuple:
+        """Format a grouped notification as an HTML table with plain text fallback"""
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')
+        color = {'critical': '#DC2626', 'warning': '#F59E0B'}.get(severity, '#10B981')
+        
+        def rows(alerts: List[Dict[str, Any]], status_color: str) -> str:
+            return ''.join(f"""
+                                <tr>
+                                    <td style="padding: 8px 12px; border-bottom: 1px solid #e5e7eb; color: {status_color}; font-weight: 700; font-size: 12px; text-transform: uppercase;">{a['status']}</td>
+                                    <td style="padding: 8px 12px; border-bottom: 1px solid #e5e7eb; color: #111827; font-size: 13px; font-family: 'Courier New', Monaco, monospace;">{a['key']}</td>
+                                    <td style="padding: 8px 12px; border-bottom: 1px solid #e5e7eb; color: #111827; font-size: 13px; text-align: right;">{a['value']}</td>
+                                </tr>""" for a in alerts)
+        
+        html = f"""<!DOCTYPE html>
+<html>
+<head><meta charset="UTF-8"></head>
+<body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; background-color: #f3f4f6;">
+    <table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f3f4f6; padding: 20px;">
+        <tr>
+            <td align="center">
+                <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 12px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);">
+                    <tr>
+                        <td style="background-color: {color}; padding: 30px; text-align: center; border-radius: 12px 12px 0 0;">
+                            <h2 style="margin: 0; color: #ffffff; font-size: 22px; font-weight: 600;">{len(firing)} firing, {len(resolved)} resolved</h2>
+                            <p style="margin: 8px 0 0 0; color: rgba(255, 255, 255, 0.95); font-size: 14px;">{group_name}</p>
+                        </td>
+                    </tr>
+                    <tr>
+                        <td style="padding: 25px;">
+                            <table width="100%" cellpadding="0" cellspacing="0" style="border: 1px solid #e5e7eb; border-radius: 8px;">{rows(firing, color)}{rows(resolved, '#10B981')}
+                            </table>
+                            <p style="margin: 20px 0 0 0; color: #6b7280; font-size: 13px; text-align: center;">🕐 {timestamp}</p>
+                        </td>
+                    </tr>
+                    <tr>
+                        <td style="background-color: #1f2937; padding: 25px; text-align: center; border-radius: 0 0 12px 12px;">
+                            <p style="margin: 0; color: #9ca3af; font-size: 12px;">
+                                Powered by <strong style="color: #ffffff;">Symphony IoT Alert Engine</strong>
+                            </p>
+                        </td>
+                    </tr>
+                </table>
+            </td>
+        </tr>
+    </table>
+</body>
+</html>"""
+        
+        lines = [f"{a['status'].upper():<10} {a['key']} = {a['value']}" for a in firing + resolved]
+        plain_text = f"""
+{'='*60}
+ALERT GROUP: {group_name}
+{len(firing)} firing, {len(resolved)} resolved
+{'='*60}
+
+{chr(10).join(lines)}
+
+Timestamp: {timestamp}
+
+{'='*60}
+Powered by Symphony IoT Alert Engine
+{'='*60}
 """
         
         return html, plain_text
@@ -0,0 +1,306 @@
+"""
+High Availability
+Active/standby leader election and alert state replication through SQLite
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from metrics import ha_leader, ha_transitions_total, ha_promotions_total
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lease (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    token INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transitions (
+    key TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    token INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transitions_seq ON transitions (seq);
+-- Last sequence number handed out; never goes down, even when compaction
+-- deletes the newest entries (stores from before it start at their MAX(seq))
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (name, value) SELECT 'seq', COALESCE(MAX(seq), 0) FROM transitions;
+"""
+
+LEASE_NAME = 'alert-engine'
+
+
+class LeaseStore:
+    """
+    Lease and transition log shared by the replicas (one SQLite file)
+    
+    The lease row names the leader and carries a fencing token that grows
+    with every change of leader (a holder renewing late keeps its token).
+    Sequence numbers come from a counter that never goes down, so a
+    standby's position in the log stays valid across compaction. Transition writes only succeed while the
+    writer still holds the lease with its token, so a deposed leader can't
+    overwrite its successor's state. The log keeps one row per alert key
+    (the latest), which bounds it by the number of tracked alerts; rows of
+    alerts back to normal are deleted once standbys have had time to read
+    them.
+    """
+    
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=10, isolation_level=None,
+                                          check_same_thread=False)
+        # WAL keeps commits cheap enough to log every transition
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+    
+    def close(self):
+        with self.lock:
+            self.connection.close()
+    
+    def acquire(self, node_id: str, lease_seconds: float) -> Optional[int]:
+        """
+        Take or renew the lease
+        
+        Returns:
+            Fencing token if `node_id` holds the lease, None otherwise
+        """
+        now = self.clock()
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                row = cursor.execute('SELECT holder, token, expires_at FROM lease WHERE name = ?',
+                                     (LEASE_NAME,)).fetchone()
+                if row and row[0] != node_id and row[2] > now:
+                    cursor.execute('COMMIT')
+                    return None
+                # The token only changes with the holder: nobody else wrote in between
+                token = row[1] if row and row[0] == node_id else (row[1] + 1 if row else 1)
+                cursor.execute('INSERT OR REPLACE INTO lease (name, holder, token, expires_at) '
+                               'VALUES (?, ?, ?, ?)', (LEASE_NAME, node_id, token, now + lease_seconds))
+                cursor.execute('COMMIT')
+                return token
+            except sqlite3.Error:
+                cursor.execute('ROLLBACK')
+                raise
+    
+    def release(self, node_id: str, token: int):
+        """Give up the lease so a standby can take over right away"""
+        with self.lock:
+            self.connection.execute('UPDATE lease SET expires_at = 0 '
+                                    'WHERE name = ? AND holder = ? AND token = ?',
+                                    (LEASE_NAME, node_id, token))
+    
+    def holds(self, node_id: str, token: int) -> bool:
+        """Whether `node_id` still holds an unexpired lease with `token`"""
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT 1 FROM lease WHERE name = ? AND holder = ? AND token = ? AND expires_at > ?',
+                (LEASE_NAME, node_id, token, self.clock())).fetchone()
+        return row is not None
+    
+    def append(self, node_id: str, token: int, key: str, state: str,
+               data: Dict[str, Any]) -> Optional[int]:
+        """
+        Log an alert's latest state (fenced by the lease)
+        
+        Returns:
+            Sequence number of the entry, or None if the lease is lost
+        """
+        now = self.clock()
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                if cursor.execute(
+                        'SELECT 1 FROM lease WHERE name = ? AND holder = ? AND token = ? AND expires_at > ?',
+                        (LEASE_NAME, node_id, token, now)).fetchone() is None:
+                    cursor.execute('COMMIT')
+                    return None
+                cursor.execute("UPDATE meta SET value = value + 1 WHERE name = 'seq'")
+                seq = cursor.execute("SELECT value FROM meta WHERE name = 'seq'").fetchone()[0]
+                cursor.execute('INSERT OR REPLACE INTO transitions (key, seq, token, state, updated_at, data) '
+                               'VALUES (?, ?, ?, ?, ?, ?)',
+                               (key, seq, token, state, now, json.dumps(data)))
+                cursor.execute('COMMIT')
+                return seq
+            except sqlite3.Error:
+                cursor.execute('ROLLBACK')
+                raise
+    
+    def read_since(self, seq: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """Log entries after `seq`, oldest first"""
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT seq, data FROM transitions WHERE seq > ? ORDER BY seq', (seq,)).fetchall()
+        return [(row[0], json.loads(row[1])) for row in rows]
+    
+    def compact(self, retain_seconds: float) -> int:
+        """Delete entries of alerts that have been back to normal for a while"""
+        with self.lock:
+            cursor = self.connection.execute(
+                "DELETE FROM transitions WHERE state = 'normal' AND updated_at < ?",
+                (self.clock() - retain_seconds,))
+        return cursor.rowcount
+
+
+class HACoordinator:
+    """
+    Runs one replica as leader or standby
+    
+    Every replica competes for the lease. The leader evaluates rules and
+    logs each alert state change (pending timers, cooldowns, mutes) before
+    notifying; standbys don't evaluate but apply the log to their own
+    tracker, so a promoted standby carries on with the same timers and
+    cooldowns instead of starting cold. A standby takes over once the
+    leader stops renewing (after `lease_seconds`), after catching up with
+    the log.
+    
+    Notifications are fenced: transitions are only logged, and
+    notifications only sent, while this replica still holds the lease.
+    
+    Only alert state is replicated. Notifications a leader had queued but
+    not sent (open notification groups, rate limiter queues and digests)
+    are lost when it fails: the new leader sees those alerts as already
+    notified and does not send them again.
+    """
+    
+    def __init__(self, store: LeaseStore, rule_engine, node_id: Optional[str] = None,
+                 lease_seconds: float = 15, retain_seconds: float = 3600):
+        self.store = store
+        self.rule_engine = rule_engine
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.retain_seconds = retain_seconds
+        self.token: Optional[int] = None
+        self.last_seq = 0
+        self.is_running = False
+        self.thread = None
+        self.transitions_published = 0
+        self.transitions_applied = 0
+        self.promotions = 0
+        
+        rule_engine.on_transition = self.record
+        rule_engine.dispatcher.fence = self.holds_lease
+    
+    @property
+    def is_leader(self) -> bool:
+        return self.token is not None
+    
+    @property
+    def role(self) -> str:
+        return 'leader' if self.is_leader else 'standby'
+    
+    def start(self) -> 'HACoordinator':
+        """Catch up with the log and start competing for the lease"""
+        self.tail()
+        self.step()
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, name='ha-coordinator', daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        """Stop and hand over the lease"""
+        self.is_running = False
+        if self.thread:
+            self.thread.join(timeout=self.lease_seconds)
+        if self.token is not None:
+            self.store.release(self.node_id, self.token)
+            self.token = None
+            ha_leader.set(0)
+            print(f"✓ {self.node_id} handed over the lease")
+    
+    def _run(self):
+        while self.is_running:
+            time.sleep(self.lease_seconds / 3)
+            try:
+                self.step()
+            except sqlite3.Error as e:
+                print(f"✗ HA store error: {e}")
+    
+    def step(self):
+        """Renew the lease (leader) or follow the log and try to take over (standby)"""
+        if self.is_leader:
+            if self.store.acquire(self.node_id, self.lease_seconds) != self.token:
+                self._demote()
+                return
+            self.store.compact(self.retain_seconds)
+            return
+        
+        self.tail()
+        token = self.store.acquire(self.node_id, self.lease_seconds)
+        if token is not None:
+            # The old leader can no longer log; take its last entries first
+            self.tail()
+            self.token = token
+            self.promotions += 1
+            ha_leader.set(1)
+            ha_promotions_total.inc()
+            print(f"👑 {self.node_id} is now the leader (token {token})")
+    
+    def _demote(self):
+        self.token = None
+        ha_leader.set(0)
+        print(f"⚠ {self.node_id} lost the lease, now standby")
+    
+    def tail(self) -> int:
+        """Apply log entries written since the last call"""
+        entries = self.store.read_since(self.last_seq)
+        for seq, transition in entries:
+            self.rule_engine.apply_transition(transition)
+            self.last_seq = seq
+        if entries:
+            self.transitions_applied += len(entries)
+            ha_transitions_total.labels(direction='applied').inc(len(entries))
+        return len(entries)
+    
+    def record(self, transition: Dict[str, Any]) -> bool:
+        """
+        Log an alert state change (RuleEngine.on_transition)
+        
+        Returns:
+            False if this replica is not the leader any more
+        """
+        token = self.token
+        if token is None:
+            return False
+        seq = self.store.append(self.node_id, token, transition['key'],
+                                transition['tracker']['state'], transition)
+        if seq is None:
+            self._demote()
+            return False
+        self.last_seq = max(self.last_seq, seq)
+        self.transitions_published += 1
+        ha_transitions_total.labels(direction='published').inc()
+        return True
+    
+    def holds_lease(self) -> bool:
+        """Fencing check run before every notification"""
+        token = self.token
+        return token is not None and self.store.holds(self.node_id, token)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'node_id': self.node_id,
+            'role': self.role,
+            'token': self.token,
+            'last_seq': self.last_seq,
+            'transitions_published': self.transitions_published,
+            'transitions_applied': self.transitions_applied,
+            'promotions': self.promotions
+        }
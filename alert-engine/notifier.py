@@ -0,0 +1,36 @@
+"""
+Notifier Interface
+Common interface of the notification channels (email, webhooks)
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, List, Any
+
+
+class Notifier(ABC):
+    """
+    Base class of notification channels
+    
+    The dispatcher hands a notifier the alerts of one notification (a
+    single alert, or the alerts of a group) together with the settings of
+    the receiver it is routed to. Alerts are dicts with 'key', 'rule',
+    'labels', 'value' and 'status' ('firing' or 'resolved').
+    """
+    
+    channel = ''
+    
+    @abstractmethod
+    def send(self, alerts: List[Dict[str, Any]], group_labels: Dict[str, str],
+             receiver: Dict[str, Any]) -> bool:
+        """
+        Deliver (or queue) one notification
+        
+        Returns:
+            True if the notification was sent or accepted for delivery
+        """
+    
+    def stop(self):
+        """Deliver anything still queued and release resources"""
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {}
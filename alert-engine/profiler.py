@@ -0,0 +1,157 @@
+"""
+Profiler
+On-demand stack sampling and memory snapshot diffs for live debugging
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, Any, Optional
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of running threads
+    
+    Nothing runs between requests: sampling happens in the calling thread
+    for the requested duration only, so the profiler costs nothing while
+    inactive. Only one profile can run at a time.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+    
+    def profile(self, seconds: float, hz: float = 100,
+                thread_filter: Optional[str] = None) -> Optional[Counter]:
+        """
+        Sample all threads (except the caller) for a period of time
+        
+        Args:
+            seconds: How long to sample
+            hz: Samples per second
+            thread_filter: Only sample threads whose name contains this text
+        
+        Returns:
+            Counter of collapsed stacks ('thread;outer;...;inner' -> samples),
+            or None if another profile is already running
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+        
+        try:
+            stacks = Counter()
+            own_ident = threading.get_ident()
+            interval = 1.0 / hz
+            deadline = time.monotonic() + seconds
+            
+            while time.monotonic() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    name = names.get(ident, f"thread-{ident}")
+                    if thread_filter and thread_filter not in name:
+                        continue
+                    stacks[self._collapse(name, frame)] += 1
+                time.sleep(interval)
+            
+            return stacks
+        finally:
+            self._lock.release()
+    
+    @staticmethod
+    def _collapse(thread_name: str, frame) -> str:
+        """Render a stack as 'thread;outer;...;inner' (flamegraph.pl input)"""
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ';'.join(reversed(frames))
+    
+    @staticmethod
+    def to_collapsed(stacks: Counter) -> str:
+        """Format stacks in Brendan Gregg's collapsed format"""
+        return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    
+    @staticmethod
+    def to_tree(stacks: Counter) -> Dict[str, Any]:
+        """Format stacks as a nested {name, value, children} tree (d3-flame-graph)"""
+        root = {'name': 'root', 'value': 0, 'children': {}}
+        for stack, count in stacks.items():
+            node = root
+            node['value'] += count
+            for name in stack.split(';'):
+                node = node['children'].setdefault(name, {'name': name, 'value': 0, 'children': {}})
+                node['value'] += count
+        
+        def finish(node):
+            node['children'] = [finish(child) for child in node['children'].values()]
+            return node
+        
+        return finish(root)
+
+
+class MemoryTracker:
+    """
+    Diffs tracemalloc snapshots between calls
+    
+    The first call starts tracemalloc and records a baseline; each following
+    call reports the allocations that grew since the previous call. Tracing
+    stays off (and free) until first requested and can be stopped again.
+    """
+    
+    def __init__(self, frames: int = 1):
+        self.frames = frames
+        self.baseline = None
+        self._lock = threading.Lock()
+    
+    def snapshot_diff(self, limit: int = 25, key_type: str = 'lineno') -> Dict[str, Any]:
+        """Take a snapshot and compare it with the previous one"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self.baseline = self._snapshot()
+                return {'status': 'started', 'message': 'Baseline recorded, call again to diff'}
+            
+            snapshot = self._snapshot()
+            stats = snapshot.compare_to(self.baseline, key_type)
+            self.baseline = snapshot
+            current, peak = tracemalloc.get_traced_memory()
+            
+            return {
+                'status': 'tracing',
+                'traced_current_bytes': current,
+                'traced_peak_bytes': peak,
+                'top': [self._format(stat) for stat in stats[:limit]]
+            }
+    
+    def stop(self) -> Dict[str, Any]:
+        """Stop tracing and drop the baseline"""
+        with self._lock:
+            tracemalloc.stop()
+            self.baseline = None
+            return {'status': 'stopped'}
+    
+    @staticmethod
+    def _snapshot():
+        """Take a snapshot without tracemalloc's own allocations"""
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ])
+    
+    @staticmethod
+    def _format(stat) -> Dict[str, Any]:
+        """Convert a StatisticDiff to JSON-friendly form"""
+        return {
+            'location': [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+            'size_diff_bytes': stat.size_diff,
+            'size_bytes': stat.size,
+            'count_diff': stat.count_diff,
+            'count': stat.count
+        }
@@ -3,17 +3,50 @@ Prometheus Query Client
 Fetches current metric values from Prometheus
 """
 
+import time
 import requests
-from typing import Optional, Dict
+from typing import Callable, Optional, Dict, List, Tuple
 from datetime import datetime
 
+from metrics import prometheus_up, fallback_queries_total
+
+# One element of an instant vector: (labels, value)
+Sample = Tuple[Dict[str, str], float]
+
+# Clients without their own session share this one's connection pool; the
+# bare requests.get opens a new connection (and TCP handshake) per query
+_session = requests.Session()
+
 
 class PrometheusQuery:
     """Query Prometheus for current metric values"""
     
-    def __init__(self, prometheus_url: str):
+    def __init__(self, prometheus_url: str, fallback=None, probe_interval: float = 30,
+                 session: Optional[requests.Session] = None):
+        """
+        Args:
+            prometheus_url: Base URL of the Prometheus server
+            fallback: Optional object with query_vector(query) and
+                      query_range(query, start, end, step) methods (e.g. a
+                      SampleBuffer) answering queries while Prometheus is
+                      unreachable
+            probe_interval: While Prometheus is down, seconds between
+                            attempts to reach it again
+            session: Optional requests.Session whose connection pool is
+                     shared with other clients (e.g. all tenants); by
+                     default a module-wide pooled session is used
+        """
         self.prometheus_url = prometheus_url.rstrip('/')
         self.api_url = f"{self.prometheus_url}/api/v1/query"
+        self.fallback = fallback
+        self.probe_interval = probe_interval
+        self.down_since: Optional[float] = None
+        self.next_probe = 0.0
+        self.fallback_queries = 0
+        self.http = session or _session
+        # Called with the outage length once Prometheus answers again, so
+        # state derived from the fallback can be checked against it
+        self.on_recovery: Optional[Callable[[float], None]] = None
         
     def query_metric(self, metric_name: str) -> Optional[float]:
         """
@@ -25,31 +58,182 @@ class PrometheusQuery:
         Returns:
             Current value as float, or None if query fails
         """
+        results = self.query_vector(metric_name)
+        
+        if results is None:
+            return None
+        
+        if not results:
+            print(f"⚠ No data found for metric: {metric_name}")
+            return None
+        
+        # Get the first result's value
+        return results[0][1]
+    
+    def query_vector(self, query: str) -> Optional[List[Sample]]:
+        """
+        Evaluate an arbitrary PromQL expression at the current time
+        
+        Aggregations, range functions and label filters run inside
+        Prometheus, so only the final (usually small) vector is returned.
+        
+        Args:
+            query: PromQL expression (e.g., 'avg by (site) (iot_battery_percent)')
+        
+        Returns:
+            List of (labels, value) tuples, one per series (empty if the
+            expression matched nothing), or None if the query fails
+        """
+        # While Prometheus is down only one query per probe interval goes
+        # out, so a recovering server is not hit by a whole cycle at once
+        if self.down_since is not None and self.fallback is not None \
+                and time.time() < self.next_probe:
+            return self._query_fallback(query)
+        
         try:
-            params = {'query': metric_name}
-            response = requests.get(self.api_url, params=params, timeout=10)
+            params = {'query': query}
+            response = self.http.get(self.api_url, params=params, timeout=10)
             response.raise_for_status()
             
             data = response.json()
             
+            if self.down_since is not None:
+                self._mark_up()
+            prometheus_up.set(1)
+            
             if data['status'] != 'success':
                 print(f"✗ Prometheus query failed: {data}")
                 return None
             
+            result_type = data['data']['resultType']
             results = data['data']['result']
             
-            if not results:
-                print(f"⚠ No data found for metric: {metric_name}")
-                return None
+            # Scalar expressions (e.g. 'scalar(...)' or '1 + 1') have no labels
+            if result_type == 'scalar':
+                return [({}, float(results[1]))]
             
-            # Get the first result's value
-            value = float(results[0]['value'][1])
-            return value
+            return [(series['metric'], float(series['value'][1]))
+                    for series in results]
             
         except requests.exceptions.RequestException as e:
-            print(f"✗ Error querying Prometheus: {e}")
+            if not self._is_outage(e):
+                print(f"✗ Error querying Prometheus: {e}")
+                return None
+            if self.down_since is None or self.fallback is None:
+                print(f"✗ Error querying Prometheus: {e}")
+            self._mark_down()
+            if self.fallback is None:
+                return None
+            return self._query_fallback(query)
+        except (KeyError, ValueError, IndexError, TypeError) as e:
+            print(f"✗ Error parsing Prometheus response: {e}")
             return None
-        except (KeyError, ValueError, IndexError) as e:
+    
+    @staticmethod
+    def _is_outage(error: requests.exceptions.RequestException) -> bool:
+        """Whether an error means Prometheus is unavailable (not a bad query)"""
+        if isinstance(error, requests.exceptions.HTTPError):
+            return error.response is not None and error.response.status_code >= 500
+        return True
+    
+    def _mark_down(self):
+        """Record a failed request and schedule the next probe"""
+        now = time.time()
+        if self.down_since is None:
+            self.down_since = now
+            self.fallback_queries = 0
+            if self.fallback is not None:
+                print("⚠ Prometheus unreachable, evaluating against the local sample buffer")
+        self.next_probe = now + self.probe_interval
+        prometheus_up.set(0)
+    
+    def _mark_up(self):
+        """Record that Prometheus answered again after an outage"""
+        outage = time.time() - self.down_since
+        if self.fallback is not None:
+            print(f"✓ Prometheus reachable again after {outage:.0f}s "
+                  f"({self.fallback_queries} queries served from the local sample buffer)")
+        else:
+            print(f"✓ Prometheus reachable again after {outage:.0f}s")
+        self.down_since = None
+        if self.fallback is not None and self.on_recovery is not None:
+            self.on_recovery(outage)
+    
+    def _query_fallback(self, query: str) -> Optional[List[Sample]]:
+        """Answer a query from the fallback buffer"""
+        results = self.fallback.query_vector(query)
+        if results is not None:
+            self.fallback_queries += 1
+            fallback_queries_total.inc()
+        return results
+    
+    def _query_range_fallback(self, query: str, start: float, end: float,
+                              step: float) -> Optional[List[Tuple[Dict[str, str], list]]]:
+        """Answer a range query from the fallback buffer"""
+        results = self.fallback.query_range(query, start, end, step)
+        if results is not None:
+            self.fallback_queries += 1
+            fallback_queries_total.inc()
+        return results
+    
+    @property
+    def is_down(self) -> bool:
+        """Whether the last request found Prometheus unavailable"""
+        return self.down_since is not None
+    
+    def query_range(self, query: str, start: float, end: float,
+                    step: float) -> Optional[List[Tuple[Dict[str, str], list]]]:
+        """
+        Evaluate a PromQL expression over a time range
+        
+        Prometheus caps a range query at 11,000 points per series, so long
+        ranges should be fetched in chunks. During an outage, selectors are
+        answered from the fallback buffer (which only covers its retention).
+        
+        Args:
+            query: PromQL expression
+            start: Range start (unix seconds)
+            end: Range end (unix seconds, inclusive)
+            step: Resolution in seconds
+        
+        Returns:
+            List of (labels, [[timestamp, "value"], ...]) tuples, one per
+            series, or None if the query fails
+        """
+        if self.down_since is not None and self.fallback is not None \
+                and time.time() < self.next_probe:
+            return self._query_range_fallback(query, start, end, step)
+        
+        try:
+            params = {'query': query, 'start': start, 'end': end, 'step': step}
+            response = self.http.get(f"{self.prometheus_url}/api/v1/query_range",
+                                    params=params, timeout=120)
+            response.raise_for_status()
+            
+            data = response.json()
+            
+            if self.down_since is not None:
+                self._mark_up()
+            prometheus_up.set(1)
+            
+            if data['status'] != 'success':
+                print(f"✗ Prometheus range query failed: {data}")
+                return None
+            
+            return [(series['metric'], series['values'])
+                    for series in data['data']['result']]
+        
+        except requests.exceptions.RequestException as e:
+            if not self._is_outage(e):
+                print(f"✗ Error querying Prometheus: {e}")
+                return None
+            if self.down_since is None or self.fallback is None:
+                print(f"✗ Error querying Prometheus: {e}")
+            self._mark_down()
+            if self.fallback is None:
+                return None
+            return self._query_range_fallback(query, start, end, step)
+        except (KeyError, ValueError, TypeError) as e:
             print(f"✗ Error parsing Prometheus response: {e}")
             return None
     
@@ -71,7 +255,7 @@ class PrometheusQuery:
     def health_check(self) -> bool:
         """Check if Prometheus is reachable"""
         try:
-            response = requests.get(f"{self.prometheus_url}/-/healthy", timeout=5)
+            response = self.http.get(f"{self.prometheus_url}/-/healthy", timeout=5)
             return response.status_code == 200
         except requests.exceptions.RequestException:
             return False
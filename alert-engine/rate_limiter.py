@@ -0,0 +1,326 @@
+"""
+Rate Limiter
+Token-bucket rate limiting and priority queueing of outbound notifications
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from notifier import Notifier
+from severity import PRIORITY_SEVERITY, severity_priority
+from metrics import (rate_limit_tokens, notification_queue_depth, notification_queue_wait,
+                     notification_digests_total, notifications_dropped_total)
+
+
+class TokenBucket:
+    """
+    Allows `burst` sends at once and `per_minute` sends per minute on average
+    """
+    
+    def __init__(self, per_minute: float, burst: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60
+        self.capacity = max(burst, 1)
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+    
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def available(self) -> float:
+        """Tokens currently available"""
+        self._refill()
+        return self.tokens
+    
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+    
+    def wait_time(self) -> float:
+        """Seconds until a token is available"""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+
+class RateLimitedNotifier(Notifier):
+    """
+    Wraps a notifier with a global and per-receiver token bucket
+    
+    Notifications go out right away while the receiver's and the global
+    bucket have tokens and no queued notification of the same or higher
+    priority is waiting for a global token. Beyond that they wait in a per-receiver queue
+    ordered by severity, so critical alerts go ahead of warnings. A
+    background worker drains the queues as tokens come back, serving the
+    receiver with the most urgent notification first; a receiver with
+    several notifications waiting gets them as one digest (critical alerts
+    first), which spends a single token. Failed sends are requeued with a
+    delay up to `max_attempts` times. When `max_queue` notifications are
+    waiting, the least urgent one is dropped.
+    
+    Receivers can override the per-receiver limit:
+        rate_limit: {per_minute: 6, burst: 3}
+    
+    `name` labels the metrics and worker thread (default: the channel),
+    e.g. 'plant-a/email' for a tenant's quota.
+    """
+    
+    def __init__(self, notifier: Notifier, per_minute: float = 30, burst: float = 10,
+                 receiver_per_minute: Optional[float] = None,
+                 receiver_burst: Optional[float] = None,
+                 max_queue: int = 1000, max_digest: int = 100, max_attempts: int = 5,
+                 retry_delay: float = 30, name: Optional[str] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.notifier = notifier
+        self.channel = notifier.channel
+        self.name = name or notifier.channel
+        self.clock = clock
+        self.bucket = TokenBucket(per_minute, burst, clock)
+        self.receiver_per_minute = receiver_per_minute
+        self.receiver_burst = receiver_burst if receiver_burst is not None else burst
+        self.max_queue = max_queue
+        self.max_digest = max_digest
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        
+        self.receiver_buckets: Dict[str, Optional[TokenBucket]] = {}
+        # {receiver: heap of (priority, enqueued_at, seq, notification)}
+        self.queues: Dict[str, List[Tuple[int, float, int, Dict[str, Any]]]] = {}
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.is_running = False
+        self.thread = None
+        self.sent_immediately = 0
+        self.queued = 0
+        self.digests_sent = 0
+        self.dropped = 0
+    
+    def start(self) -> 'RateLimitedNotifier':
+        """Start the background queue worker"""
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, name=f'rate-limiter-{self.name}',
+                                       daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        """Stop the worker, send what the limits allow and stop the wrapped notifier"""
+        self.is_running = False
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+        self.drain()
+        waiting = self.queue_depth()
+        if waiting:
+            print(f"⚠ {waiting} rate-limited {self.name} notifications not sent")
+        self.notifier.stop()
+    
+    @staticmethod
+    def priority(alerts: List[Dict[str, Any]]) -> int:
+        """Priority of a notification: that of its most severe alert"""
+        return min(severity_priority(a['rule'].get('severity')) for a in alerts)
+    
+    def send(self, alerts: List[Dict[str, Any]], group_labels: Dict[str, str],
+             receiver: Dict[str, Any]) -> bool:
+        """Send now if tokens allow, otherwise queue by priority"""
+        name = receiver.get('name', '')
+        with self.lock:
+            receiver_bucket = self._receiver_bucket(receiver)
+            # Queued notifications as urgent as this one get the global token first
+            immediate = not self.queues.get(name) and self.bucket.available() >= 1 \
+                and (receiver_bucket is None or receiver_bucket.available() >= 1) \
+                and self._most_urgent_ready(self.clock()) > self.priority(alerts)
+            if immediate:
+                self._take(name, receiver_bucket)
+            else:
+                self._enqueue(name, {
+                    'alerts': alerts,
+                    'group_labels': group_labels,
+                    'receiver': receiver,
+                    'attempts': 0,
+                    'not_before': 0.0
+                }, self.clock())
+                self.queued += 1
+        
+        if not immediate:
+            print(f"⏳ Rate limited ({name or self.name}): {len(alerts)} alerts queued")
+            self.wakeup.set()
+            return True
+        
+        self.sent_immediately += 1
+        if not self.notifier.send(alerts, group_labels, receiver):
+            with self.lock:
+                self._requeue(name, {
+                    'alerts': alerts,
+                    'group_labels': group_labels,
+                    'receiver': receiver,
+                    'attempts': 1
+                }, self.clock())
+        return True
+    
+    def _receiver_bucket(self, receiver: Dict[str, Any]) -> Optional[TokenBucket]:
+        name = receiver.get('name', '')
+        if name not in self.receiver_buckets:
+            limit = receiver.get('rate_limit') or {}
+            per_minute = limit.get('per_minute', self.receiver_per_minute)
+            self.receiver_buckets[name] = TokenBucket(
+                per_minute, limit.get('burst', self.receiver_burst), self.clock) \
+                if per_minute is not None else None
+        return self.receiver_buckets[name]
+    
+    def _take(self, name: str, receiver_bucket: Optional[TokenBucket]):
+        self.bucket.take()
+        rate_limit_tokens.labels(channel=self.name, bucket='global').set(self.bucket.tokens)
+        if receiver_bucket is not None:
+            receiver_bucket.take()
+            rate_limit_tokens.labels(channel=self.name, bucket=name).set(receiver_bucket.tokens)
+    
+    def _most_urgent_ready(self, now: float) -> float:
+        """Priority of the most urgent queued notification that only waits for a global token"""
+        urgent = float('inf')
+        for name, queue in self.queues.items():
+            if not queue or queue[0][0] >= urgent:
+                continue
+            receiver_bucket = self.receiver_buckets.get(name)
+            if receiver_bucket is not None and receiver_bucket.available() < 1:
+                continue
+            urgent = min([urgent] + [e[0] for e in queue if e[3]['not_before'] <= now])
+        return urgent
+    
+    def _enqueue(self, name: str, notification: Dict[str, Any], now: float):
+        """Queue a notification, dropping the least urgent one when full"""
+        entry = (self.priority(notification['alerts']), now, next(self.sequence), notification)
+        if self.queue_depth() >= self.max_queue:
+            worst_name, worst = max(((n, e) for n, queue in self.queues.items() for e in queue),
+                                    key=lambda item: item[1][:3])
+            if worst[:3] < entry[:3]:
+                self._drop(entry, 'queue_full')
+                return
+            queue = self.queues[worst_name]
+            queue.remove(worst)
+            heapq.heapify(queue)
+            self._drop(worst, 'queue_full')
+        heapq.heappush(self.queues.setdefault(name, []), entry)
+        notification_queue_depth.labels(channel=self.name).set(self.queue_depth())
+    
+    def _requeue(self, name: str, notification: Dict[str, Any], now: float):
+        """Put back a notification whose send failed"""
+        if notification['attempts'] >= self.max_attempts:
+            self._drop((self.priority(notification['alerts']), now, 0, notification), 'failed')
+            notification_queue_depth.labels(channel=self.name).set(self.queue_depth())
+            return
+        notification['not_before'] = now + self.retry_delay * notification['attempts']
+        self._enqueue(name, notification, now)
+    
+    def _drop(self, entry: Tuple[int, float, int, Dict[str, Any]], reason: str):
+        self.dropped += 1
+        notifications_dropped_total.labels(channel=self.name, reason=reason).inc()
+        print(f"✗ Dropped {self.name} notification "
+              f"({len(entry[3]['alerts'])} alerts): {reason}")
+    
+    def _run(self):
+        while self.is_running:
+            delay = self.drain()
+            self.wakeup.wait(min(delay, 1.0))
+            self.wakeup.clear()
+    
+    def drain(self) -> float:
+        """
+        Send queued notifications the limits allow
+        
+        Returns:
+            Seconds until the next queued notification could be sent
+        """
+        while True:
+            with self.lock:
+                now = self.clock()
+                ready = []
+                delay = float('inf')
+                for name, queue in self.queues.items():
+                    if not queue:
+                        continue
+                    not_before = min(e[3]['not_before'] for e in queue)
+                    receiver_bucket = self.receiver_buckets.get(name)
+                    wait = max(not_before - now,
+                               receiver_bucket.wait_time() if receiver_bucket else 0.0)
+                    if wait <= 0:
+                        ready.append(name)
+                    delay = min(delay, wait)
+                if ready:
+                    delay = max(delay, self.bucket.wait_time())
+                if not ready or self.bucket.available() < 1:
+                    return delay
+                
+                # The receiver with the most urgent waiting notification goes first
+                name = min(ready, key=lambda n: self.queues[n][0][:3])
+                self._take(name, self.receiver_buckets.get(name))
+                entries = self._pop_ready(name, now)
+                notification_queue_depth.labels(channel=self.name).set(self.queue_depth())
+            
+            for priority, enqueued_at, _, notification in entries:
+                notification_queue_wait.labels(channel=self.name,
+                                               severity=PRIORITY_SEVERITY.get(priority, 'other')) \
+                    .observe(now - enqueued_at)
+            self._send_entries(name, entries, now)
+    
+    def _pop_ready(self, name: str, now: float) -> List[Tuple[int, float, int, Dict[str, Any]]]:
+        """Take the receiver's sendable notifications (up to `max_digest` alerts)"""
+        queue = self.queues[name]
+        entries, waiting, alerts = [], [], 0
+        while queue:
+            entry = heapq.heappop(queue)
+            if entry[3]['not_before'] > now or (entries and alerts + len(entry[3]['alerts']) > self.max_digest):
+                waiting.append(entry)
+                continue
+            entries.append(entry)
+            alerts += len(entry[3]['alerts'])
+        for entry in waiting:
+            heapq.heappush(queue, entry)
+        return entries
+    
+    def _send_entries(self, name: str, entries: List[Tuple[int, float, int, Dict[str, Any]]],
+                      now: float):
+        """Send one queued notification, or several as one digest"""
+        if len(entries) == 1:
+            notification = entries[0][3]
+            alerts, group_labels = notification['alerts'], notification['group_labels']
+        else:
+            # Entries come in priority order, so critical alerts lead the digest
+            alerts = [alert for entry in entries for alert in entry[3]['alerts']]
+            group_labels = {}
+        receiver = entries[0][3]['receiver']
+        
+        if self.notifier.send(alerts, group_labels, receiver):
+            if len(entries) > 1:
+                self.digests_sent += 1
+                notification_digests_total.labels(channel=self.name).inc()
+                print(f"📨 DIGEST SENT ({name or self.name}): "
+                      f"{len(entries)} notifications, {len(alerts)} alerts")
+            return
+        
+        with self.lock:
+            for entry in entries:
+                entry[3]['attempts'] += 1
+                self._requeue(name, entry[3], now)
+    
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'sent_immediately': self.sent_immediately,
+                'queued': self.queued,
+                'queue_depth': self.queue_depth(),
+                'digests_sent': self.digests_sent,
+                'dropped': self.dropped,
+                'global_tokens': round(self.bucket.available(), 2)
+            }
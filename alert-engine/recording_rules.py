@@ -0,0 +1,100 @@
+"""
+Recording Rules
+Evaluates derived series once per cycle and serves them from memory
+"""
+
+import re
+import time
+from typing import Callable, Dict, List, Any, Optional
+
+from prometheus_client.core import GaugeMetricFamily
+
+from prometheus_query import Sample
+
+METRIC_NAME_RE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*$')
+
+
+class RecordingRules:
+    """
+    Caches the results of `recording_rules` expressions
+    
+    Each expression is queried once per evaluation cycle. The results are
+    kept in memory so alert rules can reference them by record name without
+    another Prometheus round trip, and they are exposed on the alert
+    engine's own /metrics endpoint (as a prometheus_client collector) so
+    dashboards can reuse them too.
+    """
+    
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = rules
+        self.records = {rule['record'] for rule in rules}
+        self.series: Dict[str, List[Sample]] = {}  # {record: [(labels, value)]}
+        self.last_evaluation = None
+        self.evaluations = 0
+    
+    def evaluate(self, query: Callable[[str], Optional[List[Sample]]]):
+        """
+        Evaluate all recording rules in order
+        
+        Args:
+            query: Function running a PromQL expression
+        """
+        for rule in self.rules:
+            record = rule['record']
+            extra_labels = rule.get('labels', {})
+            samples = query(rule['expr'])
+            
+            if samples is None:
+                # Do not serve stale values as if they were current
+                self.series.pop(record, None)
+                print(f"⚠ Recording rule '{record}' failed: metric data unavailable")
+                continue
+            
+            self.series[record] = [
+                ({**{k: v for k, v in labels.items() if k != '__name__'}, **extra_labels}, value)
+                for labels, value in samples
+            ]
+        
+        self.evaluations += 1
+        self.last_evaluation = time.time()
+    
+    def get(self, record: str) -> Optional[List[Sample]]:
+        """Get the cached series of a record, None if unavailable"""
+        return self.series.get(record)
+    
+    def is_record(self, name: str) -> bool:
+        """Check whether a name refers to a recording rule"""
+        return name in self.records
+    
+    def collect(self):
+        """Yield cached records as Prometheus gauges (collector protocol)"""
+        for rule in self.rules:
+            record = rule['record']
+            samples = self.series.get(record)
+            if not samples:
+                continue
+            
+            label_names = sorted({k for labels, _ in samples for k in labels})
+            family = GaugeMetricFamily(record, f"Recording rule: {rule['expr']}",
+                                       labels=label_names)
+            for labels, value in samples:
+                family.add_metric([labels.get(k, '') for k in label_names], value)
+            yield family
+    
+    @staticmethod
+    def validate(rules: List[Dict[str, Any]]) -> bool:
+        """Validate recording rule definitions"""
+        seen = set()
+        for rule in rules:
+            record = rule.get('record')
+            if not record or 'expr' not in rule:
+                print(f"✗ Recording rule needs 'record' and 'expr': {rule}")
+                return False
+            if not METRIC_NAME_RE.match(record):
+                print(f"✗ Invalid recording rule name: {record}")
+                return False
+            if record in seen:
+                print(f"✗ Duplicate recording rule: {record}")
+                return False
+            seen.add(record)
+        return True
@@ -0,0 +1,376 @@
+"""
+Alert Routing
+Routes notifications to receivers, groups them and applies inhibition
+"""
+
+import re
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Any, Optional, Set, Tuple
+
+from notifier import Notifier
+from silences import SilenceManager, OPERATORS, compile_matcher, Matcher
+from metrics import (notifications_silenced_total, notifications_inhibited_total,
+                     notifications_routed_total, notification_groups)
+
+# Default timings (seconds) of routes that group alerts
+GROUP_WAIT = 30
+GROUP_INTERVAL = 300
+
+DEFAULT_RECEIVER = 'default'
+
+
+class MatcherIndex:
+    """
+    Items with label matchers, looked up by an alert's labels
+    
+    Each item is filed under one of its equality matchers (the (label,
+    value) pair fewest items use), so a lookup only visits the buckets of
+    the alert's own label pairs plus items without equality matchers.
+    Candidates come back in insertion order, which keeps first-match
+    semantics.
+    """
+    
+    def __init__(self):
+        self.by_pair: Dict[Tuple[str, str], List[Tuple[int, List[Matcher], Any]]] = {}
+        self.unanchored: List[Tuple[int, List[Matcher], Any]] = []
+        self.pair_usage = Counter()
+        self.size = 0
+    
+    def add(self, matchers: List[Dict[str, str]], item: Any):
+        entry = (self.size, [compile_matcher(m) for m in matchers], item)
+        self.size += 1
+        equality = [(m['name'], m['value']) for m in matchers
+                    if m.get('op', '=') == '=' and m['value'] != '']
+        self.pair_usage.update(equality)
+        anchor = min(equality, key=self.pair_usage.__getitem__, default=None)
+        if anchor is None:
+            self.unanchored.append(entry)
+        else:
+            self.by_pair.setdefault(anchor, []).append(entry)
+    
+    def matches(self, labels: Dict[str, str]) -> List[Any]:
+        """Items whose matchers all match, in insertion order"""
+        candidates = list(self.unanchored)
+        for pair in labels.items():
+            bucket = self.by_pair.get(pair)
+            if bucket:
+                candidates.extend(bucket)
+        if len(candidates) > 1:
+            candidates.sort(key=lambda entry: entry[0])
+        return [item for _, matchers, item in candidates
+                if all(match(labels.get(name, '')) for name, match in matchers)]
+
+
+class Route:
+    """
+    Node of the routing tree
+    
+    Children inherit receiver and grouping settings unless they override
+    them. An alert descends into the first matching child (and further
+    siblings while `continue` is set); if no child matches, the node itself
+    handles it. Without `group_by` every alert is notified on its own as
+    soon as it fires or resolves.
+    """
+    
+    def __init__(self, config: Dict[str, Any], parent: Optional['Route'] = None,
+                 path: str = 'root'):
+        self.path = path
+        self.receiver = config.get('receiver', parent.receiver if parent else DEFAULT_RECEIVER)
+        if 'group_by' in config:
+            self.group_by = tuple(config['group_by'])
+        else:
+            self.group_by = parent.group_by if parent else None
+        self.group_wait = config.get('group_wait', parent.group_wait if parent else GROUP_WAIT)
+        self.group_interval = config.get('group_interval',
+                                         parent.group_interval if parent else GROUP_INTERVAL)
+        self.continue_matching = config.get('continue', False)
+        
+        self.children = MatcherIndex()
+        for i, child in enumerate(config.get('routes', [])):
+            self.children.add(child.get('matchers', []),
+                              Route(child, self, f"{path}.{i}"))
+    
+    def match(self, labels: Dict[str, str]) -> List['Route']:
+        """Find the routes handling an alert (below this node)"""
+        routes = []
+        for child in self.children.matches(labels):
+            routes.extend(child.match(labels))
+            if not child.continue_matching:
+                break
+        return routes or [self]
+
+
+class InhibitRule:
+    """Mutes target alerts while a source alert with equal labels is firing"""
+    
+    def __init__(self, config: Dict[str, Any]):
+        self.equal = tuple(config.get('equal', []))
+        self.sources: Dict[Tuple[str, ...], Set[str]] = {}  # {equal label values: {alert key}}
+    
+    def key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(labels.get(name, '') for name in self.equal)
+    
+    def inhibits(self, alert_key: str, labels: Dict[str, str]) -> bool:
+        sources = self.sources.get(self.key(labels))
+        # An alert never inhibits itself
+        return bool(sources) and (len(sources) > 1 or alert_key not in sources)
+
+
+class AlertDispatcher:
+    """
+    Turns alert transitions into notifications
+    
+    Alerts are dicts with 'key', 'rule', 'labels', 'value', 'status'
+    ('firing' or 'resolved') and 'tenant' (None for the main rule set). Each one is checked against silences and
+    inhibit rules, routed through the tree, and either sent immediately or
+    collected into its group, which flush() sends once `group_wait` (first
+    notification) or `group_interval` (updates) has passed. Alerts whose
+    firing notification was muted also get no resolution notification.
+    
+    A receiver is notified on every channel it configures: `email_to`
+    (email) and `webhooks` (webhook); one with neither gets the default
+    email recipients. `notifiers` maps channel names to their notifiers.
+    """
+    
+    def __init__(self, route: Route, notifiers: Optional[Dict[str, Notifier]] = None,
+                 receivers: Optional[Dict[str, Dict[str, Any]]] = None,
+                 inhibit_rules: Optional[List[Dict[str, Any]]] = None,
+                 silences: Optional[SilenceManager] = None,
+                 clock: Callable[[], float] = time.time):
+        self.route = route
+        self.notifiers = notifiers or {}
+        self.receivers = receivers or {DEFAULT_RECEIVER: {'name': DEFAULT_RECEIVER}}
+        self.silences = silences
+        self.clock = clock
+        
+        self.inhibit_rules = [InhibitRule(r) for r in inhibit_rules or []]
+        # Inhibit rules looked up by the labels of source and target alerts
+        self.inhibit_sources = MatcherIndex()
+        self.inhibit_targets = MatcherIndex()
+        for rule_config, rule in zip(inhibit_rules or [], self.inhibit_rules):
+            self.inhibit_sources.add(rule_config.get('source_matchers', []), rule)
+            self.inhibit_targets.add(rule_config.get('target_matchers', []), rule)
+        
+        self.groups: Dict[Tuple, Dict[str, Any]] = {}
+        self.muted: Set[str] = set()
+        self.notifications_sent = 0
+        self.alerts_notified = 0  # firing alerts a notifier accepted
+        # Checked before every send; HA standbys install a leadership check
+        self.fence: Optional[Callable[[], bool]] = None
+    
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], notifiers: Optional[Dict[str, Notifier]] = None,
+                    silences: Optional[SilenceManager] = None) -> 'AlertDispatcher':
+        """Build a dispatcher from the `routing`, `receivers` and `inhibit_rules` sections"""
+        receivers = {r['name']: r for r in config.get('receivers', [])} or None
+        return cls(Route(config.get('routing', {})), notifiers, receivers,
+                   config.get('inhibit_rules', []), silences)
+    
+    @staticmethod
+    def validate(config: Dict[str, Any]) -> bool:
+        """Check the `routing`, `receivers` and `inhibit_rules` sections"""
+        receivers = config.get('receivers', [])
+        names = {r.get('name') for r in receivers}
+        if len(names) != len(receivers):
+            print("✗ Receivers need unique names")
+            return False
+        for receiver in receivers:
+            if 'webhooks' not in receiver:
+                continue
+            from webhook_notifier import WebhookNotifier
+            if not WebhookNotifier.validate_webhooks(
+                    receiver['webhooks'], f"Receiver {receiver.get('name')}"):
+                return False
+        if not names:
+            names = {DEFAULT_RECEIVER}
+        
+        def check_matchers(matchers: Any, where: str) -> bool:
+            if not isinstance(matchers, list):
+                print(f"✗ {where}: matchers must be a list")
+                return False
+            for matcher in matchers:
+                if not isinstance(matcher, dict) or 'name' not in matcher or 'value' not in matcher \
+                        or matcher.get('op', '=') not in OPERATORS:
+                    print(f"✗ {where}: invalid matcher {matcher}")
+                    return False
+                try:
+                    compile_matcher(matcher)
+                except re.error as e:
+                    print(f"✗ {where}: invalid regex '{matcher['value']}': {e}")
+                    return False
+            return True
+        
+        def check_route(route: Dict[str, Any], path: str, receiver: str) -> bool:
+            receiver = route.get('receiver', receiver)
+            if receiver not in names:
+                print(f"✗ Route {path}: unknown receiver '{receiver}'")
+                return False
+            if not check_matchers(route.get('matchers', []), f"Route {path}"):
+                return False
+            return all(check_route(child, f"{path}.{i}", receiver)
+                       for i, child in enumerate(route.get('routes', [])))
+        
+        if not check_route(config.get('routing', {}), 'root', DEFAULT_RECEIVER):
+            return False
+        
+        for i, rule in enumerate(config.get('inhibit_rules', [])):
+            if not (check_matchers(rule.get('source_matchers', []), f"Inhibit rule {i}")
+                    and check_matchers(rule.get('target_matchers', []), f"Inhibit rule {i}")):
+                return False
+        return True
+    
+    def dispatch(self, alert: Dict[str, Any]) -> bool:
+        """
+        Handle one alert transition
+        
+        Returns:
+            True if a notification was sent or queued
+        """
+        key, labels = alert['key'], alert['labels']
+        firing = alert['status'] == 'firing'
+        self._track_sources(key, labels, firing)
+        
+        if not firing:
+            if key in self.muted:
+                self.muted.discard(key)
+                return False
+            if not alert['rule'].get('resolution_notification', True):
+                return False
+        
+        if self.silences:
+            silence_id = self.silences.silenced_by(labels)
+            if silence_id:
+                if firing:
+                    self.muted.add(key)
+                notifications_silenced_total.labels(tenant=alert.get('tenant') or '',
+                                                    rule_name=alert['rule']['name']).inc()
+                print(f"🔕 {key} silenced by {silence_id}")
+                return False
+        
+        if firing and any(rule.inhibits(key, labels) for rule in self.inhibit_targets.matches(labels)):
+            self.muted.add(key)
+            notifications_inhibited_total.labels(tenant=alert.get('tenant') or '',
+                                                 rule_name=alert['rule']['name']).inc()
+            print(f"🔇 {key} inhibited")
+            return False
+        
+        self.muted.discard(key)
+        if not self.notifiers:
+            return False
+        
+        for route in self.route.match(labels):
+            notifications_routed_total.labels(receiver=route.receiver).inc()
+            if route.group_by is None:
+                self._send([alert], route.receiver, {})
+                continue
+            
+            group_labels = {name: labels.get(name, '') for name in route.group_by}
+            group_key = (route.path, tuple(group_labels.values()))
+            group = self.groups.get(group_key)
+            if group is None:
+                group = self.groups[group_key] = {
+                    'route': route,
+                    'labels': group_labels,
+                    'alerts': {},
+                    'next_flush': self.clock() + route.group_wait
+                }
+            group['alerts'][key] = alert
+        notification_groups.set(len(self.groups))
+        return True
+    
+    def dispatch_cycle(self, alerts: List[Dict[str, Any]]) -> List[bool]:
+        """
+        Handle the alert transitions of one evaluation cycle
+        
+        Inhibition sources are updated for all of them first, so a target
+        is inhibited by a source that fired in the same cycle whichever rule
+        was evaluated first.
+        
+        Returns:
+            dispatch() result of each alert
+        """
+        for alert in alerts:
+            self._track_sources(alert['key'], alert['labels'], alert['status'] == 'firing')
+        return [self.dispatch(alert) for alert in alerts]
+    
+    def flush(self, now: Optional[float] = None):
+        """Send groups whose wait or interval has passed"""
+        now = now or self.clock()
+        for group_key, group in list(self.groups.items()):
+            if group['next_flush'] > now:
+                continue
+            if not group['alerts']:
+                # Nothing new within a whole interval
+                del self.groups[group_key]
+                continue
+            alerts = list(group['alerts'].values())
+            group['alerts'] = {}
+            group['next_flush'] = now + group['route'].group_interval
+            self._send(alerts, group['route'].receiver, group['labels'])
+        notification_groups.set(len(self.groups))
+    
+    def _send(self, alerts: List[Dict[str, Any]], receiver: str, group_labels: Dict[str, str]):
+        """Notify a receiver about one alert or a group of alerts"""
+        if self.fence is not None and not self.fence():
+            print(f"⛔ Not the leader, dropping notification for {receiver}")
+            return
+        
+        settings = self.receivers.get(receiver, {'name': receiver})
+        success = False
+        for channel in self._channels(settings):
+            notifier = self.notifiers.get(channel)
+            if notifier is not None and notifier.send(alerts, group_labels, settings):
+                success = True
+        if not success:
+            return
+        
+        firing = sum(a['status'] == 'firing' for a in alerts)
+        self.notifications_sent += 1
+        self.alerts_notified += firing
+        if len(alerts) > 1:
+            print(f"🚨 GROUP NOTIFIED ({receiver}): {group_labels} "
+                  f"{firing} firing, {len(alerts) - firing} resolved")
+        elif alerts[0]['status'] == 'firing':
+            print(f"🚨 ALERT FIRED: {alerts[0]['key']}")
+        else:
+            print(f"✅ ALERT RESOLVED: {alerts[0]['key']}")
+        
+    @staticmethod
+    def _channels(receiver: Dict[str, Any]) -> List[str]:
+        """Notification channels configured on a receiver"""
+        channels = []
+        if receiver.get('email_to') or not receiver.get('webhooks'):
+            channels.append('email')
+        if receiver.get('webhooks'):
+            channels.append('webhook')
+        return channels
+    
+    def restore(self, key: str, labels: Dict[str, str], firing: bool, muted: bool):
+        """Take over inhibition and mute state of an alert from another replica"""
+        self._track_sources(key, labels, firing)
+        if firing and muted:
+            self.muted.add(key)
+        else:
+            self.muted.discard(key)
+    
+    def _track_sources(self, key: str, labels: Dict[str, str], firing: bool):
+        """Keep the set of firing inhibition sources up to date"""
+        for rule in self.inhibit_sources.matches(labels):
+            rule_key = rule.key(labels)
+            if firing:
+                rule.sources.setdefault(rule_key, set()).add(key)
+            else:
+                sources = rule.sources.get(rule_key)
+                if sources:
+                    sources.discard(key)
+                    if not sources:
+                        del rule.sources[rule_key]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'notifications_sent': self.notifications_sent,
+            'alerts_notified': self.alerts_notified,
+            'pending_groups': sum(bool(g['alerts']) for g in self.groups.values()),
+            'muted_alerts': len(self.muted)
+        }
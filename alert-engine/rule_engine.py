@@ -3,10 +3,16 @@ Rule Engine
 Evaluates alert rules against current metrics
 """
 
-from typing import Dict, List, Any, Optional
-from prometheus_query import PrometheusQuery
-from alert_tracker import AlertTracker
+import time
+from typing import Callable, Dict, List, Any, Optional, Tuple
+from prometheus_query import PrometheusQuery, Sample
+from alert_tracker import AlertTracker, AlertState
 from email_notifier import EmailNotifier
+from recording_rules import RecordingRules
+from silences import SilenceManager
+from routing import AlertDispatcher, Route
+from rule_table import CONDITIONS
+from metrics import alerts_fired_total, cycle_stages, observe_rule
 
 
 class RuleEngine:
@@ -14,66 +20,269 @@ class RuleEngine:
     
     def __init__(self, prometheus_query: PrometheusQuery, 
                  alert_tracker: AlertTracker,
-                 email_notifier: Optional[EmailNotifier] = None):
+                 email_notifier: Optional[EmailNotifier] = None,
+                 recording_rules: Optional[RecordingRules] = None,
+                 silences: Optional[SilenceManager] = None,
+                 dispatcher: Optional[AlertDispatcher] = None):
         self.prometheus_query = prometheus_query
         self.alert_tracker = alert_tracker
         self.email_notifier = email_notifier
+        self.recording_rules = recording_rules
+        # Without a routing config every alert goes to the email recipients on its own
+        self.dispatcher = dispatcher or AlertDispatcher(
+            Route({}), {'email': email_notifier} if email_notifier else None, silences=silences)
         self.rules_evaluated = 0
-        self.alerts_fired = 0
+        # Firing alerts handed to the dispatcher for a notification; it may
+        # still be grouped, rate limited or fail (see 'alerts_notified')
+        self.alerts_queued = 0
+        self.queries_executed = 0
+        self.series_alerts: Dict[str, Dict[str, Dict[str, str]]] = {}  # {rule_name: {alert_key: labels}}
+        self.rule_durations: Dict[str, float] = {}  # {rule_name: seconds of its last evaluation}
+        # Called with every alert state change (see ha.HACoordinator.record);
+        # returning False means this replica lost leadership and must not notify
+        self.on_transition: Optional[Callable[[Dict[str, Any]], bool]] = None
+        # Set for tenants of a TenantPool; added to alert labels for silences and routing
+        self.tenant: Optional[str] = None
+        # Rules whose alerts changed state from fallback data while Prometheus
+        # was down; re-evaluated against Prometheus once it is back
+        self.outage_rules: set = set()
+        self.reconcile_pending = False
+        # Alert transitions of the running cycle, dispatched together at its end
+        self.cycle_alerts: Optional[List[Tuple[Dict[str, Any], Optional[Dict[str, str]],
+                                               Optional[Dict[str, Any]]]]] = None
+        if prometheus_query is not None:
+            prometheus_query.on_recovery = self._prometheus_recovered
         
-    def evaluate_rule(self, rule: Dict[str, Any]) -> bool:
+    @staticmethod
+    def rule_query(rule: Dict[str, Any]) -> str:
+        """Get the PromQL expression a rule evaluates (`expr` or bare `metric`)"""
+        return rule.get('expr') or rule['metric']
+    
+    @staticmethod
+    def alert_key(rule_name: str, labels: Dict[str, str]) -> str:
+        """Build the tracker key of one series of a rule, e.g. 'low_battery{site="a"}'"""
+        pairs = [f'{k}="{v}"' for k, v in sorted(labels.items()) if k != '__name__']
+        if not pairs:
+            return rule_name
+        return f"{rule_name}{{{','.join(pairs)}}}"
+    
+    def alert_labels(self, rule: Dict[str, Any], labels: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Labels silences match against: series labels plus alertname, severity (and tenant)"""
+        alert_labels = {k: str(v) for k, v in (labels or {}).items() if k != '__name__'}
+        alert_labels['alertname'] = rule['name']
+        alert_labels['severity'] = rule.get('severity', '')
+        if self.tenant:
+            alert_labels['tenant'] = self.tenant
+        return alert_labels
+    
+    def query(self, query: str,
+              results: Optional[Dict[str, Optional[List[Sample]]]] = None) -> Optional[List[Sample]]:
+        """
+        Run a query, reusing the result of an identical query from this cycle
+        
+        Names of recording rules are answered from the recording rule cache
+        without contacting Prometheus.
+        
+        Args:
+            query: PromQL expression or recording rule name
+            results: Per-cycle result cache (None disables sharing)
+        """
+        if self.recording_rules and self.recording_rules.is_record(query):
+            return self.recording_rules.get(query)
+        
+        if results is not None and query in results:
+            return results[query]
+        
+        self.queries_executed += 1
+        started = time.perf_counter()
+        series = self.prometheus_query.query_vector(query)
+        cycle_stages.add('query', time.perf_counter() - started)
+        if results is not None:
+            results[query] = series
+        return series
+    
+    def evaluate_rule(self, rule: Dict[str, Any],
+                      results: Optional[Dict[str, Optional[List[Sample]]]] = None) -> bool:
         """
         Evaluate a single alert rule
         
+        Rules with a bare `metric` compare the first returned series against
+        the threshold. Rules with a PromQL `expr` compare every returned
+        series and track each one as a separate alert.
+        
         Args:
             rule: Alert rule configuration
+            results: Per-cycle query result cache shared between rules
             
         Returns:
             True if alert was fired, False otherwise
         """
+        started = time.perf_counter()
+        try:
+            return self._evaluate_rule(rule, results)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.rule_durations[rule['name']] = elapsed
+            observe_rule(rule['name'], elapsed, self.tenant or '')
+    
+    def _evaluate_rule(self, rule: Dict[str, Any],
+                       results: Optional[Dict[str, Optional[List[Sample]]]]) -> bool:
+        """Evaluate a single alert rule (uninstrumented)"""
         rule_name = rule['name']
-        metric_name = rule['metric']
-        condition = rule['condition']
-        threshold = rule['threshold']
-        duration = rule['duration']
+        query = self.rule_query(rule)
         
-        # Query current metric value
-        current_value = self.prometheus_query.query_metric(metric_name)
+        # Query current metric value(s)
+        series = self.query(query, results)
         
-        if current_value is None:
+        if series is None:
             print(f"⚠ Cannot evaluate rule '{rule_name}': metric data unavailable")
             return False
         
-        # Check condition
-        condition_met = self._check_condition(current_value, condition, threshold)
+        if 'expr' not in rule:
+            if not series:
+                print(f"⚠ Cannot evaluate rule '{rule_name}': metric data unavailable")
+                return False
+            current_value = series[0][1]
+            started = time.perf_counter()
+            condition_met = self._check_condition(current_value, rule['condition'], rule['threshold'])
+            cycle_stages.add('evaluate', time.perf_counter() - started)
+            return self._apply_state(rule, rule_name, query, condition_met, current_value,
+                                     series[0][0])
         
+        # Check conditions for all series first so the stage timer runs once
+        started = time.perf_counter()
+        condition, threshold = rule['condition'], rule['threshold']
+        checked = [(self.alert_key(rule_name, labels), labels, value,
+                    self._check_condition(value, condition, threshold))
+                   for labels, value in series]
+        cycle_stages.add('evaluate', time.perf_counter() - started)
+        
+        fired = False
+        seen = {}
+        for key, labels, current_value, condition_met in checked:
+            seen[key] = labels
+            fired |= self._apply_state(rule, key, key, condition_met, current_value, labels)
+        
+        # Series that dropped out of the result can no longer meet the condition.
+        # The fallback buffer only holds directly scraped series, so while
+        # Prometheus is down a missing series is left for reconciliation
+        tracked = self.series_alerts.setdefault(rule_name, {})
+        missing = tracked.keys() - seen.keys()
+        if missing and self.prometheus_query.is_down:
+            self.outage_rules.add(rule_name)
+            missing = ()
+        for key in missing:
+            info = self.alert_tracker.get_alert_info(key)
+            self._apply_state(rule, key, key, False, info['current_value'] if info else None,
+                              tracked[key])
+            info = self.alert_tracker.get_alert_info(key)
+            if info is None or info['state'] == AlertState.NORMAL:
+                del tracked[key]
+        tracked.update(seen)
+        
+        return fired
+    
+    def _apply_state(self, rule: Dict[str, Any], alert_name: str, display_name: str,
+                     condition_met: bool, current_value: Optional[float],
+                     labels: Optional[Dict[str, str]] = None) -> bool:
+        """Update tracker state for one alert and send notifications"""
         # Update alert state
+        started = time.perf_counter()
+        down = self.prometheus_query.is_down
+        if self.on_transition is not None or down:
+            previous = self.alert_tracker.get_alert_info(alert_name)
+            previous_state = previous['state'] if previous else None
         should_fire, should_resolve, state = self.alert_tracker.update_alert_state(
-            rule_name, condition_met, duration, current_value
+            alert_name, condition_met, rule['duration'], current_value
         )
+        cycle_stages.add('tracker_update', time.perf_counter() - started)
+        if down and (state != previous_state or should_fire):
+            self.outage_rules.add(rule['name'])
+        
+        # Replicate the change before notifying, so a standby taking over
+        # never notifies the same transition again
+        transition = None
+        if self.on_transition is not None and (state != previous_state or should_fire):
+            transition = self._transition(rule, alert_name, labels)
+            if not self.on_transition(transition):
+                return False
+        
+        if should_fire:
+            alerts_fired_total.labels(tenant=self.tenant or '', rule_name=rule['name'],
+                                      severity=rule['severity']).inc()
         
         # Print status
         status_emoji = "✓" if not condition_met else "⚠"
-        print(f"{status_emoji} {metric_name} = {current_value} (state: {state.value})")
+        print(f"{status_emoji} {display_name} = {current_value} (state: {state.value})")
         
-        # Fire alert if needed
-        if should_fire and self.email_notifier:
-            self._send_alert(rule, current_value)
-            self.alerts_fired += 1
-            return True
+        if not (should_fire or should_resolve):
+            return False
+        
+        # Silences, inhibition, routing and grouping happen in the dispatcher;
+        # they mute notifications but not state tracking
+        alert = {
+            'key': alert_name,
+            'rule': rule,
+            'labels': self.alert_labels(rule, labels),
+            'value': current_value,
+            'status': 'firing' if should_fire else 'resolved',
+            'tenant': self.tenant
+        }
+        if self.cycle_alerts is not None:
+            self.cycle_alerts.append((alert, labels, transition))
+            return should_fire
+        return self._notified(alert, labels, transition, self.dispatcher.dispatch(alert))
         
-        # Send resolution if needed
-        if should_resolve and self.email_notifier:
-            resolution_enabled = rule.get('resolution_notification', True)
-            if resolution_enabled:
-                self._send_resolution(rule, current_value)
+    def _notified(self, alert: Dict[str, Any], labels: Optional[Dict[str, str]],
+                  transition: Optional[Dict[str, Any]], notified: bool) -> bool:
+        """Replicate a changed mute state and count a queued firing alert"""
+        key = alert['key']
+        if transition is not None and transition['muted'] != (key in self.dispatcher.muted):
+            self.on_transition(self._transition(alert['rule'], key, labels))
         
+        if alert['status'] == 'firing' and notified:
+            self.alerts_queued += 1
+            return True
         return False
     
+    def _transition(self, rule: Dict[str, Any], alert_name: str,
+                    labels: Optional[Dict[str, str]]) -> Dict[str, Any]:
+        """Describe an alert's current state for replication"""
+        return {
+            'key': alert_name,
+            'rule': rule['name'],
+            'series': 'expr' in rule,
+            'labels': labels,
+            'alert_labels': self.alert_labels(rule, labels),
+            'muted': alert_name in self.dispatcher.muted,
+            'tracker': self.alert_tracker.export_alert(alert_name)
+        }
+    
+    def apply_transition(self, transition: Dict[str, Any]):
+        """Apply a state change replicated from another replica"""
+        key, data = transition['key'], transition['tracker']
+        self.alert_tracker.apply_alert(key, data)
+        
+        state = AlertState(data['state'])
+        if transition['series']:
+            tracked = self.series_alerts.setdefault(transition['rule'], {})
+            if state == AlertState.NORMAL:
+                tracked.pop(key, None)
+            else:
+                tracked[key] = transition['labels']
+        if state in (AlertState.FIRING, AlertState.RESOLVED):
+            self.dispatcher.restore(key, transition['alert_labels'],
+                                    state == AlertState.FIRING, transition['muted'])
+    
     def evaluate_all_rules(self, rules: List[Dict[str, Any]]):
         """
         Evaluate all alert rules
         
+        Recording rules are refreshed first, then rules sharing an identical
+        query are served by a single Prometheus request per cycle. Alert
+        transitions are dispatched once every rule has been evaluated, so
+        inhibition does not depend on the order of the rules.
+        
         Args:
             rules: List of alert rule configurations
         """
@@ -81,67 +290,71 @@ class RuleEngine:
         print(f"Evaluating {len(rules)} alert rules...")
         print(f"{'='*50}")
         
-        for rule in rules:
-            self.rules_evaluated += 1
-            self.evaluate_rule(rule)
+        results = {}
+        self.cycle_alerts = []
+        try:
+            if self.recording_rules:
+                self.recording_rules.evaluate(lambda query: self.query(query, results))
+            
+            for rule in rules:
+                self.rules_evaluated += 1
+                self.evaluate_rule(rule, results)
+            
+            if self.reconcile_pending:
+                self.reconcile_outage(rules)
+        finally:
+            held, self.cycle_alerts = self.cycle_alerts, None
+            sent = self.dispatcher.dispatch_cycle([alert for alert, _, _ in held])
+            for (alert, labels, transition), notified in zip(held, sent):
+                self._notified(alert, labels, transition, notified)
+        
+        # Send notification groups that are due
+        self.dispatcher.flush()
         
         print(f"{'='*50}\n")
     
-    def _check_condition(self, value: float, condition: str, threshold: float) -> bool:
-        """Check if condition is met"""
-        if condition == '>':
-            return value > threshold
-        elif condition == '<':
-            return value < threshold
-        elif condition == '>=':
-            return value >= threshold
-        elif condition == '<=':
-            return value <= threshold
-        elif condition == '==':
-            return value == threshold
-        elif condition == '!=':
-            return value != threshold
-        else:
-            print(f"✗ Unknown condition: {condition}")
-            return False
+    def _prometheus_recovered(self, outage: float):
+        """PrometheusQuery.on_recovery hook: reconcile at the end of this cycle"""
+        if self.outage_rules:
+            self.reconcile_pending = True
     
-    def _send_alert(self, rule: Dict[str, Any], current_value: float):
-        """Send alert notification"""
-        if not self.email_notifier:
-            return
+    def reconcile_outage(self, rules: List[Dict[str, Any]]):
+        """
+        Re-evaluate rules whose state changed during a Prometheus outage
         
-        success = self.email_notifier.send_alert_email(
-            rule_name=rule['name'],
-            subject=rule['email_subject'],
-            body=rule['email_body'],
-            metric_name=rule['metric'],
-            current_value=current_value,
-            threshold=rule['threshold'],
-            condition=rule['condition'],
-            severity=rule['severity']
-        )
+        Alerts that fired or resolved from the fallback buffer, and series
+        the buffer did not have, are checked against Prometheus right away
+        instead of waiting for the next cycle. Rules evaluated before the
+        recovery in this cycle saw buffered data, so nothing from this
+        cycle's query cache is reused.
         
-        if success:
-            print(f"🚨 ALERT FIRED: {rule['name']}")
-    
-    def _send_resolution(self, rule: Dict[str, Any], current_value: float):
-        """Send resolution notification"""
-        if not self.email_notifier:
+        Args:
+            rules: List of alert rule configurations
+        """
+        names, self.outage_rules = self.outage_rules, set()
+        self.reconcile_pending = False
+        changed = [rule for rule in rules if rule['name'] in names]
+        if not changed:
             return
         
-        success = self.email_notifier.send_resolution_email(
-            rule_name=rule['name'],
-            subject=rule['email_subject'],
-            metric_name=rule['metric'],
-            current_value=current_value
-        )
-        
-        if success:
-            print(f"✅ ALERT RESOLVED: {rule['name']}")
+        print(f"🔄 Reconciling {len(changed)} rules that changed during the outage with Prometheus")
+        results = {}
+        for rule in changed:
+            self.evaluate_rule(rule, results)
+    
+    def _check_condition(self, value: float, condition: str, threshold: float) -> bool:
+        """Check if condition is met (value may also be a numpy array)"""
+        compare = CONDITIONS.get(condition)
+        if compare is None:
+            print(f"✗ Unknown condition: {condition}")
+            return False
+        return compare(value, threshold)
     
     def get_stats(self) -> Dict:
         """Get rule evaluation statistics"""
         return {
             'rules_evaluated': self.rules_evaluated,
-            'alerts_fired': self.alerts_fired
+            'alerts_queued': self.alerts_queued,
+            'queries_executed': self.queries_executed,
+            **self.dispatcher.get_stats()
         }
@@ -0,0 +1,193 @@
+"""
+Rule Table
+Schema validation of alert rules and indexed lookups over them
+"""
+
+import operator
+import re
+from typing import Dict, Iterator, List, Any, Optional
+
+# Comparison operators allowed in rule conditions. They work element-wise on
+# numpy arrays as well, which the backtester relies on.
+CONDITIONS = {
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# Alert rule fields: (accepted types, required). Rules need a `metric` or an `expr`
+# (`expr` wins if both are set).
+RULE_SCHEMA = {
+    'name': (str, True),
+    'metric': (str, False),
+    'expr': (str, False),
+    'condition': (str, True),
+    'threshold': ((int, float), True),
+    'duration': ((int, float), True),
+    'severity': (str, True),
+    'email_subject': (str, True),
+    'email_body': (str, True),
+    'description': (str, False),
+    'resolution_notification': (bool, False),
+}
+
+# Parts of a PromQL expression that can't be metric names
+EXPR_NOISE_RE = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|\{[^}]*\}|\[[^\]]*\]'
+                           r'|\b(?:by|without|on|ignoring|group_left|group_right)\s*\([^)]*\)')
+IDENTIFIER_RE = re.compile(r'(?<![\w:.])([a-zA-Z_:][a-zA-Z0-9_:]*)(?![\w:]|\s*\()')
+PROMQL_KEYWORDS = {'and', 'or', 'unless', 'bool', 'offset', 'by', 'without', 'on', 'ignoring',
+                   'group_left', 'group_right', 'inf', 'nan'}
+
+
+def expr_metrics(expr: str) -> List[str]:
+    """Metric names a PromQL expression selects, e.g. ['iot_battery_percent']"""
+    names = IDENTIFIER_RE.findall(EXPR_NOISE_RE.sub(' ', expr))
+    return list(dict.fromkeys(n for n in names if n.lower() not in PROMQL_KEYWORDS))
+
+
+class AlertRule(dict):
+    """
+    A validated alert rule
+    
+    Still a dict, so `rule['threshold']`, `rule.get(...)` and jsonify keep
+    working everywhere rules are passed around; the typed attributes are
+    for new code.
+    """
+    
+    __slots__ = ()
+    
+    @property
+    def name(self) -> str:
+        return self['name']
+    
+    @property
+    def query(self) -> str:
+        """PromQL the rule evaluates (`expr` or bare `metric`)"""
+        return self.get('expr') or self['metric']
+    
+    @property
+    def condition(self) -> str:
+        return self['condition']
+    
+    @property
+    def threshold(self) -> float:
+        return self['threshold']
+    
+    @property
+    def duration(self) -> float:
+        return self['duration']
+    
+    @property
+    def severity(self) -> str:
+        return self['severity']
+    
+    @property
+    def metrics(self) -> List[str]:
+        """Metric names the rule reads"""
+        return expr_metrics(self['expr']) if 'expr' in self else [self['metric']]
+
+
+class RuleTable:
+    """
+    Alert rules in configured order, indexed by name, metric and severity
+    
+    Build it from rules that passed `RuleTable.validate`. Every index maps
+    to rules in configured order, so filtered results keep that order.
+    """
+    
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = [AlertRule(rule) for rule in rules]
+        self.by_name: Dict[str, AlertRule] = {}
+        self.by_metric: Dict[str, List[AlertRule]] = {}
+        self.by_severity: Dict[str, List[AlertRule]] = {}
+        for rule in self.rules:
+            self.by_name[rule.name] = rule
+            self.by_severity.setdefault(rule.severity, []).append(rule)
+            for metric in rule.metrics:
+                self.by_metric.setdefault(metric, []).append(rule)
+    
+    def __iter__(self) -> Iterator[AlertRule]:
+        return iter(self.rules)
+    
+    def __len__(self) -> int:
+        return len(self.rules)
+    
+    def get(self, name: str) -> Optional[AlertRule]:
+        return self.by_name.get(name)
+    
+    def filter(self, name: Optional[str] = None, severity: Optional[str] = None,
+               metric: Optional[str] = None) -> List[AlertRule]:
+        """
+        Rules matching all the given criteria
+        
+        Args:
+            name: Exact rule name
+            severity: Rule severity
+            metric: Metric name the rule reads (bare `metric` or inside `expr`)
+        
+        Returns:
+            Matching rules in configured order
+        """
+        indexes = []
+        if name is not None:
+            indexes.append([self.by_name[name]] if name in self.by_name else [])
+        if severity is not None:
+            indexes.append(self.by_severity.get(severity, []))
+        if metric is not None:
+            indexes.append(self.by_metric.get(metric, []))
+        if not indexes:
+            return list(self.rules)
+        
+        # Walk the shortest index, keeping rules that are in all the others
+        shortest = min(indexes, key=len)
+        others = [{rule.name for rule in index} for index in indexes if index is not shortest]
+        return [rule for rule in shortest if all(rule.name in names for names in others)]
+    
+    @staticmethod
+    def validate(rules: Any) -> bool:
+        """Check alert rules against RULE_SCHEMA, their conditions and unique names"""
+        if not isinstance(rules, list):
+            print("✗ alert_rules must be a list")
+            return False
+        
+        seen = set()
+        for i, rule in enumerate(rules):
+            if not isinstance(rule, dict):
+                print(f"✗ Alert rule {i} must be a mapping")
+                return False
+            where = f"Rule '{rule.get('name', i)}'"
+            for field, (types, required) in RULE_SCHEMA.items():
+                if field not in rule:
+                    if required:
+                        print(f"✗ {where}: missing '{field}'")
+                        return False
+                    continue
+                value = rule[field]
+                # bool is an int subclass but never a valid number here
+                if not isinstance(value, types) or (isinstance(value, bool) and types is not bool):
+                    print(f"✗ {where}: '{field}' has invalid value {value!r}")
+                    return False
+            
+            if 'metric' not in rule and 'expr' not in rule:
+                print(f"✗ {where} needs a 'metric' or an 'expr'")
+                return False
+            if rule['condition'] not in CONDITIONS:
+                print(f"✗ {where}: invalid condition '{rule['condition']}' "
+                      f"(use one of {', '.join(CONDITIONS)})")
+                return False
+            if rule['duration'] < 0:
+                print(f"✗ {where}: duration must not be negative")
+                return False
+            unknown = rule.keys() - RULE_SCHEMA.keys()
+            if unknown:
+                # Most likely a typo; not fatal so extra annotations keep working
+                print(f"⚠ {where}: ignoring unknown fields {', '.join(sorted(unknown))}")
+            
+            if rule['name'] in seen:
+                print(f"✗ Duplicate alert rule name: {rule['name']}")
+                return False
+            seen.add(rule['name'])
+        return True
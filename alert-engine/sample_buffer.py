@@ -0,0 +1,350 @@
+"""
+Sample Buffer
+Compact in-memory ring buffer of recent samples (Gorilla compression)
+
+Samples are appended to per-series chunks encoded like Facebook's Gorilla
+TSDB: timestamps as delta-of-delta, values as the XOR with the previous
+value. With regular scrapes a timestamp costs 1-12 bits and an unchanged
+value 1 bit, so an hour of 5s samples for one series fits in a few KB. Each
+series keeps a bounded number of sealed chunks, so memory stays fixed
+however long Prometheus is down.
+"""
+
+import re
+import struct
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_query import Sample
+
+SELECTOR_RE = re.compile(r'^\s*([a-zA-Z_:][a-zA-Z0-9_:]*)\s*(?:\{(.*)\})?\s*$')
+MATCHER_RE = re.compile(r'\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*(=~|!~|!=|=)\s*"((?:[^"\\]|\\.)*)"\s*,?')
+
+# Delta-of-delta buckets: (prefix, prefix bits, value bits)
+DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12))
+
+
+def _float_bits(value: float) -> int:
+    return struct.unpack('>Q', struct.pack('>d', value))[0]
+
+
+def _bits_float(bits: int) -> float:
+    return struct.unpack('>d', struct.pack('>Q', bits))[0]
+
+
+class BitWriter:
+    """Appends bit fields to an integer accumulator"""
+    
+    __slots__ = ('value', 'bits')
+    
+    def __init__(self):
+        self.value = 0
+        self.bits = 0
+    
+    def write(self, value: int, bits: int):
+        self.value = (self.value << bits) | (value & ((1 << bits) - 1))
+        self.bits += bits
+    
+    def to_bytes(self) -> bytes:
+        pad = -self.bits % 8
+        return (self.value << pad).to_bytes((self.bits + pad) // 8, 'big')
+
+
+class BitReader:
+    """Reads bit fields written by BitWriter"""
+    
+    __slots__ = ('value', 'remaining')
+    
+    def __init__(self, data: bytes):
+        self.value = int.from_bytes(data, 'big')
+        self.remaining = len(data) * 8
+    
+    def read(self, bits: int) -> int:
+        self.remaining -= bits
+        return (self.value >> self.remaining) & ((1 << bits) - 1)
+    
+    def read_signed(self, bits: int) -> int:
+        value = self.read(bits)
+        return value - (1 << bits) if value >> (bits - 1) else value
+
+
+class Chunk:
+    """Gorilla-encoded run of (timestamp_ms, value) samples"""
+    
+    __slots__ = ('writer', 'count', 'prev_ts', 'prev_delta', 'prev_bits',
+                 'leading', 'trailing')
+    
+    def __init__(self):
+        self.writer = BitWriter()
+        self.count = 0
+        self.prev_ts = 0
+        self.prev_delta = 0
+        self.prev_bits = 0
+        self.leading = -1
+        self.trailing = 0
+    
+    def append(self, ts_ms: int, value: float):
+        w = self.writer
+        bits = _float_bits(value)
+        
+        if self.count == 0:
+            w.write(ts_ms, 64)
+            w.write(bits, 64)
+        else:
+            delta = ts_ms - self.prev_ts
+            self._write_dod(delta - self.prev_delta)
+            self.prev_delta = delta
+            self._write_xor(bits ^ self.prev_bits)
+        
+        self.prev_ts = ts_ms
+        self.prev_bits = bits
+        self.count += 1
+    
+    def _write_dod(self, dod: int):
+        w = self.writer
+        if dod == 0:
+            w.write(0, 1)
+            return
+        for prefix, prefix_bits, value_bits in DOD_BUCKETS:
+            limit = 1 << (value_bits - 1)
+            if -limit <= dod < limit:
+                w.write(prefix, prefix_bits)
+                w.write(dod, value_bits)
+                return
+        w.write(0b1111, 4)
+        w.write(dod, 64)
+    
+    def _write_xor(self, xor: int):
+        w = self.writer
+        if xor == 0:
+            w.write(0, 1)
+            return
+        
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        if self.leading >= 0 and leading >= self.leading and trailing >= self.trailing:
+            # Meaningful bits fit in the previous window
+            w.write(0b10, 2)
+            w.write(xor >> self.trailing, 64 - self.leading - self.trailing)
+        else:
+            significant = 64 - leading - trailing
+            w.write(0b11, 2)
+            w.write(leading, 5)
+            w.write(significant - 1, 6)
+            w.write(xor >> trailing, significant)
+            self.leading, self.trailing = leading, trailing
+    
+    def seal(self) -> Tuple[bytes, int]:
+        """Freeze the chunk into (bytes, sample count)"""
+        return self.writer.to_bytes(), self.count
+    
+    @staticmethod
+    def decode(data: bytes, count: int) -> List[Tuple[int, float]]:
+        """Decode a sealed chunk"""
+        if count == 0:
+            return []
+        
+        r = BitReader(data)
+        ts = r.read(64)
+        bits = r.read(64)
+        samples = [(ts, _bits_float(bits))]
+        delta = 0
+        leading, trailing = 0, 0
+        
+        for _ in range(count - 1):
+            if r.read(1) == 0:
+                dod = 0
+            else:
+                for _, prefix_bits, value_bits in DOD_BUCKETS:
+                    if r.read(1) == 0:
+                        dod = r.read_signed(value_bits)
+                        break
+                else:
+                    dod = r.read_signed(64)
+            delta += dod
+            ts += delta
+            
+            if r.read(1) == 1:
+                if r.read(1) == 1:
+                    leading = r.read(5)
+                    significant = r.read(6) + 1
+                    trailing = 64 - leading - significant
+                bits ^= r.read(64 - leading - trailing) << trailing
+            samples.append((ts, _bits_float(bits)))
+        
+        return samples
+
+
+class SeriesBuffer:
+    """Bounded ring of chunks for one series"""
+    
+    __slots__ = ('labels', 'chunks', 'head', 'last_ts', 'last_value')
+    
+    def __init__(self, labels: Dict[str, str], max_chunks: int):
+        self.labels = labels
+        self.chunks = deque(maxlen=max_chunks)
+        self.head = Chunk()
+        self.last_ts = 0.0
+        self.last_value = 0.0
+    
+    def nbytes(self) -> int:
+        return sum(len(data) for data, _ in self.chunks) + (self.head.writer.bits + 7) // 8
+    
+    def samples(self) -> List[Tuple[float, float]]:
+        """All retained samples as (unix seconds, value)"""
+        out = []
+        for data, count in list(self.chunks) + [self.head.seal()]:
+            out.extend((ts / 1000.0, value) for ts, value in Chunk.decode(data, count))
+        return out
+
+
+class SampleBuffer:
+    """
+    Recent samples of directly scraped series
+    
+    Answers instant and range queries that are plain selectors (e.g.
+    'metric' or 'metric{instance="a:8085",job!="x"}') from the retained
+    samples, applying Prometheus' 5 minute staleness window.
+    """
+    
+    def __init__(self, retention_seconds: float = 3600, scrape_interval: float = 5,
+                 chunk_size: int = 120, staleness_seconds: float = 300):
+        self.chunk_size = chunk_size
+        self.retention_seconds = retention_seconds
+        self.staleness_seconds = staleness_seconds
+        # Sealed chunks needed to cover the retention, plus the open head chunk
+        self.max_chunks = max(1, int(retention_seconds / (chunk_size * scrape_interval)) + 1)
+        self.series: Dict[str, Dict[Tuple, SeriesBuffer]] = {}  # {metric: {label_key: buffer}}
+        self.lock = threading.Lock()
+    
+    def append(self, name: str, labels: Dict[str, str], timestamp: float, value: float):
+        """Add one sample"""
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            by_labels = self.series.setdefault(name, {})
+            buffer = by_labels.get(key)
+            if buffer is None:
+                buffer = by_labels[key] = SeriesBuffer(dict(labels), self.max_chunks)
+            elif timestamp <= buffer.last_ts:
+                return
+            
+            buffer.head.append(int(timestamp * 1000), value)
+            if buffer.head.count >= self.chunk_size:
+                buffer.chunks.append(buffer.head.seal())
+                buffer.head = Chunk()
+            buffer.last_ts = timestamp
+            buffer.last_value = value
+    
+    def query_vector(self, query: str, now: Optional[float] = None) -> Optional[List[Sample]]:
+        """
+        Answer a selector query from buffered samples
+        
+        Returns:
+            List of (labels, value) tuples, or None if the query is not a
+            plain selector (functions and aggregations need Prometheus)
+        """
+        parsed = self._parse_selector(query)
+        if parsed is None:
+            return None
+        
+        name, matchers = parsed
+        now = now or time.time()
+        result = []
+        with self.lock:
+            for buffer in self.series.get(name, {}).values():
+                if now - buffer.last_ts > self.staleness_seconds:
+                    continue
+                if all(match(buffer.labels.get(label, '')) for label, match in matchers):
+                    result.append(({'__name__': name, **buffer.labels}, buffer.last_value))
+        return result
+    
+    def query_range(self, query: str, start: float, end: float,
+                    step: float) -> Optional[List[Tuple[Dict[str, str], list]]]:
+        """
+        Answer a selector range query from buffered samples
+        
+        Like Prometheus, each step takes the latest sample at or before it,
+        unless that sample is older than the staleness window.
+        
+        Returns:
+            List of (labels, [[timestamp, "value"], ...]) tuples in the shape
+            of PrometheusQuery.query_range, or None if the query is not a
+            plain selector
+        """
+        parsed = self._parse_selector(query)
+        if parsed is None:
+            return None
+        
+        name, matchers = parsed
+        with self.lock:
+            buffers = [b for b in self.series.get(name, {}).values()
+                       if all(match(b.labels.get(label, '')) for label, match in matchers)]
+            history = [(b.labels, b.samples()) for b in buffers]
+        
+        steps = int((end - start) // step) + 1 if end >= start else 0
+        result = []
+        for labels, samples in history:
+            values = []
+            i = 0
+            for n in range(steps):
+                t = start + n * step
+                while i < len(samples) and samples[i][0] <= t:
+                    i += 1
+                if i and t - samples[i - 1][0] <= self.staleness_seconds:
+                    values.append([t, repr(samples[i - 1][1])])
+            if values:
+                result.append(({'__name__': name, **labels}, values))
+        return result
+    
+    def drop_stale(self, now: Optional[float] = None) -> int:
+        """Forget series with no samples within the retention period"""
+        now = now or time.time()
+        dropped = 0
+        with self.lock:
+            for name in list(self.series):
+                by_labels = self.series[name]
+                for key in [k for k, b in by_labels.items() if now - b.last_ts > self.retention_seconds]:
+                    del by_labels[key]
+                    dropped += 1
+                if not by_labels:
+                    del self.series[name]
+        return dropped
+    
+    def series_count(self) -> int:
+        with self.lock:
+            return sum(len(by_labels) for by_labels in self.series.values())
+    
+    def memory_bytes(self) -> int:
+        """Compressed payload size of all series"""
+        with self.lock:
+            return sum(b.nbytes() for by_labels in self.series.values() for b in by_labels.values())
+    
+    @staticmethod
+    def _parse_selector(query: str):
+        """Parse 'name{label="v",...}' into (name, [(label, predicate)])"""
+        match = SELECTOR_RE.match(query)
+        if not match:
+            return None
+        
+        name, body = match.group(1), match.group(2) or ''
+        matchers = []
+        pos = 0
+        while pos < len(body.strip()):
+            m = MATCHER_RE.match(body, pos)
+            if not m:
+                return None
+            label, op, value = m.group(1), m.group(2), m.group(3).replace('\\"', '"')
+            if op == '=':
+                matchers.append((label, lambda v, e=value: v == e))
+            elif op == '!=':
+                matchers.append((label, lambda v, e=value: v != e))
+            elif op == '=~':
+                pattern = re.compile(value)
+                matchers.append((label, lambda v, p=pattern: p.fullmatch(v) is not None))
+            else:
+                pattern = re.compile(value)
+                matchers.append((label, lambda v, p=pattern: p.fullmatch(v) is None))
+            pos = m.end()
+        return name, matchers
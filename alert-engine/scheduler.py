@@ -0,0 +1,174 @@
+"""
+Adaptive Scheduler
+Paces evaluation cycles on the scrape cadence and sheds low-severity rules under overload
+"""
+
+import math
+import time
+from typing import Callable, Dict, List, Any, Optional
+
+from severity import severity_priority
+from metrics import (scheduler_interval, scheduler_cycle_cost, scheduler_overloaded,
+                     rules_deferred_total, rules_forced_total, scheduler_skipped_ticks_total,
+                     tenant_overloaded, tenant_rules_deferred_total)
+
+
+class AdaptiveScheduler:
+    """
+    Decides when evaluation cycles start and which rules they run
+    
+    Cycles start on a fixed grid of multiples of the Prometheus scrape
+    interval (`align_seconds`), with the evaluation interval rounded up to
+    a multiple of it, so consecutive cycles are always at least one scrape
+    apart and never evaluate the same sample twice. A cycle that overruns
+    its interval does not start the next one late: the missed ticks are
+    skipped and the next cycle starts on the grid.
+    
+    The cost of each rule is tracked as an exponentially weighted moving
+    average. When the predicted cost of a cycle exceeds `budget_ratio` of
+    the interval, critical rules still run every cycle; the other rules
+    run by severity (warning before info) as long as the budget allows,
+    and the rest are deferred. A rule deferred `max_defer_cycles` times in
+    a row runs in the next cycle regardless, so nothing starves.
+    
+    A tenant's scheduler (`tenant` set) only plans that tenant's rules
+    within its share of the budget and reports per-tenant metrics; the
+    shared scheduler decides when cycles start.
+    """
+    
+    def __init__(self, interval: float, align_seconds: float = 5, budget_ratio: float = 0.8,
+                 max_defer_cycles: int = 4, alpha: float = 0.3, tenant: Optional[str] = None,
+                 clock: Callable[[], float] = time.time,
+                 sleep: Callable[[float], None] = time.sleep):
+        if align_seconds:
+            interval = max(1, math.ceil(interval / align_seconds)) * align_seconds
+        self.interval = interval
+        self.align_seconds = align_seconds
+        self.budget = interval * budget_ratio
+        self.max_defer_cycles = max_defer_cycles
+        self.alpha = alpha
+        self.tenant = tenant
+        self.clock = clock
+        self.sleep = sleep
+        
+        self.rule_cost: Dict[str, float] = {}  # {rule_name: EWMA seconds}
+        self.cycle_cost: Optional[float] = None
+        self.deferred: Dict[str, int] = {}  # {rule_name: cycles deferred in a row}
+        self.next_tick: Optional[float] = None
+        self.overloaded = False
+        self.skipped_ticks = 0
+        self.rules_deferred = 0
+        if tenant is None:
+            scheduler_interval.set(interval)
+    
+    def wait(self) -> float:
+        """
+        Sleep until the next cycle should start
+        
+        Returns:
+            Seconds slept
+        """
+        now = self.clock()
+        if self.next_tick is None:
+            grid = self.align_seconds or self.interval
+            self.next_tick = math.ceil(now / grid) * grid
+        else:
+            self.next_tick += self.interval
+            if self.next_tick < now:
+                missed = math.ceil((now - self.next_tick) / self.interval)
+                self.next_tick += missed * self.interval
+                self.skipped_ticks += missed
+                scheduler_skipped_ticks_total.inc(missed)
+                print(f"⚠ Evaluation overran, skipping {missed} tick(s)")
+        
+        delay = max(0.0, self.next_tick - now)
+        if delay:
+            self.sleep(delay)
+        return delay
+    
+    def reset(self):
+        """Forget the tick grid (e.g. while a standby isn't evaluating)"""
+        self.next_tick = None
+    
+    def plan(self, rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Choose the rules to evaluate this cycle
+        
+        Returns:
+            Rules to evaluate, in their configured order
+        """
+        known = [self.rule_cost[r['name']] for r in rules if r['name'] in self.rule_cost]
+        default_cost = sum(known) / len(known) if known else 0.0
+        cost = {r['name']: self.rule_cost.get(r['name'], default_cost) for r in rules}
+        
+        self.overloaded = sum(cost.values()) > self.budget
+        if self.tenant is None:
+            scheduler_overloaded.set(int(self.overloaded))
+        else:
+            tenant_overloaded.labels(tenant=self.tenant).set(int(self.overloaded))
+        if not self.overloaded:
+            self.deferred.clear()
+            return rules
+        
+        # Critical and long-deferred rules first, then by severity and deferral
+        def rank(rule: Dict[str, Any]):
+            priority = severity_priority(rule.get('severity'))
+            required = priority == 0 or self.deferred.get(rule['name'], 0) >= self.max_defer_cycles
+            return (not required, priority, -self.deferred.get(rule['name'], 0))
+        
+        selected = set()
+        spent = 0.0
+        for rule in sorted(rules, key=rank):
+            name = rule['name']
+            required = not rank(rule)[0]
+            if required or spent + cost[name] <= self.budget:
+                selected.add(name)
+                spent += cost[name]
+                if required and self.deferred.get(name, 0) >= self.max_defer_cycles \
+                        and self.tenant is None:
+                    rules_forced_total.labels(rule_name=name, severity=rule.get('severity', '')).inc()
+        
+        for rule in rules:
+            name = rule['name']
+            if name in selected:
+                self.deferred.pop(name, None)
+            else:
+                self.deferred[name] = self.deferred.get(name, 0) + 1
+                self.rules_deferred += 1
+                if self.tenant is None:
+                    rules_deferred_total.labels(rule_name=name, severity=rule.get('severity', '')).inc()
+        if self.tenant is not None:
+            tenant_rules_deferred_total.labels(tenant=self.tenant).inc(len(rules) - len(selected))
+        
+        prefix = f"[{self.tenant}] " if self.tenant else ''
+        print(f"⚠ {prefix}Overloaded: running {len(selected)}/{len(rules)} rules "
+              f"(predicted {sum(cost.values()):.2f}s, budget {self.budget:.2f}s)")
+        return [rule for rule in rules if rule['name'] in selected]
+    
+    def record(self, rules: List[Dict[str, Any]], durations: Dict[str, float],
+               cycle_seconds: float):
+        """Update cost averages after a cycle"""
+        for rule in rules:
+            name = rule['name']
+            if name in durations:
+                previous = self.rule_cost.get(name)
+                self.rule_cost[name] = durations[name] if previous is None \
+                    else previous + self.alpha * (durations[name] - previous)
+        
+        # Scale a partial cycle up to what all rules would have cost
+        full_cost = sum(self.rule_cost.values()) if self.overloaded else cycle_seconds
+        self.cycle_cost = full_cost if self.cycle_cost is None \
+            else self.cycle_cost + self.alpha * (full_cost - self.cycle_cost)
+        if self.tenant is None:
+            scheduler_cycle_cost.set(self.cycle_cost)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'interval': self.interval,
+            'budget': self.budget,
+            'cycle_cost': self.cycle_cost,
+            'overloaded': self.overloaded,
+            'deferred_rules': len(self.deferred),
+            'rules_deferred': self.rules_deferred,
+            'skipped_ticks': self.skipped_ticks
+        }
@@ -0,0 +1,15 @@
+"""
+Severity
+Ordering of rule severities, shared by the engine, rate limiter and scheduler
+"""
+
+from typing import Optional
+
+# Rule severities, most urgent first (lower sends and evaluates first)
+SEVERITY_PRIORITY = {'critical': 0, 'warning': 1, 'info': 2}
+PRIORITY_SEVERITY = {priority: severity for severity, priority in SEVERITY_PRIORITY.items()}
+
+
+def severity_priority(severity: Optional[str]) -> int:
+    """Priority of a severity; unknown severities go last"""
+    return SEVERITY_PRIORITY.get(severity, len(SEVERITY_PRIORITY))
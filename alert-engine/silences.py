@@ -0,0 +1,351 @@
+"""
+Silences
+Mutes notifications for matching alerts during a time window
+"""
+
+import heapq
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from collections import Counter
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+# Matcher operators, as in Alertmanager
+OPERATORS = ('=', '!=', '=~', '!~')
+
+# Repeat periods of recurring maintenance windows
+REPEATS = {'daily': 86400, 'weekly': 7 * 86400}
+
+Matcher = Tuple[str, Callable[[str], bool]]
+
+
+def parse_time(value: Any) -> float:
+    """Parse an ISO date/time or unix timestamp"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def compile_matcher(matcher: Dict[str, str]) -> Matcher:
+    """Compile {'name', 'value', 'op'} into (label, predicate)"""
+    op, value = matcher.get('op', '='), matcher['value']
+    if op == '=':
+        return matcher['name'], lambda v: v == value
+    if op == '!=':
+        return matcher['name'], lambda v: v != value
+    pattern = re.compile(value)
+    if op == '=~':
+        return matcher['name'], lambda v: pattern.fullmatch(v) is not None
+    return matcher['name'], lambda v: pattern.fullmatch(v) is None
+
+
+class SilenceManager:
+    """
+    Active and scheduled silences with indexed lookups
+    
+    A silence is a dict with `matchers` ([{'name', 'value', 'op'}]) matched
+    against the alert labels, which are the series labels plus `alertname`
+    (rule name) and `severity`. It applies from `starts_at` until `ends_at`;
+    with `repeat` ('daily' or 'weekly') the window is moved forward by one
+    period each time it ends, which makes it a recurring maintenance window.
+    
+    Lookups stay cheap with many silences:
+      - Time: scheduled silences wait in a heap ordered by start and active
+        ones in a heap ordered by end; both are only advanced as time moves,
+        so the active set is never rescanned.
+      - Labels: each active silence is indexed under one of its equality
+        matchers (the (label, value) pair used by the fewest silences, so
+        buckets stay small), and an alert only checks the buckets of its own
+        label pairs. Silences made only of regex or negative matchers are
+        checked for every alert.
+    """
+    
+    def __init__(self, storage_path: Optional[str] = None,
+                 clock: Callable[[], float] = time.time):
+        self.storage_path = storage_path
+        self.clock = clock
+        self.silences: Dict[str, Dict[str, Any]] = {}  # {id: silence}
+        self.compiled: Dict[str, List[Matcher]] = {}
+        self.anchors: Dict[str, Optional[Tuple[str, str]]] = {}
+        self.pair_usage = Counter()  # {(label, value): silences with that equality matcher}
+        self.pending: List[Tuple[float, str]] = []  # heap of (starts_at, id)
+        self.ending: List[Tuple[float, str]] = []  # heap of (ends_at, id)
+        self.active: Dict[str, bool] = {}
+        self.by_label: Dict[Tuple[str, str], Dict[str, List[Matcher]]] = {}
+        self.unanchored: Dict[str, List[Matcher]] = {}
+        self.lock = threading.RLock()
+    
+    @staticmethod
+    def validate(silence: Dict[str, Any]) -> Optional[str]:
+        """
+        Check a silence definition
+        
+        Returns:
+            Error message, or None if the silence is valid
+        """
+        matchers = silence.get('matchers')
+        if not matchers or not isinstance(matchers, list):
+            return "Silence needs at least one matcher"
+        for matcher in matchers:
+            if not isinstance(matcher, dict) or not isinstance(matcher.get('name'), str) \
+                    or not isinstance(matcher.get('value'), str):
+                return f"Invalid matcher: {matcher}"
+            if matcher.get('op', '=') not in OPERATORS:
+                return f"Invalid matcher operator: {matcher.get('op')}"
+            if matcher.get('op', '=') in ('=~', '!~'):
+                try:
+                    re.compile(matcher['value'])
+                except re.error as e:
+                    return f"Invalid matcher regex '{matcher['value']}': {e}"
+        # An empty label always matches '', so this would silence everything
+        if all(compile_matcher(m)[1]('') for m in matchers):
+            return "Silence matchers must not all match empty labels"
+        if silence.get('repeat') and silence['repeat'] not in REPEATS:
+            return f"Invalid repeat: {silence['repeat']} (use {', '.join(REPEATS)})"
+        if not isinstance(silence.get('starts_at'), (int, float)) \
+                or not isinstance(silence.get('ends_at'), (int, float)):
+            return "Silence needs numeric 'starts_at' and 'ends_at'"
+        if silence['ends_at'] <= silence['starts_at']:
+            return "Silence must end after it starts"
+        if silence.get('repeat') and silence['ends_at'] - silence['starts_at'] >= REPEATS[silence['repeat']]:
+            return "Recurring window must be shorter than its repeat period"
+        return None
+    
+    def create(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Add a silence
+        
+        Args:
+            data: 'matchers', optional 'starts_at' (default now), 'ends_at'
+                  or 'duration_minutes', 'repeat', 'comment', 'created_by'
+        
+        Returns:
+            The stored silence (with its 'id')
+        
+        Raises:
+            ValueError: If the definition is invalid
+        """
+        now = self.clock()
+        try:
+            starts_at = parse_time(data['starts_at']) if data.get('starts_at') is not None else now
+            if data.get('ends_at') is not None:
+                ends_at = parse_time(data['ends_at'])
+            elif data.get('duration_minutes') is not None:
+                ends_at = starts_at + float(data['duration_minutes']) * 60
+            else:
+                raise ValueError("Silence needs 'ends_at' or 'duration_minutes'")
+        except (TypeError, ValueError) as e:
+            raise ValueError(str(e)) from None
+        
+        silence = {
+            'id': uuid.uuid4().hex,
+            'matchers': [{'name': m.get('name'), 'value': m.get('value'), 'op': m.get('op', '=')}
+                         if isinstance(m, dict) else m for m in data.get('matchers') or []],
+            'starts_at': starts_at,
+            'ends_at': ends_at,
+            'repeat': data.get('repeat'),
+            'comment': data.get('comment', ''),
+            'created_by': data.get('created_by', ''),
+            'created_at': now
+        }
+        error = self.validate(silence)
+        if error:
+            raise ValueError(error)
+        
+        with self.lock:
+            self._add(silence, now)
+            self.save()
+        return silence
+    
+    def delete(self, silence_id: str) -> bool:
+        """Remove a silence; returns False if it does not exist"""
+        with self.lock:
+            if silence_id not in self.silences:
+                return False
+            self._deactivate(silence_id)
+            self._forget(silence_id)
+            # Heap entries of deleted silences are skipped when popped
+            self.save()
+        return True
+    
+    def list(self, active_only: bool = False) -> List[Dict[str, Any]]:
+        """Get silences, each with its current 'active' flag"""
+        with self.lock:
+            self._advance(self.clock())
+            return [{**silence, 'active': silence_id in self.active}
+                    for silence_id, silence in self.silences.items()
+                    if not active_only or silence_id in self.active]
+    
+    def active_count(self) -> int:
+        with self.lock:
+            self._advance(self.clock())
+            return len(self.active)
+    
+    def silenced_by(self, labels: Dict[str, str]) -> Optional[str]:
+        """
+        Find an active silence matching an alert
+        
+        Args:
+            labels: Alert labels including 'alertname' and 'severity'
+        
+        Returns:
+            ID of the first matching silence, or None
+        """
+        with self.lock:
+            self._advance(self.clock())
+            if not self.active:
+                return None
+            
+            for pair in labels.items():
+                candidates = self.by_label.get(pair)
+                if candidates:
+                    for silence_id, matchers in candidates.items():
+                        if self._matches(matchers, labels):
+                            return silence_id
+            for silence_id, matchers in self.unanchored.items():
+                if self._matches(matchers, labels):
+                    return silence_id
+        return None
+    
+    @staticmethod
+    def _matches(matchers: List[Matcher], labels: Dict[str, str]) -> bool:
+        return all(match(labels.get(name, '')) for name, match in matchers)
+    
+    def _add(self, silence: Dict[str, Any], now: float):
+        """Index a silence and schedule or activate it"""
+        silence_id = silence['id']
+        self.silences[silence_id] = silence
+        self.compiled[silence_id] = [compile_matcher(m) for m in silence['matchers']]
+        
+        equality = self._equality_pairs(silence)
+        self.pair_usage.update(equality)
+        self.anchors[silence_id] = min(equality, key=self.pair_usage.__getitem__, default=None)
+        
+        heapq.heappush(self.pending, (silence['starts_at'], silence_id))
+        self._advance(now)
+    
+    @staticmethod
+    def _equality_pairs(silence: Dict[str, Any]) -> List[Tuple[str, str]]:
+        return [(m['name'], m['value']) for m in silence['matchers']
+                if m.get('op', '=') == '=' and m['value'] != '']
+    
+    def _forget(self, silence_id: str):
+        """Remove a silence that is no longer active"""
+        silence = self.silences.pop(silence_id)
+        for pair in self._equality_pairs(silence):
+            self.pair_usage[pair] -= 1
+            if self.pair_usage[pair] <= 0:
+                del self.pair_usage[pair]
+        del self.compiled[silence_id]
+        del self.anchors[silence_id]
+    
+    def _activate(self, silence_id: str):
+        anchor = self.anchors[silence_id]
+        matchers = self.compiled[silence_id]
+        if anchor is None:
+            self.unanchored[silence_id] = matchers
+        else:
+            self.by_label.setdefault(anchor, {})[silence_id] = matchers
+        self.active[silence_id] = True
+        heapq.heappush(self.ending, (self.silences[silence_id]['ends_at'], silence_id))
+    
+    def _deactivate(self, silence_id: str):
+        if not self.active.pop(silence_id, None):
+            return
+        anchor = self.anchors[silence_id]
+        if anchor is None:
+            self.unanchored.pop(silence_id, None)
+        else:
+            bucket = self.by_label.get(anchor, {})
+            bucket.pop(silence_id, None)
+            if not bucket:
+                self.by_label.pop(anchor, None)
+    
+    def _advance(self, now: float):
+        """Apply silence starts and ends up to `now`, saving if any silence ended"""
+        expired = False
+        while self.ending and self.ending[0][0] <= now:
+            ends_at, silence_id = heapq.heappop(self.ending)
+            silence = self.silences.get(silence_id)
+            if silence is None or silence['ends_at'] != ends_at:
+                continue  # deleted or rescheduled
+            self._deactivate(silence_id)
+            self._expire(silence_id, now)
+            expired = True
+        
+        while self.pending and self.pending[0][0] <= now:
+            starts_at, silence_id = heapq.heappop(self.pending)
+            silence = self.silences.get(silence_id)
+            if silence is None or silence['starts_at'] != starts_at or silence_id in self.active:
+                continue
+            if silence['ends_at'] > now:
+                self._activate(silence_id)
+            else:
+                # Started and ended while nobody looked
+                self._expire(silence_id, now)
+                expired = True
+        
+        if expired:
+            # Forgotten silences and moved recurring windows must survive a restart
+            self.save()
+    
+    def _expire(self, silence_id: str, now: float):
+        """Drop an ended silence, or schedule the next window of a recurring one"""
+        silence = self.silences[silence_id]
+        if not silence.get('repeat'):
+            self._forget(silence_id)
+            return
+        
+        # Move the window past `now` and wait for its next start
+        period = REPEATS[silence['repeat']]
+        skip = int((now - silence['ends_at']) // period) + 1
+        silence['starts_at'] += skip * period
+        silence['ends_at'] += skip * period
+        if silence['starts_at'] <= now:
+            self._activate(silence_id)
+        else:
+            heapq.heappush(self.pending, (silence['starts_at'], silence_id))
+    
+    def save(self):
+        """Write silences to the storage file (atomically)"""
+        if not self.storage_path:
+            return
+        with self.lock:
+            data = list(self.silences.values())
+        tmp_path = f"{self.storage_path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.storage_path)
+        except OSError as e:
+            print(f"✗ Failed to save silences: {e}")
+    
+    def load(self) -> int:
+        """
+        Read silences from the storage file
+        
+        Returns:
+            Number of silences still pending or active
+        """
+        if not self.storage_path or not os.path.exists(self.storage_path):
+            return 0
+        try:
+            with open(self.storage_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"✗ Failed to load silences: {e}")
+            return 0
+        
+        now = self.clock()
+        with self.lock:
+            for silence in data:
+                if self.validate(silence):
+                    print(f"⚠ Skipping invalid silence: {silence.get('id')}")
+                    continue
+                self._add(silence, now)
+            return len(self.silences)
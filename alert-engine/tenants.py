@@ -0,0 +1,302 @@
+"""
+Tenants
+Hosts several tenants' rule sets in one alert engine process
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+
+from config_loader import ConfigLoader
+from prometheus_query import PrometheusQuery
+from alert_tracker import AlertTracker, AlertState
+from email_notifier import EmailNotifier
+from notifier import Notifier
+from rate_limiter import RateLimitedNotifier
+from routing import AlertDispatcher
+from rule_engine import RuleEngine
+from scheduler import AdaptiveScheduler
+from silences import SilenceManager
+from metrics import (rules_evaluated_total, tenant_rules_evaluated_total, tenant_cycle_duration, tenant_firing_alerts,
+                     tenant_notifications_total, tenant_prometheus_up)
+
+# Sections only the main config may set: they configure components the whole
+# process shares (sample buffer, HA lease, silence store, webhook workers, ...)
+MAIN_ONLY_SECTIONS = ('fallback', 'ha', 'recording_rules', 'silences', 'scheduler', 'debug',
+                      'tenants', 'tenant_pool', 'webhook', 'rate_limits')
+
+
+class SharedNotifier(Notifier):
+    """
+    A tenant's handle on a notifier shared by all tenants
+    
+    Stopping it does nothing: the pool stops the shared notifier once,
+    after every tenant's rate limiter has drained into it.
+    """
+    
+    def __init__(self, notifier: Notifier):
+        self.notifier = notifier
+        self.channel = notifier.channel
+    
+    def send(self, alerts: List[Dict[str, Any]], group_labels: Dict[str, str],
+             receiver: Dict[str, Any]) -> bool:
+        return self.notifier.send(alerts, group_labels, receiver)
+
+
+class Tenant:
+    """One tenant: its rules, Prometheus, notifiers and alert state"""
+    
+    def __init__(self, name: str, config_loader: ConfigLoader, rule_engine: RuleEngine,
+                 scheduler: AdaptiveScheduler, notifiers: Dict[str, Notifier],
+                 email_notifier: Optional[EmailNotifier] = None, weight: float = 1):
+        self.name = name
+        self.config_loader = config_loader
+        self.rule_engine = rule_engine
+        self.alert_tracker = rule_engine.alert_tracker
+        self.prometheus_query = rule_engine.prometheus_query
+        self.scheduler = scheduler
+        self.notifiers = notifiers
+        self.email_notifier = email_notifier
+        self.weight = weight
+        self.rules = config_loader.get_rule_table().rules
+        self.cycles = 0
+        self.last_cycle_seconds: Optional[float] = None
+        self.notifications_reported = 0
+    
+    def evaluate(self) -> float:
+        """
+        Run one evaluation cycle of this tenant within its budget share
+        
+        Returns:
+            Cycle duration in seconds
+        """
+        started = time.perf_counter()
+        rules = self.scheduler.plan(self.rules)
+        try:
+            self.rule_engine.evaluate_all_rules(rules)
+        except Exception as e:
+            print(f"✗ [{self.name}] Error in evaluation cycle: {e}")
+        elapsed = time.perf_counter() - started
+        self.scheduler.record(rules, self.rule_engine.rule_durations, elapsed)
+        
+        self.cycles += 1
+        self.last_cycle_seconds = elapsed
+        rules_evaluated_total.inc(len(rules))
+        tenant_rules_evaluated_total.labels(tenant=self.name).inc(len(rules))
+        tenant_cycle_duration.labels(tenant=self.name).observe(elapsed)
+        tenant_prometheus_up.labels(tenant=self.name).set(int(not self.prometheus_query.is_down))
+        tenant_firing_alerts.labels(tenant=self.name).set(self.firing_count())
+        sent = self.rule_engine.dispatcher.notifications_sent
+        tenant_notifications_total.labels(tenant=self.name).inc(sent - self.notifications_reported)
+        self.notifications_reported = sent
+        return elapsed
+    
+    def firing_count(self) -> int:
+        return sum(1 for alert in list(self.alert_tracker.alerts.values())
+                   if alert['state'] == AlertState.FIRING)
+    
+    def stop(self):
+        """Send what the tenant's rate limits still hold"""
+        for notifier in self.notifiers.values():
+            notifier.stop()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'rules': len(self.rules),
+            'weight': self.weight,
+            'prometheus': self.prometheus_query.prometheus_url,
+            'cycles': self.cycles,
+            'last_cycle_seconds': self.last_cycle_seconds,
+            'tracked_alerts': len(self.alert_tracker.alerts),
+            'firing_alerts': self.firing_count(),
+            'scheduler': self.scheduler.get_stats(),
+            **self.rule_engine.get_stats()
+        }
+
+
+class TenantPool:
+    """
+    Runs the rule sets of many tenants on shared resources
+    
+    Every tenant has its own rules file (rules, Prometheus URL, SMTP
+    settings, routing) and its own AlertTracker, so alert state never
+    crosses tenants. They share one HTTP connection pool for Prometheus
+    queries, a pool of `workers` threads that evaluates tenants in
+    parallel, the main evaluation tick and the webhook delivery workers.
+    
+    The main rule set and the tenants share one evaluation budget per
+    cycle (see _share_budget); the main rule set takes part with
+    `main_weight` (0 when it has no rules of its own).
+    
+    Fairness quotas per tenant:
+        weight: Share of the evaluation budget. A tenant over its share
+                defers its lower-severity rules (critical rules always run)
+                instead of delaying other tenants
+        max_rules: Upper bound on the tenant's rule count
+        rate_limit: {per_minute, burst} for the tenant's notifications
+    """
+    
+    def __init__(self, scheduler: AdaptiveScheduler, workers: int = 4, pool_size: int = 20,
+                 silences: Optional[SilenceManager] = None,
+                 webhook_notifier: Optional[Notifier] = None, main_weight: float = 1):
+        # Only a process hosting tenants needs its own connection pool
+        import requests
+        from requests.adapters import HTTPAdapter
+        
+        self.scheduler = scheduler
+        # The whole cycle's budget; the main scheduler keeps only its share
+        self.budget = scheduler.budget
+        self.main_weight = main_weight
+        self.workers = workers
+        self.silences = silences
+        self.webhook_notifier = webhook_notifier
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tenant')
+        self.tenants: Dict[str, Tenant] = {}
+        self.cycles = 0
+    
+    @staticmethod
+    def validate(tenants: Any, pool_config: Optional[Dict[str, Any]] = None) -> bool:
+        """Check the `tenants` and `tenant_pool` sections of the main config (tenant files are checked on load)"""
+        main_weight = (pool_config or {}).get('main_weight', 1)
+        if isinstance(main_weight, bool) or not isinstance(main_weight, (int, float)) or main_weight < 0:
+            print("✗ tenant_pool.main_weight must be a number >= 0")
+            return False
+        if not isinstance(tenants, list):
+            print("✗ tenants must be a list")
+            return False
+        names = set()
+        for tenant in tenants:
+            if not isinstance(tenant, dict) or not tenant.get('name') or not tenant.get('config'):
+                print(f"✗ Tenant needs a 'name' and a 'config' file: {tenant}")
+                return False
+            if tenant['name'] in names:
+                print(f"✗ Duplicate tenant: {tenant['name']}")
+                return False
+            names.add(tenant['name'])
+            weight = tenant.get('weight', 1)
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0:
+                print(f"✗ Tenant '{tenant['name']}': weight must be a positive number")
+                return False
+        return True
+    
+    def load(self, tenant_config: Dict[str, Any], base_dir: str = '.') -> Tenant:
+        """
+        Load a tenant's rules file and build its components
+        
+        Raises:
+            Exception: If the tenant's config is invalid or over its quota
+        """
+        name = tenant_config['name']
+        path = os.path.join(base_dir, tenant_config['config'])
+        config_loader = ConfigLoader(path)
+        config = config_loader.load()
+        if not config_loader.validate():
+            raise Exception(f"Configuration of tenant '{name}' failed validation")
+        shared = [section for section in MAIN_ONLY_SECTIONS if section in config]
+        if shared:
+            raise Exception(f"Tenant '{name}': {', '.join(shared)} can only be set in the main config")
+        max_rules = tenant_config.get('max_rules')
+        rule_count = len(config_loader.get_alert_rules())
+        if max_rules is not None and rule_count > max_rules:
+            raise Exception(f"Tenant '{name}' has {rule_count} rules, over its quota of {max_rules}")
+        
+        prometheus_query = PrometheusQuery(config_loader.get_prometheus_config()['url'],
+                                           session=self.session)
+        alert_tracker = AlertTracker(
+            cooldown_minutes=config_loader.get_alert_settings().get('cooldown_minutes', 15))
+        
+        email_notifier = None
+        email_config = config_loader.get_email_config()
+        if email_config.get('enabled', True):
+            email_notifier = EmailNotifier(
+                smtp_server=email_config['smtp_server'],
+                smtp_port=email_config['smtp_port'],
+                from_email=email_config['from_email'],
+                username=email_config['username'],
+                password=email_config['password'],
+                to_emails=email_config.get('to_emails', []),
+                starttls=email_config.get('smtp_starttls', True)
+            )
+        
+        # Every channel goes through the tenant's notification quota
+        limits = tenant_config.get('rate_limit', {})
+        notifiers = {}
+        channels = [email_notifier]
+        if any(r.get('webhooks') for r in config.get('receivers', [])):
+            if self.webhook_notifier is None:
+                raise Exception(f"Tenant '{name}' uses webhooks but the webhook notifier isn't running")
+            channels.append(SharedNotifier(self.webhook_notifier))
+        for notifier in channels:
+            if notifier is None:
+                continue
+            notifiers[notifier.channel] = RateLimitedNotifier(
+                notifier,
+                per_minute=limits.get('per_minute', 30),
+                burst=limits.get('burst', 10),
+                name=f"{name}/{notifier.channel}"
+            ).start()
+        
+        dispatcher = AlertDispatcher.from_config(config, notifiers, self.silences)
+        rule_engine = RuleEngine(prometheus_query, alert_tracker, email_notifier,
+                                 dispatcher=dispatcher)
+        rule_engine.tenant = name
+        
+        scheduler = AdaptiveScheduler(self.scheduler.interval, align_seconds=0,
+                                      max_defer_cycles=self.scheduler.max_defer_cycles,
+                                      tenant=name)
+        tenant = Tenant(name, config_loader, rule_engine, scheduler, notifiers, email_notifier,
+                        weight=tenant_config.get('weight', 1))
+        self.tenants[name] = tenant
+        self._share_budget()
+        print(f"✓ Tenant '{name}' loaded ({rule_count} rules, Prometheus {prometheus_query.prometheus_url})")
+        return tenant
+    
+    def _share_budget(self):
+        """
+        Split one cycle's budget between the main rule set and the tenants
+        
+        The main rule set runs first and gets its weight's share of the
+        budget. The tenants run after it, within the rest of the budget, on
+        up to `workers` threads at a time, so that phase has `workers` times
+        its length in capacity, split by weight. A tenant runs on one thread,
+        so no tenant's share is longer than the phase. A cycle whose
+        participants stay within their shares therefore fits the budget as a
+        whole (up to how evenly tenants spread over the workers).
+        """
+        tenant_weight = sum(tenant.weight for tenant in self.tenants.values())
+        self.scheduler.budget = self.budget * self.main_weight / (self.main_weight + tenant_weight)
+        phase = self.budget - self.scheduler.budget
+        capacity = phase * min(self.workers, len(self.tenants))
+        for tenant in self.tenants.values():
+            tenant.scheduler.budget = min(phase, capacity * tenant.weight / tenant_weight)
+    
+    def evaluate(self):
+        """Evaluate every tenant once, in parallel on the worker pool"""
+        futures = [self.executor.submit(tenant.evaluate) for tenant in self.tenants.values()]
+        for future in futures:
+            future.result()
+        self.cycles += 1
+    
+    def get(self, name: str) -> Optional[Tenant]:
+        return self.tenants.get(name)
+    
+    def stop(self):
+        """Drain every tenant's notification queues and stop the workers"""
+        self.executor.shutdown(wait=True)
+        for tenant in self.tenants.values():
+            tenant.stop()
+        self.session.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'cycles': self.cycles,
+            'budget': self.budget,
+            'main_budget': self.scheduler.budget,
+            'tenants': {name: tenant.get_stats() for name, tenant in self.tenants.items()}
+        }
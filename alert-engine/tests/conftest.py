@@ -0,0 +1,67 @@
+"""
+Test setup: the alert engine modules are flat files in alert-engine/
+
+Also holds the fakes shared by several test modules: use the `clock`
+fixture, or import the classes (`from conftest import Clock`) where a test
+builds its own instances.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notifier import Notifier  # noqa: E402
+
+
+class Clock:
+    """
+    Settable clock for components that take a `clock` callable
+    
+    `now` is whatever the component expects (epoch seconds, or a datetime
+    for the alert tracker). `sleep` advances it instead of blocking.
+    """
+    
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.slept = []
+    
+    def __call__(self):
+        return self.now
+    
+    def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class RecordingNotifier(Notifier):
+    """Records (receiver name, alert keys in send order) per send; fails while `fail` is set"""
+    channel = 'email'
+    
+    def __init__(self):
+        self.sent = []
+        self.fail = False
+    
+    def send(self, alerts, group_labels, receiver):
+        if self.fail:
+            return False
+        self.sent.append((receiver['name'], [a['key'] for a in alerts]))
+        return True
+
+
+class StaticPrometheus:
+    """Answers every query with one unlabelled sample"""
+    
+    def __init__(self, value: float = 35.0):
+        self.value = value
+        self.is_down = False
+    
+    def query_vector(self, query):
+        return [({}, self.value)]
+
+
+@pytest.fixture
+def clock():
+    return Clock()
@@ -0,0 +1,105 @@
+"""
+Tests for AlertTracker state transitions and versioned snapshots
+"""
+
+import json
+import threading
+from datetime import datetime, timedelta
+
+import app as engine_app
+from alert_tracker import AlertTracker, AlertState
+from conftest import Clock
+
+
+def test_pending_fires_after_duration_and_resolves():
+    clock = Clock(datetime(2024, 1, 1))
+    tracker = AlertTracker(cooldown_minutes=15, clock=clock)
+    assert tracker.update_alert_state('r', True, 60, 1.0) == (False, False, AlertState.PENDING)
+    clock.now += timedelta(seconds=61)
+    assert tracker.update_alert_state('r', True, 60, 2.0) == (True, False, AlertState.FIRING)
+    assert tracker.update_alert_state('r', False, 60, 0.0) == (False, True, AlertState.RESOLVED)
+
+
+def test_changes_since_a_version():
+    tracker = AlertTracker()
+    for i in range(10):
+        tracker.update_alert_state(f"r{i}", True, 60, float(i))
+    version, changes = tracker.get_changes(5, tracker.epoch)
+    assert version == 10
+    assert list(changes) == ['r5', 'r6', 'r7', 'r8', 'r9']
+    
+    # Unchanged alerts keep their version
+    tracker.update_alert_state('r0', True, 60, 0.0)
+    assert tracker.get_changes(10, tracker.epoch) == (10, {})
+
+
+def test_cursor_of_another_run_gets_everything():
+    old = AlertTracker()
+    tracker = AlertTracker()
+    for i in range(10):
+        tracker.update_alert_state(f"r{i}", True, 60, float(i))
+    assert tracker.get_changes(5, old.epoch) == (10, None)
+
+
+def test_cursor_from_before_a_reset_gets_everything():
+    tracker = AlertTracker()
+    tracker.update_alert_state('r0', True, 60, 0.0)
+    tracker.reset()
+    tracker.update_alert_state('r1', True, 60, 0.0)
+    assert tracker.get_changes(1, tracker.epoch)[1] is None
+    assert list(tracker.get_changes(tracker.reset_version, tracker.epoch)[1]) == ['r1']
+
+
+def test_changes_stay_consistent_under_concurrent_reset():
+    tracker = AlertTracker()
+    errors = []
+    done = threading.Event()
+    
+    def update():
+        i = 0
+        while not done.is_set():
+            tracker.update_alert_state(f"r{i % 50}", True, 60, float(i))
+            i += 1
+    
+    def reset():
+        while not done.is_set():
+            tracker.reset()
+    
+    threads = [threading.Thread(target=update), threading.Thread(target=reset)]
+    for thread in threads:
+        thread.start()
+    try:
+        for _ in range(2000):
+            tracker.get_changes(tracker.reset_version, tracker.epoch)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join()
+    assert errors == []
+
+
+def test_alerts_endpoint_deltas_and_etags(monkeypatch):
+    tracker = AlertTracker()
+    for i in range(10):
+        tracker.update_alert_state(f"r{i}", True, 60, float(i))
+    monkeypatch.setattr(engine_app, 'alert_tracker', tracker)
+    client = engine_app.app.test_client()
+    
+    response = client.get('/alerts')
+    body = json.loads(response.data)
+    assert body['full'] and len(body['alerts']) == 10
+    assert body['cursor'] == f"{tracker.epoch}-10"
+    assert client.get('/alerts', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    
+    tracker.update_alert_state('r3', False, 60, 0.0)
+    body = json.loads(client.get(f"/alerts?since={body['cursor']}").data)
+    assert not body['full'] and list(body['alerts']) == ['r3']
+    
+    # A cursor from an earlier run gets the full list, not a partial delta
+    body = json.loads(client.get('/alerts?since=deadbeef-5').data)
+    assert body['full'] and len(body['alerts']) == 10
+    body = json.loads(client.get('/alerts?since=5').data)
+    assert body['full'] and len(body['alerts']) == 10
+    assert client.get('/alerts?since="x').status_code == 200
@@ -0,0 +1,109 @@
+"""
+Tests for the compiled config cache
+"""
+
+import importlib.machinery
+import importlib.util
+import marshal
+import os
+import py_compile
+import shutil
+
+import pytest
+
+import config_loader
+import routing
+from config_loader import ConfigLoader
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       'alert_rules.example.yaml')
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    directory = tmp_path / 'cache'
+    directory.mkdir()
+    monkeypatch.setenv(config_loader.CACHE_DIR_ENV, str(directory))
+    return directory
+
+
+def load(path):
+    loader = ConfigLoader(path)
+    loader.load()
+    assert loader.validate()
+    return loader
+
+
+def test_cache_is_reused_for_the_same_file(tmp_path, cache_dir):
+    path = str(tmp_path / 'alert_rules.yaml')
+    shutil.copy(EXAMPLE, path)
+    
+    first = ConfigLoader(path)
+    first.load()
+    assert not first.validated and first.validate()
+    # Written to the cache directory, not next to the (possibly read-only) config
+    assert [f.name for f in cache_dir.iterdir()] == [os.path.basename(first.cache_path)]
+    assert not os.path.exists(f"{path}.cache")
+    
+    loader = ConfigLoader(path)
+    loader.load()
+    assert loader.validated
+
+
+def test_cache_is_rebuilt_when_validation_code_changes(tmp_path, monkeypatch):
+    path = str(tmp_path / 'alert_rules.yaml')
+    shutil.copy(EXAMPLE, path)
+    load(path)
+    
+    monkeypatch.setattr(config_loader, '_validator_digest', 'changed')
+    loader = ConfigLoader(path)
+    loader.load()
+    assert not loader.validated
+    
+    # Revalidating stores it under the new key
+    assert loader.validate()
+    reloaded = ConfigLoader(path)
+    reloaded.load()
+    assert reloaded.validated
+
+
+def test_cache_from_an_older_layout_is_ignored(tmp_path):
+    path = str(tmp_path / 'alert_rules.yaml')
+    shutil.copy(EXAMPLE, path)
+    loader = ConfigLoader(path)
+    with open(loader.cache_path, 'wb') as f:
+        marshal.dump((2, 'digest', {'alert_rules': []}), f)
+    
+    loader.load()
+    assert not loader.validated
+
+
+def test_configs_with_the_same_name_get_their_own_cache(tmp_path):
+    paths = [tmp_path / tenant / 'alert_rules.yaml' for tenant in ('a', 'b')]
+    assert ConfigLoader(str(paths[0])).cache_path != ConfigLoader(str(paths[1])).cache_path
+
+
+def test_validator_digest_reads_sourceless_modules(tmp_path, monkeypatch):
+    # A .pyc-only deployment of one of the validating modules
+    compiled = tmp_path / 'routing.pyc'
+    py_compile.compile(routing.__file__, cfile=str(compiled), doraise=True)
+    spec = importlib.util.spec_from_file_location(
+        'routing', compiled, loader=importlib.machinery.SourcelessFileLoader('routing', str(compiled)))
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, 'find_spec',
+                        lambda name: spec if name == 'routing' else find_spec(name))
+    monkeypatch.setattr(config_loader, '_validator_digest', None)
+    
+    assert config_loader.validator_digest()
+
+
+def test_cache_is_skipped_when_a_validator_cannot_be_read(tmp_path, monkeypatch):
+    path = str(tmp_path / 'alert_rules.yaml')
+    shutil.copy(EXAMPLE, path)
+    monkeypatch.setattr(config_loader, 'VALIDATOR_MODULES', ('config_loader', 'missing_module'))
+    monkeypatch.setattr(config_loader, '_validator_digest', None)
+    
+    load(path)
+    loader = ConfigLoader(path)
+    loader.load()
+    assert not loader.validated and not os.path.exists(loader.cache_path)
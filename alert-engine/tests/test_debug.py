@@ -0,0 +1,31 @@
+"""
+Tests for the debug endpoints' parameter checks
+"""
+
+import app as engine_app
+
+
+def test_profile_rejects_non_positive_rates(monkeypatch):
+    monkeypatch.setattr(engine_app, 'debug_enabled', lambda: True)
+    client = engine_app.app.test_client()
+    
+    for query in ('hz=0', 'hz=-5', 'seconds=0', 'seconds=-1', 'hz=nan'):
+        response = client.get(f'/debug/profile?{query}')
+        assert response.status_code == 400, query
+    
+    response = client.get('/debug/profile?seconds=0.05&hz=50&format=json')
+    assert response.status_code == 200
+
+
+def test_tracemalloc_limit_is_at_least_one(monkeypatch):
+    monkeypatch.setattr(engine_app, 'debug_enabled', lambda: True)
+    client = engine_app.app.test_client()
+    try:
+        client.get('/debug/tracemalloc')
+        garbage = [bytearray(1024) for _ in range(100)]
+        response = client.get('/debug/tracemalloc?limit=-3')
+        assert response.status_code == 200
+        assert len(response.get_json()['top']) == 1
+        del garbage
+    finally:
+        client.get('/debug/tracemalloc?stop=1')
@@ -0,0 +1,124 @@
+"""
+Tests for the HA lease store and coordinator (failover, fencing, compaction)
+"""
+
+import pytest
+
+from alert_tracker import AlertTracker, AlertState
+from conftest import StaticPrometheus
+from ha import LeaseStore, HACoordinator
+from rule_engine import RuleEngine
+
+RULE = {
+    'name': 'high_temperature',
+    'metric': 'iot_temperature_celsius',
+    'condition': '>',
+    'threshold': 30,
+    'duration': 60,
+    'severity': 'critical',
+    'email_subject': 'Temperature high',
+    'email_body': 'Too hot'
+}
+
+
+@pytest.fixture
+def store(tmp_path, clock):
+    store = LeaseStore(str(tmp_path / 'ha.db'), clock=clock)
+    yield store
+    store.close()
+
+
+def make_replica(store, node_id, value=35.0):
+    engine = RuleEngine(StaticPrometheus(value), AlertTracker())
+    return HACoordinator(store, engine, node_id=node_id, lease_seconds=15)
+
+
+def test_sequence_numbers_survive_compaction(store, clock):
+    token = store.acquire('a', 15)
+    assert store.append('a', token, 'r1', 'firing', {'n': 1}) == 1
+    assert store.append('a', token, 'r2', 'normal', {'n': 2}) == 2
+    
+    clock.now += 100
+    store.acquire('a', 15)
+    assert store.compact(retain_seconds=10) == 1
+    
+    # A standby that read up to seq 2 must still see the next entry
+    assert store.append('a', token, 'r3', 'firing', {'n': 3}) == 3
+    assert store.read_since(2) == [(3, {'n': 3})]
+
+
+def test_sequence_counter_persists_across_reopen(tmp_path, clock):
+    path = str(tmp_path / 'ha.db')
+    store = LeaseStore(path, clock=clock)
+    token = store.acquire('a', 15)
+    store.append('a', token, 'r1', 'normal', {})
+    clock.now += 100
+    store.acquire('a', 15)
+    store.compact(retain_seconds=10)
+    store.close()
+    
+    store = LeaseStore(path, clock=clock)
+    assert store.append('a', store.acquire('a', 15), 'r2', 'firing', {}) == 2
+    store.close()
+
+
+def test_late_renewal_keeps_the_token(store, clock):
+    token = store.acquire('a', 15)
+    clock.now += 20  # renewed after the lease ran out, nobody took over
+    assert store.acquire('a', 15) == token
+
+
+def test_new_holder_gets_a_new_token_and_fences_the_old_one(store, clock):
+    old = store.acquire('a', 15)
+    assert store.acquire('b', 15) is None
+    
+    clock.now += 20
+    new = store.acquire('b', 15)
+    assert new == old + 1
+    assert not store.holds('a', old)
+    assert store.append('a', old, 'r1', 'firing', {}) is None
+    assert store.append('b', new, 'r1', 'firing', {}) is not None
+    # The deposed leader can't take the lease back while it is held
+    assert store.acquire('a', 15) is None
+
+
+def test_leader_renewing_late_stays_leader(store, clock):
+    leader = make_replica(store, 'a')
+    leader.step()
+    token = leader.token
+    clock.now += 20
+    leader.step()
+    assert leader.is_leader and leader.token == token
+
+
+def test_failover_carries_alert_state(store, clock):
+    leader = make_replica(store, 'a')
+    standby = make_replica(store, 'b')
+    leader.step()
+    standby.step()
+    assert leader.is_leader and not standby.is_leader
+    
+    leader.rule_engine.evaluate_all_rules([RULE])
+    assert leader.rule_engine.alert_tracker.get_alert_info(RULE['name'])['state'] == AlertState.PENDING
+    standby.step()
+    info = standby.rule_engine.alert_tracker.get_alert_info(RULE['name'])
+    assert info['state'] == AlertState.PENDING
+    
+    # The leader dies: the standby takes over once the lease runs out
+    clock.now += 20
+    standby.step()
+    assert standby.is_leader
+    assert standby.token > leader.token
+    # ...and the old leader can neither log nor notify any more
+    assert not leader.holds_lease()
+    assert not leader.record({'key': RULE['name'], 'tracker': {'state': 'firing'}})
+    assert not leader.is_leader
+
+
+def test_handover_on_stop(store, clock):
+    leader = make_replica(store, 'a')
+    standby = make_replica(store, 'b')
+    leader.step()
+    leader.stop()
+    standby.step()
+    assert standby.is_leader
@@ -0,0 +1,93 @@
+"""
+Tests for per-stage and per-rule latency accounting
+"""
+
+import threading
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+import metrics
+from alert_tracker import AlertTracker
+from metrics import STAGES, CycleStages, observe_cycle
+from rule_engine import RuleEngine
+
+
+def stage_samples():
+    """(count, sum) of every stage histogram"""
+    return {stage: (REGISTRY.get_sample_value('alert_engine_stage_duration_seconds_count', {'stage': stage}),
+                    REGISTRY.get_sample_value('alert_engine_stage_duration_seconds_sum', {'stage': stage}))
+            for stage in STAGES}
+
+
+def test_stages_are_observed_once_per_cycle():
+    stages = CycleStages()
+    before = stage_samples()
+    stages.add('query', 0.25)
+    stages.add('query', 0.5)
+    stages.add('smtp_send', 2.0)
+    stages.flush()
+    after = stage_samples()
+    
+    # Every stage gets one observation per cycle, zero if it did not run
+    for stage in STAGES:
+        assert after[stage][0] == before[stage][0] + 1
+    assert after['query'][1] - before['query'][1] == pytest.approx(0.75)
+    assert after['smtp_send'][1] - before['smtp_send'][1] == pytest.approx(2.0)
+    assert after['evaluate'][1] == before['evaluate'][1]
+    # The next cycle starts from zero
+    assert stages.totals == dict.fromkeys(STAGES, 0.0)
+
+
+def test_stage_totals_add_up_across_threads():
+    stages = CycleStages()
+    
+    def work():
+        for _ in range(1000):
+            stages.add('evaluate', 0.001)
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stages.totals['evaluate'] == pytest.approx(4.0)
+
+
+def test_cycle_overruns_are_counted(monkeypatch):
+    flushed = []
+    monkeypatch.setattr(metrics.cycle_stages, 'flush', lambda: flushed.append(True))
+    overruns = REGISTRY.get_sample_value('alert_engine_cycle_overruns_total')
+    cycles = REGISTRY.get_sample_value('alert_engine_evaluation_cycle_duration_seconds_count')
+    
+    assert observe_cycle(time.perf_counter() - 2, interval=10) >= 2
+    assert REGISTRY.get_sample_value('alert_engine_cycle_overruns_total') == overruns
+    observe_cycle(time.perf_counter() - 12, interval=10)
+    assert REGISTRY.get_sample_value('alert_engine_cycle_overruns_total') == overruns + 1
+    assert REGISTRY.get_sample_value('alert_engine_evaluation_cycle_duration_seconds_count') == cycles + 2
+    assert flushed == [True, True]
+
+
+class SlowPrometheus:
+    is_down = False
+    
+    def query_vector(self, query):
+        time.sleep(0.01)
+        return [({'device_id': 'a'}, 50.0)]
+
+
+def test_rule_evaluation_fills_stages_and_rule_histogram(monkeypatch):
+    stages = CycleStages()
+    monkeypatch.setattr('rule_engine.cycle_stages', stages)
+    engine = RuleEngine(SlowPrometheus(), AlertTracker())
+    engine.tenant = 'metrics-test'
+    rule = {'name': 'timed', 'expr': 'm', 'condition': '>', 'threshold': 40, 'duration': 0,
+            'severity': 'warning', 'email_subject': 'timed', 'email_body': 'timed'}
+    
+    engine.evaluate_all_rules([rule])
+    
+    assert stages.totals['query'] >= 0.01
+    assert stages.totals['evaluate'] > 0 and stages.totals['tracker_update'] > 0
+    labels = {'tenant': 'metrics-test', 'rule_name': 'timed'}
+    assert REGISTRY.get_sample_value('alert_engine_rule_evaluation_duration_seconds_count', labels) == 1
+    assert REGISTRY.get_sample_value('alert_engine_rule_evaluation_duration_seconds_sum', labels) >= 0.01
@@ -0,0 +1,88 @@
+"""
+Tests for RateLimitedNotifier token buckets, priorities, digests and retries
+"""
+
+from prometheus_client import REGISTRY
+
+from conftest import Clock, RecordingNotifier
+from rate_limiter import RateLimitedNotifier
+
+
+def alert(key, severity):
+    return {'key': key, 'rule': {'name': key, 'severity': severity}, 'status': 'firing'}
+
+
+def make_limiter(**kwargs):
+    clock = Clock()
+    notifier = RecordingNotifier()
+    # No worker thread: tests drain by hand
+    limiter = RateLimitedNotifier(notifier, clock=clock, **kwargs)
+    return limiter, notifier, clock
+
+
+def test_sends_immediately_within_the_burst():
+    limiter, notifier, _ = make_limiter(per_minute=60, burst=2)
+    limiter.send([alert('a', 'info')], {}, {'name': 'r'})
+    limiter.send([alert('b', 'info')], {}, {'name': 'r'})
+    limiter.send([alert('c', 'info')], {}, {'name': 'r'})
+    assert notifier.sent == [('r', ['a']), ('r', ['b'])]
+    assert limiter.queue_depth() == 1
+
+
+def test_new_notification_does_not_overtake_queued_critical():
+    limiter, notifier, clock = make_limiter(per_minute=60, burst=1, receiver_per_minute=60,
+                                            receiver_burst=1)
+    limiter.send([alert('w', 'warning')], {}, {'name': 'oncall'})
+    limiter.send([alert('c', 'critical')], {}, {'name': 'oncall'})  # no global token: queued
+    
+    clock.now += 1  # one global token back
+    limiter.send([alert('i', 'info')], {}, {'name': 'team'})
+    assert notifier.sent == [('oncall', ['w'])]
+    
+    limiter.drain()
+    assert notifier.sent[1] == ('oncall', ['c'])
+
+
+def test_more_urgent_notification_may_go_ahead_of_queued_ones():
+    limiter, notifier, clock = make_limiter(per_minute=60, burst=1)
+    limiter.send([alert('w', 'warning')], {}, {'name': 'oncall'})
+    limiter.send([alert('i', 'info')], {}, {'name': 'oncall'})
+    clock.now += 1
+    limiter.send([alert('c', 'critical')], {}, {'name': 'team'})
+    assert notifier.sent == [('oncall', ['w']), ('team', ['c'])]
+
+
+def test_queue_drains_by_priority_as_one_digest():
+    limiter, notifier, clock = make_limiter(per_minute=60, burst=1)
+    limiter.send([alert('first', 'info')], {}, {'name': 'r'})
+    limiter.send([alert('i', 'info')], {}, {'name': 'r'})
+    limiter.send([alert('c', 'critical')], {}, {'name': 'r'})
+    clock.now += 1
+    limiter.drain()
+    assert notifier.sent[1] == ('r', ['c', 'i'])
+    assert limiter.digests_sent == 1
+
+
+def test_failed_sends_are_retried_then_dropped():
+    limiter, notifier, clock = make_limiter(per_minute=600, burst=10, max_attempts=2, retry_delay=30)
+    notifier.fail = True
+    limiter.send([alert('a', 'critical')], {}, {'name': 'r'})
+    assert limiter.queue_depth() == 1
+    
+    limiter.drain()  # not before the retry delay
+    assert limiter.queue_depth() == 1
+    clock.now += 31
+    limiter.drain()
+    assert limiter.queue_depth() == 0 and limiter.dropped == 1
+    assert REGISTRY.get_sample_value('alert_engine_notification_queue_depth',
+                                     {'channel': 'email'}) == 0
+
+
+def test_full_queue_drops_the_least_urgent():
+    limiter, _, _ = make_limiter(per_minute=60, burst=1, max_queue=2)
+    limiter.send([alert('sent', 'info')], {}, {'name': 'r'})
+    limiter.send([alert('i', 'info')], {}, {'name': 'r'})
+    limiter.send([alert('w', 'warning')], {}, {'name': 'r'})
+    limiter.send([alert('c', 'critical')], {}, {'name': 'r'})
+    queued = sorted(e[3]['alerts'][0]['key'] for e in limiter.queues['r'])
+    assert queued == ['c', 'w'] and limiter.dropped == 1
@@ -0,0 +1,81 @@
+"""
+Tests for recording rule evaluation and the /metrics collector
+"""
+
+import pytest
+from prometheus_client import CollectorRegistry, generate_latest
+
+from recording_rules import RecordingRules
+
+RULES = [
+    {'record': 'site:temperature:avg', 'expr': 'avg by (site) (iot_temperature_celsius)',
+     'labels': {'source': 'alert_engine'}},
+    {'record': 'fleet:battery:min', 'expr': 'min(iot_battery_percent)'},
+]
+
+
+def answers(vectors):
+    queries = []
+    
+    def query(expr):
+        queries.append(expr)
+        return vectors.get(expr)
+    return query, queries
+
+
+def test_records_are_cached_with_extra_labels():
+    recording = RecordingRules(RULES)
+    query, queries = answers({
+        RULES[0]['expr']: [({'__name__': 'x', 'site': 'a'}, 21.5), ({'site': 'b'}, 30.0)],
+        RULES[1]['expr']: [({}, 12.0)],
+    })
+    recording.evaluate(query)
+    
+    assert queries == [RULES[0]['expr'], RULES[1]['expr']]
+    assert recording.get('site:temperature:avg') == [
+        ({'site': 'a', 'source': 'alert_engine'}, 21.5),
+        ({'site': 'b', 'source': 'alert_engine'}, 30.0)]
+    assert recording.get('fleet:battery:min') == [({}, 12.0)]
+    assert recording.is_record('fleet:battery:min') and not recording.is_record('iot_battery_percent')
+    assert recording.evaluations == 1
+
+
+def test_failed_query_drops_the_stale_record():
+    recording = RecordingRules(RULES)
+    recording.evaluate(answers({RULES[1]['expr']: [({}, 12.0)]})[0])
+    assert recording.get('fleet:battery:min') == [({}, 12.0)]
+    
+    recording.evaluate(answers({})[0])
+    assert recording.get('fleet:battery:min') is None
+
+
+def test_collector_exposes_records_as_gauges():
+    recording = RecordingRules(RULES)
+    recording.evaluate(answers({
+        RULES[0]['expr']: [({'site': 'a'}, 21.5), ({'site': 'b', 'zone': 'north'}, 30.0)],
+        RULES[1]['expr']: [],
+    })[0])
+    
+    families = list(recording.collect())
+    # Records without samples are left out
+    assert [f.name for f in families] == ['site:temperature:avg']
+    assert families[0].type == 'gauge'
+    assert [(s.labels, s.value) for s in families[0].samples] == [
+        ({'site': 'a', 'source': 'alert_engine', 'zone': ''}, 21.5),
+        ({'site': 'b', 'source': 'alert_engine', 'zone': 'north'}, 30.0)]
+    
+    registry = CollectorRegistry()
+    registry.register(recording)
+    exposition = generate_latest(registry).decode()
+    assert '# HELP site:temperature:avg Recording rule: avg by (site) (iot_temperature_celsius)' in exposition
+    assert 'site:temperature:avg{site="b",source="alert_engine",zone="north"} 30.0' in exposition
+
+
+@pytest.mark.parametrize('rules, error', [
+    ([{'record': 'x'}], "needs 'record' and 'expr'"),
+    ([{'record': 'bad name', 'expr': 'up'}], 'Invalid recording rule name'),
+    ([{'record': 'x', 'expr': 'up'}, {'record': 'x', 'expr': 'down'}], 'Duplicate recording rule'),
+])
+def test_invalid_recording_rules_are_rejected(capsys, rules, error):
+    assert not RecordingRules.validate(rules)
+    assert error in capsys.readouterr().out
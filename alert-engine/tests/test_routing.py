@@ -0,0 +1,125 @@
+"""
+Tests for routing, grouping and inhibition in the alert dispatcher
+"""
+
+from alert_tracker import AlertTracker
+from conftest import Clock, RecordingNotifier
+from routing import AlertDispatcher, Route
+from rule_engine import RuleEngine
+
+
+class SitePrometheus:
+    """Answers every query with one series for site 'a'"""
+    is_down = False
+    
+    def query_vector(self, query):
+        return [({'site': 'a'}, 50.0)]
+
+
+def rule(name, severity):
+    return {'name': name, 'expr': f'{name}_metric', 'condition': '>', 'threshold': 40,
+            'duration': 0, 'severity': severity, 'email_subject': name, 'email_body': name}
+
+
+def alert(key, labels, status='firing'):
+    return {'key': key, 'rule': {'name': key}, 'labels': labels, 'value': 1.0,
+            'status': status, 'tenant': None}
+
+
+def make_dispatcher(config, clock=None):
+    notifier = RecordingNotifier()
+    receivers = {r['name']: r for r in config.get('receivers', [])} or None
+    dispatcher = AlertDispatcher(Route(config.get('routing', {})), {'email': notifier},
+                                 receivers, config.get('inhibit_rules', []),
+                                 clock=clock or Clock())
+    return dispatcher, notifier
+
+
+INHIBIT = {'inhibit_rules': [{
+    'source_matchers': [{'name': 'severity', 'value': 'critical'}],
+    'target_matchers': [{'name': 'severity', 'value': 'warning'}],
+    'equal': ['site']
+}]}
+
+
+def test_routes_descend_into_first_matching_child():
+    dispatcher, notifier = make_dispatcher({
+        'receivers': [{'name': 'ops'}, {'name': 'oncall'}, {'name': 'audit'}],
+        'routing': {'receiver': 'ops', 'routes': [
+            {'matchers': [{'name': 'severity', 'value': 'critical'}], 'receiver': 'audit',
+             'continue': True},
+            {'matchers': [{'name': 'severity', 'value': 'crit.*', 'op': '=~'}], 'receiver': 'oncall'},
+            {'matchers': [{'name': 'site', 'value': 'a'}], 'receiver': 'audit'},
+        ]}
+    })
+    dispatcher.dispatch(alert('disk', {'severity': 'critical', 'site': 'a'}))
+    dispatcher.dispatch(alert('fan', {'severity': 'warning', 'site': 'b'}))
+    
+    assert notifier.sent == [('audit', ['disk']), ('oncall', ['disk']), ('ops', ['fan'])]
+
+
+def test_groups_wait_then_send_together(clock):
+    dispatcher, notifier = make_dispatcher(
+        {'routing': {'group_by': ['site'], 'group_wait': 30, 'group_interval': 300}}, clock)
+    dispatcher.dispatch(alert('a1', {'site': 'a'}))
+    dispatcher.dispatch(alert('a2', {'site': 'a'}))
+    dispatcher.dispatch(alert('b1', {'site': 'b'}))
+    dispatcher.flush()
+    assert notifier.sent == []
+    
+    clock.now += 30
+    dispatcher.flush()
+    assert sorted(notifier.sent) == [('default', ['a1', 'a2']), ('default', ['b1'])]
+    
+    # Updates wait for the group interval
+    dispatcher.dispatch(alert('a1', {'site': 'a'}, 'resolved'))
+    clock.now += 60
+    dispatcher.flush()
+    assert len(notifier.sent) == 2
+    clock.now += 240
+    dispatcher.flush()
+    assert notifier.sent[-1] == ('default', ['a1'])
+
+
+def test_inhibited_alert_gets_no_resolution():
+    dispatcher, notifier = make_dispatcher(INHIBIT)
+    critical = {'severity': 'critical', 'site': 'a'}
+    warning = {'severity': 'warning', 'site': 'a'}
+    
+    assert dispatcher.dispatch(alert('overheat', critical))
+    assert not dispatcher.dispatch(alert('hot', warning))
+    assert not dispatcher.dispatch(alert('hot', warning, 'resolved'))
+    # Another site is not inhibited
+    assert dispatcher.dispatch(alert('hot_b', {'severity': 'warning', 'site': 'b'}))
+    assert [keys for _, keys in notifier.sent] == [['overheat'], ['hot_b']]
+
+
+def test_inhibition_does_not_depend_on_rule_order():
+    dispatcher, notifier = make_dispatcher(INHIBIT)
+    engine = RuleEngine(SitePrometheus(), AlertTracker(), dispatcher=dispatcher)
+    # The warning rule is evaluated before the critical one in the same cycle
+    rules = [rule('hot', 'warning'), rule('overheat', 'critical')]
+    
+    engine.evaluate_all_rules(rules)
+    engine.evaluate_all_rules(rules)
+    
+    assert [keys for _, keys in notifier.sent] == [['overheat{site="a"}']]
+    assert 'hot{site="a"}' in dispatcher.muted
+    assert engine.alerts_queued == 1
+    assert engine.get_stats()['alerts_notified'] == 1
+
+
+def test_alerts_count_as_notified_only_once_sent():
+    dispatcher, notifier = make_dispatcher({'routing': {'group_by': ['site'], 'group_wait': 30}})
+    engine = RuleEngine(SitePrometheus(), AlertTracker(), dispatcher=dispatcher)
+    rules = [rule('hot', 'warning')]
+    engine.evaluate_all_rules(rules)
+    engine.evaluate_all_rules(rules)
+    # Queued in its group until group_wait has passed
+    assert engine.alerts_queued == 1
+    assert dispatcher.alerts_notified == 0
+    
+    notifier.fail = True
+    dispatcher.clock.now += 30
+    dispatcher.flush()
+    assert dispatcher.alerts_notified == 0 and dispatcher.notifications_sent == 0
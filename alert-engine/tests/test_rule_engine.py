@@ -0,0 +1,91 @@
+"""
+Tests for PromQL expression rules and per-cycle query sharing in the rule engine
+"""
+
+from alert_tracker import AlertTracker, AlertState
+from recording_rules import RecordingRules
+from rule_engine import RuleEngine
+
+
+class CountingPrometheus:
+    """Serves canned vectors per query and counts the queries it answers"""
+    is_down = False
+    
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.queries = []
+    
+    def query_vector(self, query):
+        self.queries.append(query)
+        return self.vectors.get(query, [])
+
+
+def rule(name, threshold=40, **fields):
+    return {'name': name, 'condition': '>', 'threshold': threshold, 'duration': 0,
+            'severity': 'warning', 'email_subject': name, 'email_body': name, **fields}
+
+
+SITE_AVG = 'avg by (site) (avg_over_time(iot_temperature_celsius[5m]))'
+
+
+def state(engine, key):
+    info = engine.alert_tracker.get_alert_info(key)
+    return info['state'] if info else None
+
+
+def test_expr_rule_tracks_every_series():
+    prometheus = CountingPrometheus({SITE_AVG: [({'site': 'a'}, 45.0), ({'site': 'b'}, 30.0)]})
+    engine = RuleEngine(prometheus, AlertTracker())
+    rules = [rule('hot_site', expr=SITE_AVG)]
+    
+    engine.evaluate_all_rules(rules)
+    engine.evaluate_all_rules(rules)
+    assert state(engine, 'hot_site{site="a"}') == AlertState.FIRING
+    assert state(engine, 'hot_site{site="b"}') == AlertState.NORMAL
+    
+    # A series missing from the result no longer meets the condition
+    prometheus.vectors[SITE_AVG] = [({'site': 'b'}, 30.0)]
+    engine.evaluate_all_rules(rules)
+    assert state(engine, 'hot_site{site="a"}') == AlertState.RESOLVED
+
+
+def test_bare_metric_rule_uses_the_first_series():
+    prometheus = CountingPrometheus({'iot_battery_percent': [({'__name__': 'iot_battery_percent'}, 50.0),
+                                                             ({'__name__': 'iot_battery_percent'}, 10.0)]})
+    engine = RuleEngine(prometheus, AlertTracker())
+    rules = [rule('battery', metric='iot_battery_percent')]
+    
+    engine.evaluate_all_rules(rules)
+    engine.evaluate_all_rules(rules)
+    assert state(engine, 'battery') == AlertState.FIRING
+
+
+def test_identical_queries_run_once_per_cycle():
+    prometheus = CountingPrometheus({SITE_AVG: [({'site': 'a'}, 45.0)],
+                                     'iot_battery_percent': [({}, 50.0)]})
+    engine = RuleEngine(prometheus, AlertTracker())
+    rules = [rule('warm_site', 30, expr=SITE_AVG), rule('hot_site', 40, expr=SITE_AVG),
+             rule('battery', metric='iot_battery_percent'),
+             rule('battery_expr', expr='iot_battery_percent')]
+    
+    engine.evaluate_all_rules(rules)
+    assert sorted(prometheus.queries) == sorted([SITE_AVG, 'iot_battery_percent'])
+    assert engine.queries_executed == 2 and engine.rules_evaluated == 4
+    
+    # The cache only lives for one cycle
+    engine.evaluate_all_rules(rules)
+    assert engine.queries_executed == 4
+
+
+def test_rules_on_recording_rules_do_not_query_prometheus():
+    prometheus = CountingPrometheus({SITE_AVG: [({'site': 'a'}, 45.0)]})
+    recording = RecordingRules([{'record': 'site:temperature:avg5m', 'expr': SITE_AVG}])
+    engine = RuleEngine(prometheus, AlertTracker(), recording_rules=recording)
+    rules = [rule('hot_site', expr='site:temperature:avg5m'),
+             rule('hot_site_direct', expr=SITE_AVG)]
+    
+    engine.evaluate_all_rules(rules)
+    engine.evaluate_all_rules(rules)
+    # One query per cycle, shared by the recording rule and the direct rule
+    assert prometheus.queries == [SITE_AVG, SITE_AVG]
+    assert state(engine, 'hot_site{site="a"}') == AlertState.FIRING
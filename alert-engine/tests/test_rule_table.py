@@ -0,0 +1,85 @@
+"""
+Tests for alert rule schema validation and the rule table indexes
+"""
+
+import pytest
+
+from rule_table import RuleTable, expr_metrics
+
+
+def rule(name, severity='warning', **fields):
+    base = {'name': name, 'metric': f'{name}_metric', 'condition': '>', 'threshold': 40,
+            'duration': 0, 'severity': severity, 'email_subject': name, 'email_body': name}
+    base.update(fields)
+    return base
+
+
+def without(rule, field):
+    return {k: v for k, v in rule.items() if k != field}
+
+
+@pytest.mark.parametrize('expr, metrics', [
+    ('iot_battery_percent', ['iot_battery_percent']),
+    ('avg by (site) (iot_temperature_celsius{site=~"a|b"})', ['iot_temperature_celsius']),
+    ('rate(iot_errors_total[5m]) / rate(iot_requests_total[5m]) > bool 0.1',
+     ['iot_errors_total', 'iot_requests_total']),
+    ('iot_a offset 5m and on (device_id) iot_b unless iot_a', ['iot_a', 'iot_b']),
+    ('sum without (instance) (rate(job:requests:rate5m[1m]))', ['job:requests:rate5m']),
+])
+def test_expr_metrics(expr, metrics):
+    assert expr_metrics(expr) == metrics
+
+
+def test_valid_rules_pass(capsys):
+    rules = [rule('hot', runbook='https://example.com'), without(rule('load', expr='avg(load)'), 'metric')]
+    
+    assert RuleTable.validate(rules)
+    # Unknown fields are only a warning
+    assert 'ignoring unknown fields runbook' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('rules, error', [
+    ({'name': 'hot'}, 'must be a list'),
+    (['hot'], 'must be a mapping'),
+    ([without(rule('hot'), 'threshold')], "missing 'threshold'"),
+    ([rule('hot', threshold='40')], "'threshold' has invalid value"),
+    ([rule('hot', threshold=True)], "'threshold' has invalid value"),
+    ([without(rule('hot'), 'metric')], "needs a 'metric' or an 'expr'"),
+    ([rule('hot', condition='=>')], "invalid condition '=>'"),
+    ([rule('hot', duration=-5)], 'duration must not be negative'),
+    ([rule('hot'), rule('hot')], 'Duplicate alert rule name: hot'),
+])
+def test_invalid_rules_are_rejected(capsys, rules, error):
+    assert not RuleTable.validate(rules)
+    assert error in capsys.readouterr().out
+
+
+@pytest.fixture
+def table():
+    return RuleTable([
+        rule('hot', 'critical', metric='iot_temperature_celsius'),
+        rule('low_battery', 'warning', metric='iot_battery_percent'),
+        rule('hot_site', 'warning', expr='avg by (site) (iot_temperature_celsius) > 35'),
+        rule('drain', 'critical', expr='deriv(iot_battery_percent[10m]) < -1'),
+    ])
+
+
+def test_filter_combines_indexes_in_configured_order(table):
+    names = lambda rules: [r.name for r in rules]
+    
+    assert names(table.filter()) == ['hot', 'low_battery', 'hot_site', 'drain']
+    assert names(table.filter(severity='critical')) == ['hot', 'drain']
+    assert names(table.filter(metric='iot_temperature_celsius')) == ['hot', 'hot_site']
+    assert names(table.filter(metric='iot_battery_percent', severity='critical')) == ['drain']
+    assert names(table.filter(name='hot', severity='critical')) == ['hot']
+    assert table.filter(name='hot', severity='warning') == []
+    assert table.filter(name='missing') == []
+    assert table.filter(metric='missing', severity='critical') == []
+
+
+def test_rules_keep_working_as_dicts(table):
+    hot_site = table.get('hot_site')
+    assert hot_site['threshold'] == hot_site.threshold == 40
+    assert hot_site.query == 'avg by (site) (iot_temperature_celsius) > 35'
+    assert table.get('hot').query == 'iot_temperature_celsius'
+    assert len(table) == 4 and table.get('missing') is None
@@ -0,0 +1,167 @@
+"""
+Tests for the sample buffer codec, its queries and the outage fallback
+"""
+
+import math
+import time
+
+import requests
+
+from alert_tracker import AlertTracker, AlertState
+from prometheus_query import PrometheusQuery
+from rule_engine import RuleEngine
+from sample_buffer import Chunk, SampleBuffer
+
+RULE = {
+    'name': 'hot_device',
+    'expr': 'iot_temperature_celsius',
+    'condition': '>',
+    'threshold': 40,
+    'duration': 0,
+    'severity': 'warning',
+    'email_subject': 'Device hot',
+    'email_body': 'Too hot'
+}
+
+
+def roundtrip(samples):
+    chunk = Chunk()
+    for ts, value in samples:
+        chunk.append(ts, value)
+    return Chunk.decode(*chunk.seal())
+
+
+def test_codec_roundtrip_regular_scrapes():
+    samples = [(1_700_000_000_000 + i * 5000, 20.0 + (i % 7) * 0.25) for i in range(120)]
+    assert roundtrip(samples) == samples
+
+
+def test_codec_roundtrip_irregular_timestamps_and_values():
+    # Every delta-of-delta bucket, including the 64 bit escape
+    offsets = [0, 5000, 10000, 10050, 10300, 12000, 14100, 30000, 10_000_000, 10_000_001]
+    values = [0.0, -0.0, 1.5, 1e300, -3.25, math.inf, 42.0, 42.0, 7e-310, 1.0]
+    samples = [(1_000 + offset, value) for offset, value in zip(offsets, values)]
+    assert roundtrip(samples) == samples
+
+
+def test_codec_roundtrip_nan():
+    decoded = roundtrip([(0, 1.0), (5000, math.nan), (10000, 2.0)])
+    assert decoded[0] == (0, 1.0)
+    assert math.isnan(decoded[1][1])
+    assert decoded[2] == (10000, 2.0)
+
+
+def test_samples_span_sealed_chunks_and_head():
+    buffer = SampleBuffer(retention_seconds=3600, scrape_interval=5, chunk_size=4)
+    for i in range(10):
+        buffer.append('m', {'device_id': 'a'}, 1000 + i * 5, float(i))
+    
+    series = buffer.series['m'][(('device_id', 'a'),)]
+    assert len(series.chunks) == 2 and series.head.count == 2
+    assert series.samples() == [(1000 + i * 5, float(i)) for i in range(10)]
+
+
+def test_query_vector_applies_matchers_and_staleness():
+    buffer = SampleBuffer(staleness_seconds=300)
+    buffer.append('m', {'site': 'a'}, 1000, 1.0)
+    buffer.append('m', {'site': 'b'}, 1000, 2.0)
+    buffer.append('m', {'site': 'c'}, 500, 3.0)
+    
+    result = buffer.query_vector('m{site!="b"}', now=1010)
+    assert result == [({'__name__': 'm', 'site': 'a'}, 1.0)]
+    assert buffer.query_vector('avg(m)', now=1010) is None
+
+
+def test_query_range_steps_like_prometheus():
+    buffer = SampleBuffer(staleness_seconds=30)
+    for ts, value in [(1000, 1.0), (1010, 2.0), (1020, 3.0), (1100, 4.0)]:
+        buffer.append('m', {'site': 'a'}, ts, value)
+    buffer.append('m', {'site': 'b'}, 1000, 9.0)
+    
+    result = buffer.query_range('m{site="a"}', 995, 1100, 15)
+    assert result == [({'__name__': 'm', 'site': 'a'},
+                       [[1010, '2.0'], [1025, '3.0'], [1040, '3.0'], [1100, '4.0']])]
+    assert buffer.query_range('rate(m[5m])', 995, 1100, 15) is None
+
+
+class Response:
+    def __init__(self, result):
+        self.result = result
+    
+    def raise_for_status(self):
+        pass
+    
+    def json(self):
+        return {'status': 'success', 'data': {'resultType': 'vector', 'result': [
+            {'metric': labels, 'value': [0, str(value)]} for labels, value in self.result]}}
+
+
+class FlakySession:
+    """Fails the next `failures` requests, then serves `result`"""
+    
+    def __init__(self, result):
+        self.result = result
+        self.failures = 0
+    
+    def get(self, url, params=None, timeout=None):
+        if self.failures:
+            self.failures -= 1
+            raise requests.exceptions.ConnectionError('connection refused')
+        return Response(self.result)
+
+
+def test_range_query_served_from_buffer_during_outage():
+    buffer = SampleBuffer()
+    buffer.append('m', {'site': 'a'}, 1000, 1.0)
+    session = FlakySession([])
+    session.failures = 1
+    prometheus = PrometheusQuery('http://prometheus:9090', fallback=buffer, session=session)
+    
+    assert prometheus.query_range('m', 1000, 1000, 5) == [({'__name__': 'm', 'site': 'a'}, [[1000, '1.0']])]
+    assert prometheus.is_down and prometheus.fallback_queries == 1
+
+
+def make_engine(buffer, session):
+    prometheus = PrometheusQuery('http://prometheus:9090', fallback=buffer,
+                                 probe_interval=0, session=session)
+    return RuleEngine(prometheus, AlertTracker()), prometheus
+
+
+def test_missing_series_are_not_resolved_while_prometheus_is_down():
+    labels = {'__name__': 'iot_temperature_celsius', 'device_id': 'b'}
+    session = FlakySession([(labels, 45.0)])
+    engine, prometheus = make_engine(SampleBuffer(), session)
+    key = RuleEngine.alert_key(RULE['name'], labels)
+    
+    engine.evaluate_all_rules([RULE])
+    engine.evaluate_all_rules([RULE])
+    assert engine.alert_tracker.get_alert_info(key)['state'] == AlertState.FIRING
+    
+    # Device b is not directly scraped, so the buffer does not have it
+    session.failures = 1
+    engine.evaluate_all_rules([RULE])
+    assert prometheus.is_down
+    assert engine.alert_tracker.get_alert_info(key)['state'] == AlertState.FIRING
+    assert engine.outage_rules == {RULE['name']}
+
+
+def test_alerts_fired_from_buffer_are_reconciled_on_recovery():
+    labels = {'device_id': 'a'}
+    key = RuleEngine.alert_key(RULE['name'], labels)
+    buffer = SampleBuffer()
+    session = FlakySession([({'__name__': 'iot_temperature_celsius', **labels}, 30.0)])
+    engine, prometheus = make_engine(buffer, session)
+    other = dict(RULE, name='hot_battery', expr='iot_battery_celsius')
+    
+    buffer.append('iot_temperature_celsius', labels, time.time(), 45.0)
+    session.failures = 1
+    engine.evaluate_all_rules([RULE])
+    assert engine.alert_tracker.get_alert_info(key)['state'] == AlertState.PENDING
+    
+    # The buffer fires the alert, then Prometheus answers the next rule's
+    # query and disagrees: the alert is re-checked before the cycle ends
+    session.failures = 1
+    engine.evaluate_all_rules([RULE, other])
+    assert not prometheus.is_down
+    assert engine.alert_tracker.get_alert_info(key)['state'] == AlertState.RESOLVED
+    assert engine.outage_rules == set() and not engine.reconcile_pending
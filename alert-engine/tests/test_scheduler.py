@@ -0,0 +1,74 @@
+"""
+Tests for cycle pacing and priority-ordered deferral in the adaptive scheduler
+"""
+
+from conftest import Clock
+from scheduler import AdaptiveScheduler
+
+
+def rule(name, severity):
+    return {'name': name, 'severity': severity}
+
+
+def make_scheduler(interval=10, clock=None, **kwargs):
+    clock = clock or Clock()
+    return AdaptiveScheduler(interval, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_interval_is_rounded_up_to_the_scrape_grid():
+    assert make_scheduler(12, align_seconds=5).interval == 15
+    assert make_scheduler(3, align_seconds=5).interval == 5
+    assert make_scheduler(12, align_seconds=0).interval == 12
+
+
+def test_overrunning_cycles_stretch_to_the_next_tick():
+    clock = Clock(1002.0)
+    scheduler = make_scheduler(15, clock, align_seconds=5)
+    
+    # The first cycle starts on the grid
+    assert scheduler.wait() == 3.0 and clock.now == 1005.0
+    # A normal cycle waits out the rest of its interval
+    clock.now += 4
+    assert scheduler.wait() == 11.0 and clock.now == 1020.0
+    
+    # A 40s cycle misses two ticks; the next one starts on the grid, not late
+    clock.now += 40
+    assert scheduler.wait() == 5.0 and clock.now == 1065.0
+    assert scheduler.skipped_ticks == 2
+    assert (clock.now - 1005.0) % 15 == 0
+
+
+def test_overload_defers_by_severity_then_forces_starved_rules():
+    scheduler = make_scheduler(10, align_seconds=0, budget_ratio=0.8, max_defer_cycles=2)
+    rules = [rule('info', 'info'), rule('warn_a', 'warning'), rule('crit', 'critical'),
+             rule('warn_b', 'warning')]
+    costs = {'info': 2.0, 'warn_a': 2.0, 'crit': 5.0, 'warn_b': 2.0}
+    scheduler.record(rules, costs, sum(costs.values()))
+    
+    def planned():
+        return [r['name'] for r in scheduler.plan(rules)]
+    
+    # Budget is 8s of the 11s predicted: critical always runs, then warnings
+    # (in configured order), and the rest waits
+    assert planned() == ['warn_a', 'crit']
+    assert scheduler.overloaded
+    assert scheduler.deferred == {'info': 1, 'warn_b': 1}
+    
+    # Among equal severities, the rule deferred longest goes first
+    assert planned() == ['crit', 'warn_b']
+    assert scheduler.deferred == {'info': 2, 'warn_a': 1}
+    
+    # After max_defer_cycles, a rule runs regardless of its severity
+    assert planned() == ['info', 'crit']
+    assert scheduler.rules_deferred == 6
+
+
+def test_deferrals_are_cleared_once_within_budget():
+    scheduler = make_scheduler(10, align_seconds=0, budget_ratio=0.8)
+    rules = [rule('crit', 'critical'), rule('info', 'info')]
+    scheduler.record(rules, {'crit': 6.0, 'info': 3.0}, 9.0)
+    assert [r['name'] for r in scheduler.plan(rules)] == ['crit']
+    
+    scheduler.record(rules, {'crit': 1.0}, 1.0)
+    assert scheduler.plan(rules) == rules
+    assert not scheduler.overloaded and scheduler.deferred == {}
@@ -0,0 +1,113 @@
+"""
+Tests for silence matching, scheduling, recurring windows and persistence
+"""
+
+import json
+
+import pytest
+
+from silences import SilenceManager
+
+
+def matcher(name, value, op='='):
+    return {'name': name, 'value': value, 'op': op}
+
+
+@pytest.fixture
+def manager(clock):
+    return SilenceManager(clock=clock)
+
+
+def test_matchers_with_every_operator(manager):
+    by_site = manager.create({'matchers': [matcher('site', 'a'), matcher('severity', 'critical', '!=')],
+                              'duration_minutes': 60})['id']
+    by_regex = manager.create({'matchers': [matcher('alertname', 'disk_.*', '=~'),
+                                            matcher('device_id', 'gw-.*', '!~')],
+                               'duration_minutes': 60})['id']
+    
+    assert manager.silenced_by({'site': 'a', 'severity': 'warning', 'alertname': 'x'}) == by_site
+    assert manager.silenced_by({'site': 'a', 'severity': 'critical', 'alertname': 'x'}) is None
+    assert manager.silenced_by({'alertname': 'disk_full', 'device_id': 'sensor-1'}) == by_regex
+    assert manager.silenced_by({'alertname': 'disk_full', 'device_id': 'gw-1'}) is None
+    # Regex matchers match the whole value
+    assert manager.silenced_by({'alertname': 'big_disk_full'}) is None
+
+
+def test_silence_applies_only_inside_its_window(manager, clock):
+    silence = manager.create({'matchers': [matcher('site', 'a')],
+                              'starts_at': clock.now + 60, 'ends_at': clock.now + 120})
+    labels = {'site': 'a'}
+    
+    assert manager.silenced_by(labels) is None
+    clock.now += 60
+    assert manager.silenced_by(labels) == silence['id']
+    assert manager.active_count() == 1
+    clock.now += 60
+    assert manager.silenced_by(labels) is None
+    # A one-off silence is forgotten once it ends
+    assert manager.list() == []
+
+
+def test_recurring_window_moves_forward(manager, clock):
+    silence = manager.create({'matchers': [matcher('site', 'a')], 'starts_at': clock.now,
+                              'duration_minutes': 60, 'repeat': 'daily'})
+    labels = {'site': 'a'}
+    assert manager.silenced_by(labels) == silence['id']
+    
+    clock.now += 2 * 3600
+    assert manager.silenced_by(labels) is None
+    # Several days later, inside that day's window
+    clock.now += 3 * 86400 - 2 * 3600 + 1800
+    assert manager.silenced_by(labels) == silence['id']
+    assert manager.list()[0]['starts_at'] == silence['starts_at']
+
+
+def test_delete_stops_matching(manager):
+    silence = manager.create({'matchers': [matcher('site', 'a')], 'duration_minutes': 10})
+    assert manager.delete(silence['id'])
+    assert not manager.delete(silence['id'])
+    assert manager.silenced_by({'site': 'a'}) is None
+
+
+@pytest.mark.parametrize('data, error', [
+    ({'matchers': [], 'duration_minutes': 10}, 'at least one matcher'),
+    ({'matchers': [matcher('site', '.*', '=~')], 'duration_minutes': 10}, 'empty labels'),
+    ({'matchers': [matcher('site', '(', '=~')], 'duration_minutes': 10}, 'regex'),
+    ({'matchers': [matcher('site', 'a')], 'duration_minutes': -1}, 'end after'),
+    ({'matchers': [matcher('site', 'a')], 'duration_minutes': 1500, 'repeat': 'daily'}, 'shorter'),
+    ({'matchers': [matcher('site', 'a')]}, "'ends_at'"),
+])
+def test_invalid_silences_are_rejected(manager, data, error):
+    with pytest.raises(ValueError, match=error):
+        manager.create(data)
+
+
+def test_silences_survive_a_restart(tmp_path, clock):
+    path = str(tmp_path / 'silences.json')
+    first = SilenceManager(storage_path=path, clock=clock)
+    kept = first.create({'matchers': [matcher('site', 'a')], 'duration_minutes': 60})
+    first.create({'matchers': [matcher('site', 'b')], 'duration_minutes': 1})
+    
+    clock.now += 120
+    second = SilenceManager(storage_path=path, clock=clock)
+    # The one that ended while the engine was down is dropped on load
+    assert second.load() == 1
+    assert second.silenced_by({'site': 'a'}) == kept['id']
+    assert second.silenced_by({'site': 'b'}) is None
+    assert [s['id'] for s in second.list()] == [kept['id']]
+
+
+def test_ended_silences_are_saved(tmp_path, clock):
+    path = str(tmp_path / 'silences.json')
+    manager = SilenceManager(storage_path=path, clock=clock)
+    manager.create({'matchers': [matcher('site', 'a')], 'duration_minutes': 1})
+    start = clock.now
+    recurring = manager.create({'matchers': [matcher('site', 'b')], 'starts_at': start,
+                                'duration_minutes': 60, 'repeat': 'daily'})
+    
+    clock.now += 86400 + 600
+    assert manager.active_count() == 1
+    with open(path) as f:
+        saved = json.load(f)
+    assert [s['id'] for s in saved] == [recurring['id']]
+    assert saved[0]['starts_at'] == start + 86400
@@ -0,0 +1,92 @@
+"""
+Tests for the tenant pool's shared budget and per-tenant metrics
+"""
+
+import threading
+from types import SimpleNamespace
+
+from prometheus_client import REGISTRY
+
+from alert_tracker import AlertTracker
+from conftest import StaticPrometheus
+from metrics import CycleStages
+from rule_engine import RuleEngine
+from scheduler import AdaptiveScheduler
+from tenants import TenantPool
+
+RULE = {
+    'name': 'high_temperature',
+    'metric': 'iot_temperature_celsius',
+    'condition': '>',
+    'threshold': 30,
+    'duration': 0,
+    'severity': 'critical',
+    'email_subject': 'Temperature high',
+    'email_body': 'Too hot'
+}
+
+
+def make_pool(main_weight, weights, workers=2):
+    scheduler = AdaptiveScheduler(10, align_seconds=0, budget_ratio=0.8)
+    pool = TenantPool(scheduler, workers=workers, main_weight=main_weight)
+    for i, weight in enumerate(weights):
+        pool.tenants[f"t{i}"] = SimpleNamespace(
+            weight=weight, scheduler=AdaptiveScheduler(10, align_seconds=0, tenant=f"t{i}"))
+    pool._share_budget()
+    return pool
+
+
+def test_main_rule_set_and_tenants_share_one_budget():
+    pool = make_pool(1, [1, 2])
+    assert pool.scheduler.budget == 2.0
+    # The tenant phase (6s) runs on 2 workers
+    assert [t.scheduler.budget for t in pool.tenants.values()] == [4.0, 6.0]
+    longest_tenant = max(t.scheduler.budget for t in pool.tenants.values())
+    assert pool.scheduler.budget + longest_tenant <= 8.0
+
+
+def test_tenant_share_never_exceeds_the_tenant_phase():
+    pool = make_pool(1, [1, 9], workers=4)
+    phase = 8.0 - pool.scheduler.budget
+    assert all(t.scheduler.budget <= phase for t in pool.tenants.values())
+
+
+def test_main_rule_set_without_rules_leaves_the_budget_to_tenants():
+    pool = make_pool(0, [1, 1])
+    assert pool.scheduler.budget == 0
+    assert [t.scheduler.budget for t in pool.tenants.values()] == [8.0, 8.0]
+
+
+def test_validate_main_weight():
+    tenants = [{'name': 'a', 'config': 'a.yaml'}]
+    assert TenantPool.validate(tenants, {'main_weight': 0})
+    assert not TenantPool.validate(tenants, {'main_weight': -1})
+    assert not TenantPool.validate(tenants, {'main_weight': True})
+
+
+def test_per_rule_metrics_are_labelled_by_tenant():
+    for tenant in ('plant-a', 'plant-b'):
+        engine = RuleEngine(StaticPrometheus(), AlertTracker())
+        engine.tenant = tenant
+        engine.evaluate_all_rules([RULE])  # pending
+        engine.evaluate_all_rules([RULE])  # firing
+    for tenant in ('plant-a', 'plant-b'):
+        assert REGISTRY.get_sample_value('alert_engine_alerts_fired_total', {
+            'tenant': tenant, 'rule_name': RULE['name'], 'severity': 'critical'}) == 1
+        assert REGISTRY.get_sample_value('alert_engine_rule_evaluation_duration_seconds_count', {
+            'tenant': tenant, 'rule_name': RULE['name']}) == 2
+
+
+def test_cycle_stages_adds_from_many_threads():
+    stages = CycleStages()
+    
+    def add():
+        for _ in range(10000):
+            stages.add('query', 1.0)
+    
+    threads = [threading.Thread(target=add) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stages.totals['query'] == 80000.0
@@ -0,0 +1,142 @@
+"""
+Tests for webhook delivery (batching, retries, circuit breaking) against a local sink
+"""
+
+import pytest
+from prometheus_client import REGISTRY
+
+from benchmarks.webhook_sink import WebhookSink
+from webhook_notifier import WebhookNotifier
+
+RULE = {'name': 'high_temperature', 'severity': 'critical', 'email_subject': 'Temperature high'}
+
+
+def alert(i, status='firing'):
+    return {'key': f'high_temperature{{device_id="d{i}"}}', 'rule': RULE,
+            'labels': {'alertname': 'high_temperature', 'device_id': f'd{i}'},
+            'value': 40.0 + i, 'status': status}
+
+
+@pytest.fixture
+def sink():
+    sink = WebhookSink().start()
+    yield sink
+    sink.stop()
+
+
+def make_notifier(**kwargs):
+    settings = dict(flush_interval=60, max_retries=0, backoff=0, timeout=2)
+    settings.update(kwargs)
+    return WebhookNotifier(**settings)
+
+
+def receiver(sink, name='ops', fmt='json', path='/hook'):
+    return {'name': name, 'webhooks': [{'url': sink.url + path, 'format': fmt, 'name': path.strip('/')}]}
+
+
+def test_alerts_are_batched_over_one_connection(sink):
+    notifier = make_notifier(max_batch=3)
+    notifier.send([alert(i) for i in range(7)], {}, receiver(sink))
+    notifier.flush(wait=True)
+    notifier.stop()
+    
+    sizes = [len(r['payload']['alerts']) for r in sink.requests]
+    assert sizes == [3, 3, 1]
+    assert sink.connections == 1
+    assert sink.requests[0]['payload']['receiver'] == 'ops'
+    assert notifier.get_stats()['webhook_requests_sent'] == 3
+
+
+def test_failed_posts_are_retried(sink):
+    notifier = make_notifier(max_retries=2)
+    sink.status = 503
+    # The first backoff lets the endpoint recover
+    notifier._backoff_delay = lambda attempt, retry_after=None: setattr(sink, 'status', 200) or 0
+    retries = REGISTRY.get_sample_value('alert_engine_webhook_requests_total',
+                                        {'endpoint': 'retried', 'status': 'retry'}) or 0
+    
+    notifier.send([alert(1)], {}, receiver(sink, path='/retried'))
+    notifier.flush(wait=True)
+    notifier.stop()
+    
+    assert sink.count() == 1
+    assert REGISTRY.get_sample_value('alert_engine_webhook_requests_total',
+                                     {'endpoint': 'retried', 'status': 'retry'}) == retries + 1
+    stats = notifier.get_stats()
+    assert stats['webhook_requests_sent'] == 1 and stats['webhook_requests_failed'] == 0
+
+
+def test_circuit_opens_after_repeated_failures(sink):
+    notifier = make_notifier(failure_threshold=2, reset_timeout=60)
+    sink.status = 500
+    for i in range(2):
+        notifier.send([alert(i)], {}, receiver(sink, path='/broken'))
+        notifier.flush(wait=True)
+    assert notifier.get_stats()['webhook_open_circuits'] == ['broken']
+    
+    # While the circuit is open, queued alerts are dropped without a request
+    sink.status = 200
+    notifier.send([alert(3), alert(4)], {}, receiver(sink, path='/broken'))
+    notifier.flush(wait=True)
+    notifier.stop()
+    
+    stats = notifier.get_stats()
+    assert sink.count() == 0
+    assert stats['webhook_requests_failed'] == 2
+    assert stats['webhook_alerts_dropped'] == 4
+
+
+def test_same_url_in_two_formats_gets_both_payloads(sink):
+    notifier = make_notifier()
+    hooks = {'name': 'ops', 'webhooks': [{'url': sink.url + '/relay', 'format': 'json'},
+                                         {'url': sink.url + '/relay', 'format': 'slack'}]}
+    notifier.send([alert(1)], {}, hooks)
+    notifier.flush(wait=True)
+    notifier.stop()
+    
+    payloads = [r['payload'] for r in sink.requests]
+    assert len(payloads) == 2
+    assert any('alerts' in p for p in payloads) and any('attachments' in p for p in payloads)
+
+
+def test_receivers_sharing_a_webhook_keep_their_names(sink):
+    notifier = make_notifier(max_batch=10)
+    notifier.send([alert(1), alert(2)], {}, receiver(sink, name='ops', path='/shared'))
+    notifier.send([alert(3)], {}, receiver(sink, name='oncall', path='/shared'))
+    notifier.send([alert(4)], {}, receiver(sink, name='ops', path='/shared'))
+    notifier.flush(wait=True)
+    notifier.stop()
+    
+    batches = [(r['payload']['receiver'], [a['labels']['device_id'] for a in r['payload']['alerts']])
+               for r in sink.requests]
+    assert batches == [('ops', ['d1', 'd2', 'd4']), ('oncall', ['d3'])]
+
+
+def test_half_open_circuit_sends_one_trial_request(sink):
+    notifier = make_notifier(max_batch=1, max_retries=2, failure_threshold=1, reset_timeout=60)
+    notifier._backoff_delay = lambda attempt, retry_after=None: 0
+    sink.status = 500
+    notifier.send([alert(0)], {}, receiver(sink, path='/flaky'))
+    notifier.flush(wait=True)
+    breaker = next(iter(notifier.endpoints.values())).breaker
+    assert breaker.is_open and not breaker.is_half_open
+    retries = REGISTRY.get_sample_value('alert_engine_webhook_requests_total',
+                                        {'endpoint': 'flaky', 'status': 'retry'})
+    
+    # The trial fails: one request without retries, the circuit opens again
+    breaker.opened_at -= 60
+    notifier.send([alert(i) for i in range(1, 4)], {}, receiver(sink, path='/flaky'))
+    notifier.flush(wait=True)
+    assert notifier.get_stats()['webhook_requests_failed'] == 2
+    assert REGISTRY.get_sample_value('alert_engine_webhook_requests_total',
+                                     {'endpoint': 'flaky', 'status': 'retry'}) == retries
+    assert breaker.is_open and not breaker.is_half_open
+    
+    # The trial succeeds: the circuit closes and the rest of the queue follows
+    breaker.opened_at -= 60
+    sink.status = 200
+    notifier.send([alert(i) for i in range(4, 7)], {}, receiver(sink, path='/flaky'))
+    notifier.flush(wait=True)
+    notifier.stop()
+    assert sink.count() == 3
+    assert not breaker.is_open
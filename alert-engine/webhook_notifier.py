@@ -0,0 +1,354 @@
+"""
+Webhook Notifier
+Posts batched alert notifications to HTTP endpoints (JSON, Slack, Teams)
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Any, Optional, Tuple
+from urllib.parse import urlparse
+
+from notifier import Notifier
+from metrics import webhook_requests_total, webhook_dropped_total, webhook_circuit_open
+
+FORMATS = ('json', 'slack', 'teams')
+
+# Responses worth retrying; other 4xx mean the payload itself is rejected
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitBreaker:
+    """
+    Stops calling an endpoint after repeated failures
+    
+    After `failure_threshold` consecutive failures the circuit opens and
+    requests are refused for `reset_timeout` seconds; then it is half-open
+    and one trial request is let through, which closes the circuit on
+    success or opens it again on failure.
+    """
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+    
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+    
+    @property
+    def is_half_open(self) -> bool:
+        """Open, but the next request may go through as a trial"""
+        return self.opened_at is not None and self.clock() - self.opened_at >= self.reset_timeout
+    
+    def allow(self) -> bool:
+        """Whether a request may be sent now"""
+        return self.opened_at is None or self.is_half_open
+    
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            # Also restarts the timeout after a failed half-open trial
+            self.opened_at = self.clock()
+
+
+class Endpoint:
+    """
+    Queue and circuit breaker of one webhook (URL and payload format)
+    
+    Several receivers may share a webhook, so each queued alert carries
+    the name of the receiver it was sent to.
+    """
+    
+    def __init__(self, config: Dict[str, Any], max_queue: int, breaker: CircuitBreaker):
+        self.url = config['url']
+        self.format = config.get('format', 'json')
+        self.name = config.get('name') or urlparse(self.url).netloc
+        self.queue = deque()  # alerts waiting for the next flush
+        self.max_queue = max_queue
+        self.breaker = breaker
+        self.busy = False
+
+
+class WebhookNotifier(Notifier):
+    """
+    Delivers notifications to webhook endpoints from a background worker
+    
+    send() only appends alerts to the endpoint's queue, so a slow or dead
+    endpoint never blocks rule evaluation. Every `flush_interval` seconds
+    each endpoint's queue is posted as batches of up to `max_batch` alerts,
+    over a pooled keep-alive session, from a small thread pool so endpoints
+    don't wait for each other. Failed posts are retried with jittered
+    exponential backoff; endpoints that keep failing are circuit-broken and
+    their queued alerts are dropped (bounded by `max_queue`) until the
+    circuit closes again.
+    
+    Receiver settings:
+        webhooks:
+          - url: "https://hooks.slack.com/services/..."
+            format: "slack"        # json (default), slack or teams
+            name: "slack-ops"      # metric label (default: host)
+    """
+    
+    channel = 'webhook'
+    
+    def __init__(self, flush_interval: float = 2.0, max_batch: int = 50,
+                 max_queue: int = 1000, timeout: float = 5.0, max_retries: int = 3,
+                 backoff: float = 0.5, max_backoff: float = 10.0,
+                 failure_threshold: int = 5, reset_timeout: float = 60.0,
+                 pool_size: int = 10, workers: int = 4):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        
+        # The HTTP stack loads only when webhooks are configured
+        import requests
+        from requests.adapters import HTTPAdapter
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='webhook')
+        
+        self.endpoints: Dict[Tuple[str, str], Endpoint] = {}  # {(url, format): endpoint}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.is_running = False
+        self.thread = None
+        self.requests_sent = 0
+        self.requests_failed = 0
+        self.alerts_dropped = 0
+    
+    @staticmethod
+    def validate_webhooks(webhooks: Any, where: str) -> bool:
+        """Check the `webhooks` list of a receiver"""
+        if not isinstance(webhooks, list):
+            print(f"✗ {where}: webhooks must be a list")
+            return False
+        for webhook in webhooks:
+            if not isinstance(webhook, dict) or not str(webhook.get('url', '')).startswith(('http://', 'https://')):
+                print(f"✗ {where}: webhook needs an http(s) url: {webhook}")
+                return False
+            if webhook.get('format', 'json') not in FORMATS:
+                print(f"✗ {where}: webhook format must be one of {', '.join(FORMATS)}")
+                return False
+        return True
+    
+    def start(self) -> 'WebhookNotifier':
+        """Start the background flush worker"""
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, name='webhook-flush', daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        """Flush what is queued and stop the worker"""
+        self.is_running = False
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=self.timeout * (self.max_retries + 1) + self.flush_interval)
+        self.flush(wait=True)
+        self.executor.shutdown(wait=True)
+    
+    def send(self, alerts: List[Dict[str, Any]], group_labels: Dict[str, str],
+             receiver: Dict[str, Any]) -> bool:
+        """Queue alerts for every webhook of the receiver"""
+        with self.lock:
+            for config in receiver.get('webhooks', []):
+                # The same URL may take several formats (e.g. a relay)
+                key = (config['url'], config.get('format', 'json'))
+                endpoint = self.endpoints.get(key)
+                if endpoint is None:
+                    endpoint = self.endpoints[key] = Endpoint(
+                        config, self.max_queue,
+                        CircuitBreaker(self.failure_threshold, self.reset_timeout))
+                for alert in alerts:
+                    if len(endpoint.queue) >= endpoint.max_queue:
+                        endpoint.queue.popleft()
+                        self._dropped(endpoint, 1)
+                    endpoint.queue.append({**alert, 'group_labels': group_labels,
+                                           'receiver': receiver.get('name', '')})
+        return True
+    
+    def _run(self):
+        while self.is_running:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+    
+    def flush(self, wait: bool = False):
+        """Post every non-empty queue (one task per endpoint)"""
+        futures = []
+        with self.lock:
+            for endpoint in self.endpoints.values():
+                if endpoint.queue and not endpoint.busy:
+                    endpoint.busy = True
+                    futures.append(self.executor.submit(self._flush_endpoint, endpoint))
+        if wait:
+            for future in futures:
+                future.result()
+    
+    def _flush_endpoint(self, endpoint: Endpoint):
+        try:
+            while True:
+                with self.lock:
+                    if not endpoint.queue:
+                        return
+                    if not endpoint.breaker.allow():
+                        dropped = len(endpoint.queue)
+                        endpoint.queue.clear()
+                        self._dropped(endpoint, dropped)
+                        return
+                    batch = self._next_batch(endpoint)
+                    # A half-open circuit gets a single trial request, without retries
+                    retries = 0 if endpoint.breaker.is_half_open else self.max_retries
+                
+                payload = self.build_payload(endpoint.format, batch, batch[0]['receiver'])
+                if self._post(endpoint, payload, retries):
+                    endpoint.breaker.record_success()
+                else:
+                    endpoint.breaker.record_failure()
+                    with self.lock:
+                        self._dropped(endpoint, len(batch))
+                webhook_circuit_open.labels(endpoint=endpoint.name).set(int(endpoint.breaker.is_open))
+        finally:
+            endpoint.busy = False
+    
+    def _next_batch(self, endpoint: Endpoint) -> List[Dict[str, Any]]:
+        """
+        Take up to `max_batch` queued alerts of the receiver at the head of
+        the queue (call with the lock held); other receivers' alerts keep
+        their place
+        """
+        receiver = endpoint.queue[0]['receiver']
+        batch, others = [], []
+        while endpoint.queue and len(batch) < self.max_batch:
+            alert = endpoint.queue.popleft()
+            (batch if alert['receiver'] == receiver else others).append(alert)
+        endpoint.queue.extendleft(reversed(others))
+        return batch
+    
+    def _post(self, endpoint: Endpoint, payload: Dict[str, Any], retries: int) -> bool:
+        """POST with up to `retries` retries; returns True once the endpoint accepted it"""
+        import requests
+        
+        for attempt in range(retries + 1):
+            retry_after = None
+            try:
+                response = self.session.post(endpoint.url, json=payload, timeout=self.timeout)
+                if response.status_code < 300:
+                    with self.lock:
+                        self.requests_sent += 1
+                    webhook_requests_total.labels(endpoint=endpoint.name, status='success').inc()
+                    return True
+                error = f"HTTP {response.status_code}"
+                if response.status_code not in RETRY_STATUSES:
+                    break
+                retry_after = response.headers.get('Retry-After')
+            except requests.exceptions.RequestException as e:
+                error = str(e)
+            
+            if attempt < retries:
+                webhook_requests_total.labels(endpoint=endpoint.name, status='retry').inc()
+                time.sleep(self._backoff_delay(attempt, retry_after))
+        
+        with self.lock:
+            self.requests_failed += 1
+        webhook_requests_total.labels(endpoint=endpoint.name, status='failed').inc()
+        print(f"✗ Webhook {endpoint.name} failed: {error}")
+        return False
+    
+    def _backoff_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Exponential backoff with full jitter, honouring Retry-After seconds"""
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+    
+    def _dropped(self, endpoint: Endpoint, count: int):
+        if count:
+            self.alerts_dropped += count
+            webhook_dropped_total.labels(endpoint=endpoint.name).inc(count)
+    
+    @staticmethod
+    def build_payload(fmt: str, alerts: List[Dict[str, Any]], receiver: str = '') -> Dict[str, Any]:
+        """Render a batch of alerts in the endpoint's format"""
+        firing = [a for a in alerts if a['status'] == 'firing']
+        resolved = [a for a in alerts if a['status'] != 'firing']
+        title = f"{len(firing)} firing, {len(resolved)} resolved"
+        
+        def summary(alert: Dict[str, Any]) -> str:
+            rule = alert['rule']
+            subject = rule.get('email_subject', rule['name'])
+            if alert['status'] != 'firing':
+                subject = f"RESOLVED: {subject}"
+            return f"{subject} - {alert['key']} = {alert['value']}"
+        
+        if fmt == 'slack':
+            colors = {'critical': '#DC2626', 'warning': '#F59E0B'}
+            return {
+                'text': f"Symphony IoT alerts: {title}",
+                'attachments': [{
+                    'color': '#10B981' if a['status'] != 'firing'
+                    else colors.get(a['rule'].get('severity'), '#3B82F6'),
+                    'text': summary(a)
+                } for a in alerts]
+            }
+        
+        if fmt == 'teams':
+            severe = any(a['rule'].get('severity') == 'critical' for a in firing)
+            return {
+                '@type': 'MessageCard',
+                '@context': 'http://schema.org/extensions',
+                'themeColor': 'DC2626' if severe else 'F59E0B' if firing else '10B981',
+                'summary': f"Symphony IoT alerts: {title}",
+                'title': f"Symphony IoT alerts: {title}",
+                'sections': [{'facts': [{'name': a['status'].upper(), 'value': summary(a)}
+                                        for a in alerts]}]
+            }
+        
+        return {
+            'version': '1',
+            'receiver': receiver,
+            'status': 'firing' if firing else 'resolved',
+            'timestamp': datetime.now().isoformat(),
+            'alerts': [{
+                'status': a['status'],
+                'key': a['key'],
+                'labels': a['labels'],
+                'group_labels': a.get('group_labels', {}),
+                'value': a['value'],
+                'severity': a['rule'].get('severity'),
+                'summary': a['rule'].get('email_subject', ''),
+                'description': a['rule'].get('description') or a['rule'].get('email_body', '')
+            } for a in alerts]
+        }
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            queued = sum(len(e.queue) for e in self.endpoints.values())
+            open_circuits = [e.name for e in self.endpoints.values() if e.breaker.is_open]
+            return {
+                'webhook_requests_sent': self.requests_sent,
+                'webhook_requests_failed': self.requests_failed,
+                'webhook_alerts_dropped': self.alerts_dropped,
+                'webhook_alerts_queued': queued,
+                'webhook_open_circuits': open_circuits
+            }
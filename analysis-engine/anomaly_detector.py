@@ -0,0 +1,320 @@
+"""
+Anomaly Detector
+Streaming anomaly scoring for IoT sensor series
+
+Every (device, metric) series owns one row of a set of contiguous numpy
+arrays: a fixed-size ring buffer of recent values plus a handful of scalar
+state slots. New samples arrive in batches and are scored for all series at
+once, so the cost per cycle is a few vectorized passes over the batch rather
+than a Python loop per device.
+
+Three detectors contribute to the score:
+  - robust z-score: distance from the rolling median in units of the
+    rolling MAD, or of the standard deviation while more than half the
+    window holds one value (catches spikes and sudden jumps)
+  - CUSUM: two-sided cumulative sum of standardized residuals
+    (catches level shifts / change points)
+  - stuck sensor: number of consecutive identical readings, rising to the
+    threshold at stuck_samples and then falling back to 0 over as many
+    samples, so a reading that is legitimately flat (a full battery) is
+    reported once instead of staying anomalous
+
+Each component is normalized so that 1.0 means "at its threshold"; the
+anomaly score is the maximum of the components. Scales are floored at a
+fraction of the series' magnitude, so a perfectly flat history does not turn
+the smallest change into a huge score.
+
+Memory: each series uses (window + 9) * 8 bytes, i.e. ~1 KB per series with
+the default 120-sample window (~3 KB per device reporting three sensors).
+Rows are allocated on demand up to max_series; series beyond that limit are
+ignored, so total memory never exceeds max_series * (window + 9) * 8 bytes
+plus the series-name index. Series without a sample for stale_seconds are
+expired and their rows reused.
+"""
+
+import warnings
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Scale factor making the MAD a consistent estimator of the standard deviation
+MAD_SCALE = 1.4826
+
+
+class AnomalyDetector:
+    """Online anomaly scoring over per-series ring buffers"""
+
+    def __init__(self, window: int = 120, max_series: int = 10000,
+                 z_threshold: float = 4.0, cusum_drift: float = 0.5,
+                 cusum_threshold: float = 8.0, stuck_samples: int = 12,
+                 min_samples: int = 10, min_scale: float = 1e-3,
+                 relative_scale: float = 0.01, stale_seconds: float = 600):
+        self.window = window
+        self.max_series = max_series
+        self.z_threshold = z_threshold
+        self.cusum_drift = cusum_drift
+        self.cusum_threshold = cusum_threshold
+        self.stuck_samples = stuck_samples
+        self.min_samples = min_samples
+        self.min_scale = min_scale
+        self.relative_scale = relative_scale
+        self.stale_seconds = stale_seconds
+
+        self.series_index: Dict[Tuple[str, str], int] = {}
+        self.row_keys: List[Optional[Tuple[str, str]]] = []  # series of each row
+        self.free_rows: List[int] = []
+        self.device_index: Dict[str, int] = {}
+        self.devices: List[Optional[str]] = []
+        self.device_series: List[int] = []  # number of series of each device
+        self.free_devices: List[int] = []
+        self.dropped_series = 0
+
+        self.capacity = 0
+        self._allocate(min(64, max_series))
+
+    def _allocate(self, capacity: int):
+        """Grow the state arrays to hold `capacity` series"""
+        def grow(old, fill, dtype):
+            new = np.full((capacity,) + old.shape[1:], fill, dtype=dtype)
+            new[:self.capacity] = old[:self.capacity]
+            return new
+
+        if self.capacity == 0:
+            self.values = np.full((capacity, self.window), np.nan)
+            self.head = np.zeros(capacity, dtype=np.int64)
+            self.count = np.zeros(capacity, dtype=np.int64)
+            self.last_ts = np.full(capacity, -np.inf)
+            self.last_value = np.full(capacity, np.nan)
+            self.run_length = np.zeros(capacity, dtype=np.int64)
+            self.cusum_pos = np.zeros(capacity)
+            self.cusum_neg = np.zeros(capacity)
+            self.scores = np.zeros(capacity)
+            self.device_of = np.zeros(capacity, dtype=np.int64)
+        else:
+            self.values = grow(self.values, np.nan, np.float64)
+            self.head = grow(self.head, 0, np.int64)
+            self.count = grow(self.count, 0, np.int64)
+            self.last_ts = grow(self.last_ts, -np.inf, np.float64)
+            self.last_value = grow(self.last_value, np.nan, np.float64)
+            self.run_length = grow(self.run_length, 0, np.int64)
+            self.cusum_pos = grow(self.cusum_pos, 0.0, np.float64)
+            self.cusum_neg = grow(self.cusum_neg, 0.0, np.float64)
+            self.scores = grow(self.scores, 0.0, np.float64)
+            self.device_of = grow(self.device_of, 0, np.int64)
+        self.capacity = capacity
+
+    def _row_for(self, device_id: str, metric: str) -> int:
+        """Get (or allocate) the buffer row of a series, -1 if over the limit"""
+        key = (device_id, metric)
+        row = self.series_index.get(key)
+        if row is not None:
+            return row
+
+        if self.free_rows:
+            row = self.free_rows.pop()
+            self._reset(row)
+            self.row_keys[row] = key
+        else:
+            row = len(self.row_keys)
+            if row >= self.max_series:
+                self.dropped_series += 1
+                return -1
+            if row >= self.capacity:
+                self._allocate(min(self.capacity * 2, self.max_series))
+            self.row_keys.append(key)
+
+        device = self.device_index.get(device_id)
+        if device is None:
+            if self.free_devices:
+                device = self.free_devices.pop()
+                self.devices[device] = device_id
+            else:
+                device = len(self.devices)
+                self.devices.append(device_id)
+                self.device_series.append(0)
+            self.device_index[device_id] = device
+        self.device_series[device] += 1
+        self.device_of[row] = device
+        self.series_index[key] = row
+        return row
+
+    def _reset(self, row: int):
+        """Clear the state of a reused row"""
+        self.values[row] = np.nan
+        self.head[row] = 0
+        self.count[row] = 0
+        self.last_ts[row] = -np.inf
+        self.last_value[row] = np.nan
+        self.run_length[row] = 0
+        self.cusum_pos[row] = 0.0
+        self.cusum_neg[row] = 0.0
+        self.scores[row] = 0.0
+
+    def update(self, samples: Iterable[Tuple[str, str, float, float]]) -> int:
+        """
+        Score and store a batch of samples
+
+        Args:
+            samples: (device_id, metric, timestamp, value) tuples; several
+                samples of one series are applied in timestamp order
+
+        Returns:
+            Number of new samples scored (already-seen timestamps are skipped)
+        """
+        rows, timestamps, values = [], [], []
+        for device_id, metric, timestamp, value in samples:
+            row = self._row_for(device_id, metric)
+            if row >= 0:
+                rows.append(row)
+                timestamps.append(timestamp)
+                values.append(value)
+
+        if not rows:
+            return 0
+
+        rows = np.asarray(rows, dtype=np.int64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        x = np.asarray(values, dtype=np.float64)
+
+        # Prometheus returns the same sample until the next scrape; scoring it
+        # twice would look like a stuck sensor
+        fresh = timestamps > self.last_ts[rows]
+        rows, timestamps, x = rows[fresh], timestamps[fresh], x[fresh]
+        if rows.size == 0:
+            return 0
+
+        # Fancy-indexed writes keep only one value per row, so a series that
+        # appears more than once is applied in rounds: its oldest sample in
+        # the first round, the next one in the second, and so on
+        order = np.lexsort((timestamps, rows))
+        rows, timestamps, x = rows[order], timestamps[order], x[order]
+        distinct = np.ones(rows.size, dtype=bool)
+        distinct[1:] = (rows[1:] != rows[:-1]) | (timestamps[1:] != timestamps[:-1])
+        rows, timestamps, x = rows[distinct], timestamps[distinct], x[distinct]
+
+        first = np.ones(rows.size, dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        positions = np.arange(rows.size)
+        rank = positions - np.maximum.accumulate(np.where(first, positions, 0))
+        for i in range(int(rank.max()) + 1):
+            batch = rank == i
+            self._append(rows[batch], timestamps[batch], x[batch])
+
+        return int(rows.size)
+
+    def _append(self, rows: np.ndarray, timestamps: np.ndarray, x: np.ndarray):
+        """Score and store one sample for each of `rows` (no duplicates)"""
+        self.scores[rows] = self._score(rows, x)
+
+        # Append to ring buffers
+        self.values[rows, self.head[rows]] = x
+        self.head[rows] = (self.head[rows] + 1) % self.window
+        self.count[rows] = np.minimum(self.count[rows] + 1, self.window)
+        self.last_ts[rows] = timestamps
+        self.last_value[rows] = x
+
+    def expire(self, now: float) -> List[str]:
+        """
+        Forget series without a sample for `stale_seconds`
+
+        A sensor that stops reporting would otherwise keep its last score
+        forever. Expired rows are reused by new series.
+
+        Args:
+            now: Current time, in the clock of the sample timestamps
+
+        Returns:
+            Devices left without any series (their scores should be removed)
+        """
+        used = len(self.row_keys)
+        stale = np.flatnonzero(self.last_ts[:used] < now - self.stale_seconds)
+        removed = []
+        for row in stale.tolist():
+            key = self.row_keys[row]
+            if key is None:
+                continue
+            del self.series_index[key]
+            self.row_keys[row] = None
+            self.free_rows.append(row)
+            self._reset(row)
+
+            device = int(self.device_of[row])
+            self.device_series[device] -= 1
+            if self.device_series[device] == 0:
+                device_id = self.devices[device]
+                del self.device_index[device_id]
+                self.devices[device] = None
+                self.free_devices.append(device)
+                removed.append(device_id)
+        return removed
+
+    def _score(self, rows: np.ndarray, x: np.ndarray) -> np.ndarray:
+        """Compute normalized anomaly scores of new values against history"""
+        score = np.zeros(rows.size)
+
+        # Stuck sensor: consecutive identical readings. The run is capped at
+        # twice stuck_samples, where the score is back to 0 and stays there
+        # until the value changes
+        same = x == self.last_value[rows]
+        cap = 2 * self.stuck_samples
+        run = np.where(same, np.minimum(self.run_length[rows] + 1, cap), 0)
+        self.run_length[rows] = run
+        stuck = np.minimum(run, cap - run) / self.stuck_samples
+        score = np.maximum(score, stuck)
+
+        ready = self.count[rows] >= self.min_samples
+        if not ready.any():
+            return score
+
+        r = rows[ready]
+        xr = x[ready]
+        history = self.values[r]
+
+        with warnings.catch_warnings():
+            # Rows that are not full yet still contain NaN padding
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            median = np.nanmedian(history, axis=1)
+            mad = np.nanmedian(np.abs(history - median[:, None]), axis=1) * MAD_SCALE
+            mean = np.nanmean(history, axis=1)
+            std = np.nanstd(history, axis=1)
+
+        # Smallest scale a deviation is measured in: a fraction of the
+        # series' magnitude, so 20.1 after a flat 20.0 is not a 100-sigma event
+        floor = np.maximum(self.relative_scale * np.abs(median), self.min_scale)
+        # MAD is 0 once more than half the window holds one value
+        spread = np.where(mad > 0, mad, std)
+
+        # Rolling robust z-score
+        robust_z = np.abs(xr - median) / np.maximum(spread, floor)
+
+        # Two-sided CUSUM on standardized residuals, capped at twice the
+        # threshold so the score recovers within a bounded number of samples
+        # once the window has absorbed a level shift
+        residual = (xr - mean) / np.maximum(std, floor)
+        cap = 2 * self.cusum_threshold
+        self.cusum_pos[r] = np.clip(self.cusum_pos[r] + residual - self.cusum_drift, 0.0, cap)
+        self.cusum_neg[r] = np.clip(self.cusum_neg[r] - residual - self.cusum_drift, 0.0, cap)
+        cusum = np.maximum(self.cusum_pos[r], self.cusum_neg[r])
+
+        score[ready] = np.maximum.reduce([
+            score[ready],
+            robust_z / self.z_threshold,
+            cusum / self.cusum_threshold,
+        ])
+        return score
+
+    def device_scores(self) -> Dict[str, float]:
+        """Get the anomaly score of each device (max over its series)"""
+        n = len(self.row_keys)
+        per_device = np.zeros(len(self.devices))
+        # Free rows were reset to a score of 0, so they never raise the max
+        np.maximum.at(per_device, self.device_of[:n], self.scores[:n])
+        return {device: score for device, score in zip(self.devices, per_device.tolist())
+                if device is not None}
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the state arrays"""
+        arrays = (self.values, self.head, self.count, self.last_ts,
+                  self.last_value, self.run_length, self.cusum_pos,
+                  self.cusum_neg, self.scores, self.device_of)
+        return sum(a.nbytes for a in arrays)
@@ -1,11 +1,76 @@
 from flask import Flask, Response
 from prometheus_client import Gauge, generate_latest, REGISTRY
+import os
 import random
+import threading
+import time
+
+import requests
+
+from anomaly_detector import AnomalyDetector
 
 app = Flask(__name__)
 
+# Anomaly detection settings (override via environment)
+PROMETHEUS_URL = os.environ.get("PROMETHEUS_URL", "http://sample-prometheus:9090").rstrip("/")
+ANOMALY_METRICS = os.environ.get(
+    "ANOMALY_METRICS", "iot_temperature_celsius,iot_humidity_percent,iot_battery_percent"
+).split(",")
+ANOMALY_INTERVAL = float(os.environ.get("ANOMALY_INTERVAL", "5"))
+ANOMALY_WINDOW = int(os.environ.get("ANOMALY_WINDOW", "120"))
+ANOMALY_MAX_SERIES = int(os.environ.get("ANOMALY_MAX_SERIES", "10000"))
+ANOMALY_STALE_SECONDS = float(os.environ.get("ANOMALY_STALE_SECONDS", "600"))
+# First label present on a series identifies its device
+DEVICE_LABELS = ("device_id", "kubernetes_pod_name", "instance")
+
 # Create a global metric ONCE
 iot_pred_temp = Gauge("iot_predicted_temperature", "Predicted temperature in Celsius")
+iot_anomaly_score = Gauge("iot_anomaly_score",
+                          "Anomaly score per device (>= 1.0 means anomalous)",
+                          ["device_id"])
+anomaly_tracked_series = Gauge("analysis_engine_anomaly_tracked_series",
+                               "Number of series held in anomaly ring buffers")
+anomaly_buffer_bytes = Gauge("analysis_engine_anomaly_buffer_bytes",
+                             "Memory held by anomaly ring buffers")
+
+detector = AnomalyDetector(window=ANOMALY_WINDOW, max_series=ANOMALY_MAX_SERIES,
+                           stale_seconds=ANOMALY_STALE_SECONDS)
+
+
+def fetch_samples():
+    """Fetch the latest sample of every watched series in a single query"""
+    query = '{__name__=~"%s"}' % "|".join(ANOMALY_METRICS)
+    response = requests.get(f"{PROMETHEUS_URL}/api/v1/query",
+                            params={"query": query}, timeout=10)
+    response.raise_for_status()
+
+    samples = []
+    for series in response.json()["data"]["result"]:
+        labels = series["metric"]
+        device_id = next((labels[l] for l in DEVICE_LABELS if l in labels), "unknown")
+        timestamp, value = series["value"]
+        samples.append((device_id, labels["__name__"], float(timestamp), float(value)))
+    return samples
+
+
+def anomaly_loop():
+    """Score new samples and publish per-device anomaly scores"""
+    while True:
+        try:
+            detector.update(fetch_samples())
+            # Devices that stopped reporting drop out instead of keeping their last score
+            for device_id in detector.expire(time.time()):
+                try:
+                    iot_anomaly_score.remove(device_id)
+                except KeyError:
+                    pass
+            for device_id, score in detector.device_scores().items():
+                iot_anomaly_score.labels(device_id=device_id).set(score)
+            anomaly_tracked_series.set(len(detector.series_index))
+            anomaly_buffer_bytes.set(detector.memory_bytes())
+        except Exception as e:
+            print(f"Anomaly detection cycle failed: {e}")
+        time.sleep(ANOMALY_INTERVAL)
 
 @app.route("/metrics")
 def metrics():
@@ -14,4 +79,5 @@ def metrics():
     return Response(generate_latest(REGISTRY), mimetype="text/plain")
 
 if __name__ == "__main__":
+    threading.Thread(target=anomaly_loop, daemon=True).start()
     app.run(host="0.0.0.0", port=8086)
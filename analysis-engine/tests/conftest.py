@@ -0,0 +1,8 @@
+"""
+Test setup: the analysis engine modules are flat files in analysis-engine/
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
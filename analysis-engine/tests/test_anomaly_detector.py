@@ -0,0 +1,96 @@
+"""
+Tests for the anomaly detector's ring buffers, batching, expiry and scores
+"""
+
+import numpy as np
+
+from anomaly_detector import AnomalyDetector
+
+
+def feed(detector, values, device='d1', metric='temp', start=0.0, step=5.0):
+    """Send one sample per batch and return the device score after each"""
+    scores = []
+    for i, value in enumerate(values):
+        detector.update([(device, metric, start + i * step, value)])
+        scores.append(detector.device_scores()[device])
+    return scores
+
+
+def test_ring_buffer_keeps_the_last_window():
+    detector = AnomalyDetector(window=4)
+    feed(detector, [1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+
+    row = detector.series_index[('d1', 'temp')]
+    assert detector.count[row] == 4
+    assert detector.head[row] == 2
+    assert sorted(detector.values[row].tolist()) == [3.0, 4.0, 5.0, 6.0]
+    assert detector.last_value[row] == 6.0
+
+
+def test_batch_applies_samples_of_one_series_in_order():
+    detector = AnomalyDetector(window=8)
+    scored = detector.update([
+        ('d1', 'temp', 10.0, 3.0),
+        ('d1', 'temp', 0.0, 1.0),
+        ('d1', 'temp', 5.0, 2.0),
+        ('d1', 'temp', 5.0, 2.0),  # same sample twice in one batch
+        ('d2', 'temp', 0.0, 7.0),
+    ])
+    assert scored == 4
+
+    row = detector.series_index[('d1', 'temp')]
+    assert detector.values[row, :3].tolist() == [1.0, 2.0, 3.0]
+    assert detector.last_ts[row] == 10.0
+    # Prometheus repeats the last sample until the next scrape
+    assert detector.update([('d1', 'temp', 10.0, 3.0), ('d1', 'temp', 5.0, 2.0)]) == 0
+    assert detector.count[row] == 3
+
+
+def test_series_beyond_the_limit_are_dropped():
+    detector = AnomalyDetector(max_series=2)
+    assert detector.update([('d1', 'a', 0.0, 1.0), ('d1', 'b', 0.0, 1.0),
+                            ('d2', 'a', 0.0, 1.0)]) == 2
+    assert detector.dropped_series == 1
+    assert set(detector.device_scores()) == {'d1'}
+
+
+def test_expire_frees_rows_and_devices():
+    detector = AnomalyDetector(stale_seconds=60)
+    detector.update([('d1', 'temp', 0.0, 1.0), ('d1', 'hum', 100.0, 1.0),
+                     ('d2', 'temp', 0.0, 1.0)])
+    stale_row = detector.series_index[('d2', 'temp')]
+
+    # d1 still has a fresh series, so only d2 disappears
+    assert detector.expire(now=120.0) == ['d2']
+    assert set(detector.device_scores()) == {'d1'}
+    assert ('d1', 'temp') not in detector.series_index
+
+    # A new series reuses a freed row, starting from a clean state
+    detector.update([('d3', 'temp', 130.0, 5.0)])
+    row = detector.series_index[('d3', 'temp')]
+    assert row == stale_row
+    assert detector.count[row] == 1 and detector.values[row, 0] == 5.0
+    assert np.isnan(detector.values[row, 1:]).all()
+
+
+def test_spike_scores_above_threshold():
+    detector = AnomalyDetector(window=30, min_samples=10)
+    noise = [20.0 + 0.1 * ((i * 7) % 5) for i in range(30)]
+    scores = feed(detector, noise + [30.0])
+
+    assert max(scores[:-1]) < 1.0
+    assert scores[-1] >= 1.0
+
+
+def test_flat_reading_is_reported_once():
+    # Only the stuck-sensor detector runs before min_samples
+    detector = AnomalyDetector(window=30, stuck_samples=4, min_samples=30)
+    scores = feed(detector, [100.0] * 20)
+
+    assert scores[:9] == [0.0, 0.25, 0.5, 0.75, 1.0, 0.75, 0.5, 0.25, 0.0]
+    # It stays at 0 while the value does not change
+    assert scores[9:] == [0.0] * 11
+
+    # A new plateau after a change is reported again
+    scores = feed(detector, [90.0] * 5, start=100.0)
+    assert scores == [0.0, 0.25, 0.5, 0.75, 1.0]